@@ -1,9 +1,54 @@
 from django.contrib import admin
-from .models import PayslipAnalysis
+from .models import PayslipAnalysis, AnalysisJob, AnalysisBatch, RateLimitBucket, CircuitBreakerState, AnalysisReuseStats, UserPayslipStats, PageFingerprint
 
 @admin.register(PayslipAnalysis)
 class PayslipAnalysisAdmin(admin.ModelAdmin):
-    list_display = ('id', 'payslip', 'analysis_date', 'analysis_status')
+    list_display = ('id', 'payslip', 'analysis_date', 'analysis_status', 'global_score', 'anomaly_count')
     list_filter = ('analysis_status', 'analysis_date')
     search_fields = ('payslip__user__username',) # Modifié ici
-    readonly_fields = ('analysis_date',)
\ No newline at end of file
+    readonly_fields = ('analysis_date', 'global_score', 'conformity_score', 'anomaly_count', 'observation_count')
+
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'payslip', 'status', 'mode', 'attempts', 'worker_id', 'created_at', 'finished_at')
+    list_filter = ('status', 'mode')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'heartbeat_at', 'lease_expires_at')
+
+
+@admin.register(RateLimitBucket)
+class RateLimitBucketAdmin(admin.ModelAdmin):
+    list_display = ('key', 'requests_available', 'tokens_available', 'refilled_at')
+
+
+@admin.register(CircuitBreakerState)
+class CircuitBreakerStateAdmin(admin.ModelAdmin):
+    list_display = ('key', 'state', 'consecutive_failures', 'short_circuits', 'hedged_requests', 'hedge_wins', 'p95_latency_seconds', 'updated_at')
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(AnalysisReuseStats)
+class AnalysisReuseStatsAdmin(admin.ModelAdmin):
+    list_display = ('key', 'lookups', 'hits', 'hit_rate', 'cost_saved', 'updated_at')
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(UserPayslipStats)
+class UserPayslipStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'payslip_count', 'avg_score', 'avg_conformity', 'anomaly_total', 'last_upload_date')
+    search_fields = ('user__username', 'user__email')
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(PageFingerprint)
+class PageFingerprintAdmin(admin.ModelAdmin):
+    list_display = ('user', 'page_hash', 'documents_seen', 'last_seen_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('last_seen_at',)
+
+
+@admin.register(AnalysisBatch)
+class AnalysisBatchAdmin(admin.ModelAdmin):
+    list_display = ('openai_batch_id', 'model', 'status', 'request_count', 'created_at', 'completed_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'completed_at')
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AnalysisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analysis'
+
+    def ready(self):
+        import analysis.signals
+        # Indexe les données de référence (data/) une fois au démarrage du processus
+        from .services.reference_data import reference_registry
+        reference_registry.preload()
@@ -0,0 +1,220 @@
+import base64
+import os
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.services.image_resizer import image_token_metrics
+from analysis.services.image_utils import image_bytes_size
+from analysis.services.page_encoder import PageEncoder, encode_pdf, map_pages, page_workers
+from analysis.services.pdf_converter import PDF_RASTER_DPI, convert_pdf_to_images
+from analysis.services.request_body import RequestBody
+from analysis.services.vision_api_client import OpenAIVisionClient
+
+# Champs extraits comparés entre l'envoi des pages brutes et des pages traitées (--extract)
+EXTRACTION_FIELDS = [
+    ('informations_generales', 'nom_salarie'),
+    ('informations_generales', 'siret_entreprise'),
+    ('periode', 'periode_du'),
+    ('periode', 'periode_au'),
+    ('remuneration', 'salaire_de_base_brut'),
+    ('remuneration', 'salaire_brut_total'),
+    ('remuneration', 'total_cotisations_salariales'),
+    ('remuneration', 'net_imposable'),
+    ('remuneration', 'net_social'),
+    ('remuneration', 'net_a_payer'),
+    ('remuneration', 'taux_horaire'),
+    ('conges_et_absences', 'solde_conges_payes'),
+]
+# Tailles de document comparées par --parallel et --memory
+PARALLEL_PAGE_COUNTS = (1, 3, 10)
+# Période d'échantillonnage de la mémoire résidente (--memory)
+RSS_SAMPLE_INTERVAL = 0.005
+
+
+def best_time(func, repeat):
+    """(meilleur temps en secondes, dernier résultat) sur `repeat` exécutions."""
+    best, result = None, None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def current_rss() -> int:
+    """Mémoire résidente du processus en octets (Linux)."""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class PeakRSS:
+    """Pic de mémoire résidente au-dessus du niveau d'entrée pendant le bloc (échantillonné)."""
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, current_rss())
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    @property
+    def growth(self) -> int:
+        return self.peak - self.baseline
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure, sur des fiches de paie d'exemple, la taille, les tuiles facturées et le temps d'encodage "
+        "des pages envoyées à l'API Vision (brutes, redimensionnées, prétraitées), le gain du rendu "
+        "et de l'encodage parallèles (--parallel) ou le pic de mémoire d'une analyse (--memory)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('pdf_paths', nargs='+', help="Fiches de paie PDF d'exemple.")
+        parser.add_argument('--max-pages', type=int, default=None, help="Nombre maximal de pages par document.")
+        parser.add_argument('--repeat', type=int, default=3, help="Répétitions (le meilleur temps est retenu).")
+        parser.add_argument(
+            '--extract', action='store_true',
+            help="Analyse aussi chaque document avec les pages brutes puis prétraitées et compare les champs extraits "
+                 "(appels API facturés)."
+        )
+        parser.add_argument(
+            '--parallel', action='store_true',
+            help="Compare le rendu et l'encodage séquentiels et parallèles (PDF_PAGE_WORKERS) sur 1, 3 et 10 pages."
+        )
+        parser.add_argument(
+            '--memory', action='store_true',
+            help="Mesure le pic de mémoire résidente du rendu, de l'encodage et de la sérialisation de la requête "
+                 "sur 1, 3 et 10 pages, en flux et avec toutes les pages en mémoire."
+        )
+
+    def variants(self):
+        return [
+            ('brut', PageEncoder(max_tiles=0, preprocess=False)),
+            ('redimensionné', PageEncoder(preprocess=False)),
+            ('prétraité', PageEncoder(preprocess=True)),
+        ]
+
+    def handle(self, *args, **options):
+        if options['parallel']:
+            for pdf_path in options['pdf_paths']:
+                self.benchmark_parallelism(pdf_path, options['repeat'])
+            return
+        if options['memory']:
+            for pdf_path in options['pdf_paths']:
+                self.benchmark_memory(pdf_path)
+            return
+
+        variants = self.variants()
+        mismatches = 0
+        for pdf_path in options['pdf_paths']:
+            try:
+                pages = convert_pdf_to_images(pdf_path, options['max_pages'], dpi=PDF_RASTER_DPI)
+            except (FileNotFoundError, ImportError) as e:
+                raise CommandError(str(e))
+            source_sizes = [page.size for page in pages]
+            self.stdout.write(f"\n{pdf_path}: {len(pages)} page(s) à {PDF_RASTER_DPI} DPI")
+
+            encoded = {}
+            for name, encoder in variants:
+                best, payload = best_time(lambda: [encoder.encode(page) for page in pages], options['repeat'])
+                encoded[name] = payload
+                metrics = image_token_metrics(source_sizes, [image_bytes_size(data) for data in payload])
+                self.stdout.write(
+                    f"  {name:<14} {sum(len(data) for data in payload) / 1024:8.1f} Ko  "
+                    f"{metrics['image_tokens_after']:6d} tokens d'image  {best * 1000:8.1f} ms"
+                )
+
+            if options['extract']:
+                mismatches += self.compare_extraction(pdf_path, encoded['brut'], encoded['prétraité'])
+
+        if options['extract']:
+            self.stdout.write(f"\n{mismatches} champ(s) extrait(s) différent(s) au total.")
+
+    def benchmark_parallelism(self, pdf_path, repeat):
+        workers = page_workers()
+        encoder = PageEncoder()
+        self.stdout.write(f"\n{pdf_path}: séquentiel vs {workers} worker(s) (PDF_PAGE_WORKERS)")
+        for page_count in PARALLEL_PAGE_COUNTS:
+            timings = {}
+            for count in (1, workers):
+                try:
+                    render, pages = best_time(
+                        lambda: convert_pdf_to_images(pdf_path, page_count, dpi=PDF_RASTER_DPI, thread_count=count), repeat
+                    )
+                except (FileNotFoundError, ImportError) as e:
+                    raise CommandError(str(e))
+                # Document plus court que la taille visée: les pages sont répétées pour l'encodage
+                pages = (pages * page_count)[:page_count]
+                encode, _ = best_time(lambda: map_pages(encoder.encode, pages, count), repeat)
+                timings[count] = (render, encode)
+            (seq_render, seq_encode), (par_render, par_encode) = timings[1], timings[workers]
+            self.stdout.write(
+                f"  {page_count:2d} page(s): rendu {seq_render * 1000:7.1f} -> {par_render * 1000:7.1f} ms "
+                f"(x{seq_render / par_render:.2f}), encodage {seq_encode * 1000:7.1f} -> {par_encode * 1000:7.1f} ms "
+                f"(x{seq_encode / par_encode:.2f})"
+            )
+
+    def benchmark_memory(self, pdf_path):
+        client = OpenAIVisionClient('benchmark')
+        encoder = PageEncoder()
+        self.stdout.write(f"\n{pdf_path}: pic de mémoire résidente (rendu, encodage, corps de la requête)")
+        for page_count in PARALLEL_PAGE_COUNTS:
+            try:
+                with PeakRSS() as streamed:
+                    _, _, pages = encode_pdf(pdf_path, page_count, encoder)
+                    reader = RequestBody(client._build_responses_payload('prompt', pages, 'gpt-5-mini', 1024)).open()
+                    body_bytes = 0
+                    while True:
+                        chunk = reader.read(64 * 1024)
+                        if not chunk:
+                            break
+                        body_bytes += len(chunk)
+                del pages, reader
+                # Ancien chemin: pages décodées en mémoire, base64 puis corps JSON complet
+                with PeakRSS() as in_memory:
+                    rendered = convert_pdf_to_images(pdf_path, page_count, dpi=PDF_RASTER_DPI, thread_count=page_workers())
+                    images = [base64.b64encode(data).decode('ascii') for data in map_pages(encoder.encode, rendered)]
+                    body = RequestBody(client._build_responses_payload('prompt', images, 'gpt-5-mini', 1024)).to_bytes()
+                    rendered_count = len(rendered)
+                del rendered, images, body
+            except (FileNotFoundError, ImportError) as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                f"  {rendered_count:2d} page(s): en flux +{streamed.growth / 2 ** 20:6.1f} Mo, "
+                f"en mémoire +{in_memory.growth / 2 ** 20:6.1f} Mo (corps {body_bytes / 1024:8.1f} Ko)"
+            )
+
+    def compare_extraction(self, pdf_path, raw_pages, processed_pages) -> int:
+        from analysis.services.gpt_vision_service import GPTVisionService
+
+        service = GPTVisionService()
+        results = {}
+        for name, images in (('brut', raw_pages), ('prétraité', processed_pages)):
+            prompt, _ = service.prompt_builder.build({})
+            result = service.submit_prepared({'images': images, 'prompt': prompt})
+            if 'error' in result:
+                raise CommandError(f"{pdf_path} ({name}): {result['error']}")
+            results[name] = result.get('gpt_analysis', {}) or {}
+
+        differences = 0
+        for section, field in EXTRACTION_FIELDS:
+            raw_value = (results['brut'].get(section) or {}).get(field)
+            processed_value = (results['prétraité'].get(section) or {}).get(field)
+            if raw_value != processed_value:
+                differences += 1
+                self.stdout.write(f"  ≠ {section}.{field}: brut={raw_value!r} prétraité={processed_value!r}")
+        self.stdout.write(f"  Extraction: {len(EXTRACTION_FIELDS) - differences}/{len(EXTRACTION_FIELDS)} champs identiques")
+        return differences
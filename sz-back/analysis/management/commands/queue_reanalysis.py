@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from documents.models import PaySlip
+from analysis.services.job_queue import enqueue_analysis
+
+
+class Command(BaseCommand):
+    help = "Replace des fiches de paie dans la file d'analyse (back-office, sans consommer de crédit)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('payslip_ids', nargs='+', type=int, help="Identifiants des fiches à ré-analyser.")
+        parser.add_argument(
+            '--batch', action='store_true',
+            help="Passer par l'API Batch d'OpenAI (résultat différé, moitié prix)."
+        )
+
+    def handle(self, *args, **options):
+        mode = 'batch' if options['batch'] else 'live'
+        payslips = PaySlip.objects.filter(id__in=options['payslip_ids'])
+        queued = 0
+        for payslip in payslips:
+            if payslip.file_deleted or not payslip.uploaded_file:
+                self.stderr.write(f"Fiche {payslip.id}: fichier supprimé, ré-analyse impossible.")
+                continue
+            job = enqueue_analysis(payslip, mode=mode)
+            self.stdout.write(f"Fiche {payslip.id}: tâche {job.id} en file ({mode}).")
+            queued += 1
+        missing = set(options['payslip_ids']) - set(payslips.values_list('id', flat=True))
+        for payslip_id in sorted(missing):
+            self.stderr.write(f"Fiche {payslip_id} introuvable.")
+        self.stdout.write(f"{queued} fiche(s) placée(s) en file.")
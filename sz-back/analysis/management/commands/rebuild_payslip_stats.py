@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from analysis.models import UserPayslipStats
+
+
+class Command(BaseCommand):
+    help = "Recalcule les statistiques du tableau de bord (UserPayslipStats) depuis les fiches et analyses existantes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help="Utilisateurs à recalculer (tous par défaut).")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('id')
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+        rebuilt = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            stats = UserPayslipStats.rebuild(user_id)
+            self.stdout.write(
+                f"Utilisateur {user_id}: {stats.payslip_count} fiche(s), {stats.anomaly_total} anomalie(s)."
+            )
+            rebuilt += 1
+        self.stdout.write(f"{rebuilt} utilisateur(s) recalculé(s).")
@@ -0,0 +1,67 @@
+import logging
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from analysis.services.batch_service import BatchAnalysisService
+
+logger = logging.getLogger('salariz.analysis')
+
+
+class Command(BaseCommand):
+    help = "Soumet les analyses en mode 'batch' à l'API Batch d'OpenAI et traite les lots terminés."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=getattr(settings, 'ANALYSIS_BATCH_POLL_INTERVAL', 60.0),
+            help="Délai (secondes) entre deux consultations des lots en cours."
+        )
+        parser.add_argument(
+            '--max-jobs', type=int,
+            default=getattr(settings, 'ANALYSIS_BATCH_MAX_JOBS', 100),
+            help="Nombre maximal de tâches par lot."
+        )
+        parser.add_argument('--once', action='store_true', help="Un seul cycle de soumission et de consultation.")
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:batch"
+        service = BatchAnalysisService()
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        self.stdout.write(f"Soumission en lot {worker_id} démarrée.")
+
+        while not self._stopping:
+            close_old_connections()
+            submitted = closed = 0
+            while not self._stopping:
+                try:
+                    batch = service.submit_pending(worker_id, options['max_jobs'])
+                except Exception as e:
+                    # Tâches réclamées non soumises: reprises par la récupération des baux expirés
+                    logger.exception(f"Soumission en lot {worker_id}: échec de la soumission d'un lot: {e}")
+                    break
+                if batch is None:
+                    break
+                submitted += 1
+            try:
+                closed = service.poll_batches()
+            except Exception as e:
+                logger.exception(f"Soumission en lot {worker_id}: échec de la consultation des lots: {e}")
+            if submitted or closed:
+                self.stdout.write(f"{submitted} lot(s) soumis, {closed} lot(s) clos.")
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(f"Soumission en lot {worker_id} arrêtée.")
+
+    def _request_stop(self, signum, frame):
+        logger.info(f"Signal {signum} reçu, arrêt de la soumission en lot après le cycle en cours.")
+        self._stopping = True
@@ -0,0 +1,132 @@
+import logging
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from analysis.services.circuit_breaker import VisionCircuitBreaker
+from analysis.services.job_queue import claim_next_job, reap_expired_leases, renew_leases, wait_for_jobs
+from analysis.services.pipeline import AnalysisPipeline
+
+logger = logging.getLogger('salariz.analysis')
+
+
+class Command(BaseCommand):
+    help = "Consomme la file des analyses de fiches de paie (plusieurs workers peuvent tourner en parallèle)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=getattr(settings, 'ANALYSIS_WORKER_POLL_INTERVAL', 5.0),
+            help="Délai maximal (secondes) entre deux consultations de la file."
+        )
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=getattr(settings, 'ANALYSIS_WORKER_CONCURRENCY', 12),
+            help="Nombre maximal d'appels simultanés à l'API dans ce processus."
+        )
+        parser.add_argument(
+            '--prepare-workers', type=int,
+            default=getattr(settings, 'ANALYSIS_PIPELINE_PREPARE_WORKERS', 2),
+            help="Threads de préparation (rasterisation et encodage des PDF)."
+        )
+        parser.add_argument(
+            '--buffer', type=int,
+            default=getattr(settings, 'ANALYSIS_PIPELINE_BUFFER', 2),
+            help="Documents préparés pouvant attendre un appel API libre."
+        )
+        parser.add_argument(
+            '--group-concurrency', type=int,
+            default=getattr(settings, 'ANALYSIS_GROUP_CONCURRENCY', 12),
+            help="Nombre maximal d'analyses simultanées pour un même groupe d'analyse."
+        )
+        parser.add_argument('--once', action='store_true', help="Vide la file puis s'arrête.")
+        parser.add_argument('--max-jobs', type=int, default=None, help="Nombre maximal de tâches à traiter.")
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        concurrency = max(1, options['concurrency'])
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        claimed = 0
+        pipeline = AnalysisPipeline(
+            prepare_workers=options['prepare_workers'],
+            submit_workers=concurrency,
+            buffer_size=options['buffer'],
+        ).start()
+        self.stdout.write(
+            f"Worker d'analyse {worker_id} démarré (concurrence {concurrency}, "
+            f"préparation {pipeline.prepare_workers})."
+        )
+
+        breaker = VisionCircuitBreaker() if getattr(settings, 'OPENAI_BREAKER_ENABLED', False) else None
+        paused = False
+        # Le bail est renouvelé bien avant son expiration; les baux expirés sont récupérés périodiquement
+        heartbeat_interval = getattr(settings, 'ANALYSIS_JOB_LEASE_SECONDS', 300) / 3
+        reaper_interval = getattr(settings, 'ANALYSIS_REAPER_INTERVAL', 60)
+        last_heartbeat = last_reap = 0.0
+
+        while not self._stopping:
+            close_old_connections()
+            now = time.monotonic()
+            if pipeline.in_flight and now - last_heartbeat >= heartbeat_interval:
+                renew_leases(worker_id)
+                last_heartbeat = now
+            if now - last_reap >= reaper_interval:
+                last_reap = now
+                try:
+                    reaped = reap_expired_leases()
+                    if any(reaped.values()):
+                        self.stdout.write(
+                            f"Baux expirés: {reaped['requeued']} tâche(s) remise(s) en file, "
+                            f"{reaped['abandoned']} abandonnée(s)."
+                        )
+                except Exception as e:
+                    logger.exception(f"Worker {worker_id}: échec de la récupération des baux expirés: {e}")
+            limit_reached = options['max_jobs'] is not None and claimed >= options['max_jobs']
+
+            # Disjoncteur ouvert: ne plus réclamer de tâches, elles échoueraient immédiatement
+            can_claim = breaker is None or breaker.allows_requests()
+            if can_claim == paused:
+                paused = not can_claim
+                logger.warning(
+                    f"Worker {worker_id}: API Vision indisponible, réclamation suspendue" if paused
+                    else f"Worker {worker_id}: reprise de la réclamation des tâches"
+                )
+
+            # Remplir le pipeline: les documents suivants sont préparés pendant les appels API en cours
+            while can_claim and not limit_reached and pipeline.in_flight < pipeline.capacity:
+                job = claim_next_job(worker_id, group_limit=options['group_concurrency'])
+                if job is None:
+                    break
+                pipeline.submit(job)
+                claimed += 1
+                limit_reached = options['max_jobs'] is not None and claimed >= options['max_jobs']
+
+            if not pipeline.in_flight:
+                if limit_reached or (options['once'] and can_claim):
+                    break
+                wait_for_jobs(options['poll_interval'])
+                continue
+
+            # Attendre qu'une analyse se termine (ou relancer la réclamation périodiquement)
+            pipeline.wait(options['poll_interval'])
+
+        # Arrêt demandé: laisser les analyses en cours se terminer
+        pipeline.shutdown()
+
+        self.stdout.write(
+            f"Worker d'analyse {worker_id} arrêté après {claimed} tâche(s) "
+            f"({pipeline.completed} terminée(s), {pipeline.failed} en erreur, "
+            f"{pipeline.requeued} remise(s) en file)."
+        )
+
+    def _request_stop(self, signum, frame):
+        logger.info(f"Signal {signum} reçu, arrêt du worker après les tâches en cours.")
+        self._stopping = True
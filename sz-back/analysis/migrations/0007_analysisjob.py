@@ -0,0 +1,40 @@
+# Generated by Django 4.2.20 on 2026-10-16 20:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0016_alter_payslip_processing_status'),
+        ('analysis', '0006_update_convention_choices'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bulkanalysisgroup',
+            name='convention_collective',
+            field=models.CharField(choices=[('ACTIVITES_DECHET', 'Activités du déchet'), ('AIDE_ET_SOINS_A_DOMICILE', 'Aide et soins à domicile'), ('ARTICLES_SPORT_LOISIRS', 'Articles de sport et loisirs'), ('ASSURANCES', "Sociétés d'assurances"), ('ATELIERS_CHANTIERS_INSERTION', "Ateliers et chantiers d'insertion"), ('AUDIOVISUEL_ELECTRONIQUE', 'Audiovisuel, électronique et équipement ménager'), ('BANQUE', 'Banque'), ('BATIMENT_CADRES', 'Bâtiment : Cadres'), ('BATIMENT_ETAM', 'Bâtiment : ETAM'), ('BATIMENT_OUVRIERS_MOINS_10', 'Bâtiment : Ouvriers (-10 salariés)'), ('BATIMENT_OUVRIERS_PLUS_10', 'Bâtiment : Ouvriers (+10 salariés)'), ('BOULANGERIE_ARTISANALE', 'Boulangerie-pâtisserie artisanale'), ('BRICOLAGE', 'Bricolage'), ('BUREAU_NUMERIQUE', 'Bureautique et numérique (CCN BETEM)'), ('CABINETS_DENTAIRES', 'Cabinets dentaires'), ('CABINETS_MEDICAUX', 'Cabinets médicaux'), ('CADRES_TRAVAUX_PUBLICS', 'Cadres des travaux publics'), ('CENTRES_SOCIAUX', 'Centres sociaux et socioculturels'), ('COIFFURE', 'Coiffure'), ('COMMERCE_ALIMENTAIRE', 'Commerce de détail alimentaire'), ('COMMERCE_DETAIL_ALIMENTAIRE', 'Commerce de détail alimentaire spécialisé'), ('COMMERCE_DETAIL_NON_ALIMENTAIRE', 'Commerce de détail non alimentaire'), ('COMMERCE_HABILLEMENT_TEXTILE', "Commerce de l'habillement et du textile"), ('COMMERCES_DE_GROS', 'Commerces de gros'), ('ECLAT', 'Éclat (Animation)'), ('ENSEIGNEMENT_PRIVE_INDEPENDANT', 'Enseignement privé indépendant'), ('ENSEIGNEMENT_PRIVE_NON_LUCATIF', 'Enseignement privé non lucratif (EPNL)'), ('ENTREPRISES_DE_PROPRETE', 'Entreprises de propreté'), ('ESTHETIQUE_COSMETIQUE', 'Esthétique-cosmétique'), ('EXPERTS_COMPTABLES', 'Experts-comptables'), ('FERROVIAIRE', 'Ferroviaire'), ('GARDIENS_IMMEUBLES', "Gardiens, concierges et employés d'immeubles"), ('HABILLEMENT_SUCCURSALES', 'Habillement : succursales'), ('HCR', 'Hôtels, Cafés, Restaurants (HCR)'), ('HOSPITALISATION_NON_LUCATIF', 'Hospitalisation privée non lucrative (FEHAP)'), ('HOSPITALISATION_PRIVEE', 'Hospitalisation privée (FHP)'), ('IMMOBILIER', 'Immobilier'), ('INDUSTRIE_PHARMACEUTIQUE', 'Industrie pharmaceutique'), ('INDUSTRIES_ALIMENTAIRES_DIVERSES', 'Industries alimentaires diverses'), ('INDUSTRIES_CHIMIQUES', 'Industries chimiques'), ('MAINTENANCE_MATERIELS_AGRICOLES', 'Maintenance des matériels agricoles'), ('METALLURGIE_CADRES', 'Métallurgie : Cadres'), ('METALLURGIE_REGION_PARISIENNE', 'Métallurgie (région parisienne)'), ('NEGOCE_AMEUBLEMENT', "Négoce de l'ameublement"), ('NEGOCE_MATERIAUX_CONSTRUCTION', 'Négoce des matériaux de construction'), ('NOTARIAT', 'Notariat'), ('ORGANISMES_FORMATION', 'Organismes de formation'), ('PARTICULIERS_EMPLOYEURS', 'Particuliers employeurs'), ('PERSONNES_INADAPTEES', 'Personnes inadaptées et handicapées (CCN 66)'), ('PHARMACIE_OFFICINE', "Pharmacie d'officine"), ('PLASTURGIE', 'Plasturgie'), ('PRESTATAIRES_TERTIAIRE', 'Prestataires de services du secteur tertiaire'), ('PREVENTION_SECURITE', 'Prévention et sécurité'), ('PUBLICITE', 'Publicité'), ('RESTAURATION_COLLECTIVITES', 'Restauration de collectivités'), ('RESTAURATION_RAPIDE', 'Restauration rapide'), ('SECURITE_SOCIALE', 'Sécurité sociale'), ('SERVICES_A_LA_PERSONNE', 'Services à la personne'), ('SERVICES_AUTOMOBILE', "Services de l'automobile"), ('SPORT', 'Sport'), ('SYNTEC', "Syntec (Bureaux d'études techniques)"), ('TELECOMMUNICATIONS', 'Télécommunications'), ('TRANSPORT_AERIEN_PERSONNEL_SOL', 'Transport aérien - Personnel au sol'), ('TRANSPORTS_PUBLICS_URBAINS', 'Transports publics urbains'), ('TRANSPORTS_ROUTIERS', 'Transports routiers'), ('TRAVAUX_PUBLICS_ETAM', 'Travaux publics : ETAM'), ('TRAVAUX_PUBLICS_OUVRIERS', 'Travaux publics : Ouvriers'), ('AUTRE', 'Autre / Non spécifiée')], default='AUTRE', max_length=50, verbose_name='Convention collective'),
+        ),
+        migrations.CreateModel(
+            name='AnalysisJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', "En file d'attente"), ('processing', 'En cours'), ('completed', 'Terminée'), ('error', 'Erreur')], default='queued', max_length=20, verbose_name='Statut')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Tentatives')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Début du traitement')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fin du traitement')),
+                ('worker_id', models.CharField(blank=True, default='', max_length=255, verbose_name='Worker')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Dernière erreur')),
+                ('payslip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analysis_jobs', to='documents.payslip', verbose_name='Fiche de paie')),
+            ],
+            options={
+                'verbose_name': "Tâche d'analyse",
+                'verbose_name_plural': "Tâches d'analyse",
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='analysis_an_status_5e3c68_idx')],
+            },
+        ),
+    ]
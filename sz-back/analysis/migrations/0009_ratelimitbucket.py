@@ -0,0 +1,27 @@
+# Generated by Django 4.2.20 on 2026-10-16 20:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0008_analysisjob_group'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='Clé')),
+                ('requests_available', models.FloatField(default=0, verbose_name='Requêtes disponibles')),
+                ('tokens_available', models.FloatField(default=0, verbose_name='Tokens disponibles')),
+                ('refilled_at', models.DateTimeField(verbose_name='Dernier remplissage')),
+            ],
+            options={
+                'verbose_name': 'Limiteur de débit OpenAI',
+                'verbose_name_plural': 'Limiteurs de débit OpenAI',
+            },
+        ),
+    ]
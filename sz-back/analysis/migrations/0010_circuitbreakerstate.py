@@ -0,0 +1,36 @@
+# Generated by Django 4.2.20 on 2026-10-16 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0009_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CircuitBreakerState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True, verbose_name='Clé')),
+                ('state', models.CharField(choices=[('closed', 'Fermé'), ('open', 'Ouvert'), ('half_open', 'Semi-ouvert')], default='closed', max_length=20, verbose_name='État')),
+                ('consecutive_failures', models.IntegerField(default=0, verbose_name='Échecs consécutifs')),
+                ('opened_at', models.DateTimeField(blank=True, null=True, verbose_name='Ouvert depuis')),
+                ('probe_started_at', models.DateTimeField(blank=True, null=True, verbose_name='Début de la requête de test')),
+                ('successes', models.IntegerField(default=0, verbose_name='Succès')),
+                ('failures', models.IntegerField(default=0, verbose_name='Échecs')),
+                ('slo_breaches', models.IntegerField(default=0, verbose_name='Dépassements du SLO de latence')),
+                ('short_circuits', models.IntegerField(default=0, verbose_name='Appels refusés')),
+                ('hedged_requests', models.IntegerField(default=0, verbose_name='Requêtes dupliquées')),
+                ('hedge_wins', models.IntegerField(default=0, verbose_name='Duplicatas plus rapides')),
+                ('p95_latency_seconds', models.FloatField(blank=True, null=True, verbose_name='Latence p95 (s)')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Mis à jour le')),
+            ],
+            options={
+                'verbose_name': 'Disjoncteur API Vision',
+                'verbose_name_plural': 'Disjoncteurs API Vision',
+            },
+        ),
+    ]
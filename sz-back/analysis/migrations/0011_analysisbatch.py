@@ -0,0 +1,46 @@
+# Generated by Django 4.2.20 on 2026-10-16 20:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0010_circuitbreakerstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('openai_batch_id', models.CharField(max_length=100, unique=True, verbose_name='Identifiant OpenAI')),
+                ('input_file_id', models.CharField(max_length=100, verbose_name="Fichier d'entrée")),
+                ('output_file_id', models.CharField(blank=True, default='', max_length=100, verbose_name='Fichier de résultats')),
+                ('error_file_id', models.CharField(blank=True, default='', max_length=100, verbose_name="Fichier d'erreurs")),
+                ('endpoint', models.CharField(max_length=50, verbose_name='Endpoint')),
+                ('model', models.CharField(max_length=50, verbose_name='Modèle')),
+                ('status', models.CharField(choices=[('validating', 'Validation'), ('in_progress', 'En cours'), ('finalizing', 'Finalisation'), ('completed', 'Terminé'), ('failed', 'Échec'), ('expired', 'Expiré'), ('cancelling', 'Annulation en cours'), ('cancelled', 'Annulé')], default='validating', max_length=20, verbose_name='Statut')),
+                ('request_count', models.IntegerField(default=0, verbose_name='Nombre de requêtes')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de soumission')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Date de fin')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Dernière erreur')),
+            ],
+            options={
+                'verbose_name': 'Lot OpenAI',
+                'verbose_name_plural': 'Lots OpenAI',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='analysisjob',
+            name='mode',
+            field=models.CharField(choices=[('live', 'Temps réel'), ('batch', 'API Batch')], default='live', max_length=10, verbose_name='Mode'),
+        ),
+        migrations.AddField(
+            model_name='analysisjob',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='analysis.analysisbatch', verbose_name='Lot OpenAI'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.20 on 2026-10-16 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0011_analysisbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='credits_charged',
+            field=models.IntegerField(default=0, verbose_name='Crédits débités'),
+        ),
+        migrations.AddField(
+            model_name='analysisjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Dernier signe de vie'),
+        ),
+        migrations.AddField(
+            model_name='analysisjob',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Expiration du bail'),
+        ),
+        migrations.AddIndex(
+            model_name='analysisjob',
+            index=models.Index(fields=['status', 'lease_expires_at'], name='analysis_an_status_0d26a7_idx'),
+        ),
+    ]
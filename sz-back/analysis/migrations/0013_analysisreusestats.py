@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-16 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0012_analysisjob_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisReuseStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(default='default', max_length=50, unique=True, verbose_name='Clé')),
+                ('lookups', models.IntegerField(default=0, verbose_name='Recherches')),
+                ('hits', models.IntegerField(default=0, verbose_name='Analyses réutilisées')),
+                ('cost_saved', models.FloatField(default=0, verbose_name='Coût API évité (USD)')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Mise à jour')),
+            ],
+            options={
+                'verbose_name': "Réutilisation d'analyses",
+                'verbose_name_plural': "Réutilisations d'analyses",
+            },
+        ),
+    ]
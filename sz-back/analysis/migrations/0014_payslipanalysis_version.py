@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-16 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0013_analysisreusestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payslipanalysis',
+            name='version',
+            field=models.PositiveIntegerField(default=1, verbose_name='Version'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.20 on 2026-10-16 21:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('analysis', '0014_payslipanalysis_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserPayslipStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payslip_count', models.IntegerField(default=0, verbose_name='Fiches de paie')),
+                ('last_upload_date', models.DateTimeField(blank=True, null=True, verbose_name='Dernier upload')),
+                ('score_count', models.IntegerField(default=0, verbose_name='Analyses notées')),
+                ('score_sum', models.FloatField(default=0, verbose_name='Somme des notes globales')),
+                ('conformity_count', models.IntegerField(default=0, verbose_name='Analyses avec note de conformité')),
+                ('conformity_sum', models.FloatField(default=0, verbose_name='Somme des notes de conformité')),
+                ('anomaly_total', models.IntegerField(default=0, verbose_name='Anomalies détectées')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Mise à jour')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='payslip_stats', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Statistiques utilisateur',
+                'verbose_name_plural': 'Statistiques utilisateurs',
+            },
+        ),
+    ]
@@ -0,0 +1,83 @@
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+SUMMARY_FIELDS = ('global_score', 'conformity_score', 'anomaly_count', 'observation_count')
+
+
+# Copie figée de analysis.models.summarize_analysis_details à la date de la migration:
+# une évolution ultérieure du calcul ne doit pas changer ce que fait ce remplissage
+def _parse_score(value):
+    if value is None:
+        return None
+    try:
+        return float(str(value).replace(',', '.'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_displayed_anomaly(anomaly):
+    anomaly = anomaly if isinstance(anomaly, dict) else {}
+    level = anomaly.get('level') or anomaly.get('gravite')
+    return not level or str(level).lower() not in {'positive_check', 'ok'}
+
+
+def _summarize(analysis_details):
+    details = analysis_details if isinstance(analysis_details, dict) else {}
+    gpt = details.get('gpt_analysis') or {}
+    if not isinstance(gpt, dict):
+        gpt = {}
+    anomalies = gpt.get('anomalies_potentielles_observees') or []
+    if not isinstance(anomalies, list):
+        anomalies = []
+    return {
+        'global_score': _parse_score(gpt.get('note_globale')),
+        'conformity_score': _parse_score(gpt.get('note_conformite_legale')),
+        'anomaly_count': sum(1 for anomaly in anomalies if _is_displayed_anomaly(anomaly)),
+        'observation_count': len(anomalies),
+    }
+
+
+def backfill_summary(apps, schema_editor):
+    PayslipAnalysis = apps.get_model('analysis', 'PayslipAnalysis')
+    batch = []
+    for analysis in PayslipAnalysis.objects.only('id', 'analysis_details').iterator(chunk_size=BATCH_SIZE):
+        for field, value in _summarize(analysis.analysis_details).items():
+            setattr(analysis, field, value)
+        batch.append(analysis)
+        if len(batch) >= BATCH_SIZE:
+            PayslipAnalysis.objects.bulk_update(batch, SUMMARY_FIELDS)
+            batch = []
+    if batch:
+        PayslipAnalysis.objects.bulk_update(batch, SUMMARY_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0015_userpayslipstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payslipanalysis',
+            name='global_score',
+            field=models.FloatField(blank=True, db_index=True, null=True, verbose_name='Note globale'),
+        ),
+        migrations.AddField(
+            model_name='payslipanalysis',
+            name='conformity_score',
+            field=models.FloatField(blank=True, db_index=True, null=True, verbose_name='Note de conformité légale'),
+        ),
+        migrations.AddField(
+            model_name='payslipanalysis',
+            name='anomaly_count',
+            field=models.IntegerField(db_index=True, default=0, verbose_name='Anomalies affichées'),
+        ),
+        migrations.AddField(
+            model_name='payslipanalysis',
+            name='observation_count',
+            field=models.IntegerField(default=0, verbose_name='Anomalies observées'),
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
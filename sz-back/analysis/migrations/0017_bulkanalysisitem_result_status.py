@@ -0,0 +1,90 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+
+# Copies figées des calculs de BulkAnalysisGroup à la date de la migration: une évolution
+# ultérieure de analysis.models ne doit pas changer ce que fait ce remplissage
+def _item_contribution(payslip, analysis):
+    details = (analysis.analysis_details or {}).get('gpt_analysis', {}) or {}
+
+    amount = Decimal('0.00')
+    montant_du_str = (details.get('evaluation_financiere_salarie', {}) or {}).get('montant_potentiel_du_salarie')
+    if montant_du_str:
+        try:
+            amount = Decimal(str(montant_du_str).replace(',', '.').replace(' ', ''))
+        except InvalidOperation:
+            pass
+
+    missing = {}
+    for prime_anomaly in details.get('anomalies_potentielles_observees', []) or []:
+        if isinstance(prime_anomaly, dict) and prime_anomaly.get('type') == 'prime_manquante':
+            prime_name = prime_anomaly.get('description', 'Prime inconnue')
+            missing[prime_name] = missing.get(prime_name, 0) + 1
+
+    month = payslip.period_date.strftime('%Y-%m') if payslip.period_date else 'inconnu'
+    return amount, missing, (month, amount, analysis.anomaly_count)
+
+
+def _merge_counts(current, additions):
+    merged = dict(current or {})
+    for key, count in additions.items():
+        merged[key] = merged.get(key, 0) + count
+    return merged
+
+
+def _merge_month_summary(current, month, amount, anomalies):
+    merged = dict(current or {})
+    entry = dict(merged.get(month) or {})
+    entry['payslips'] = entry.get('payslips', 0) + 1
+    entry['amount_due'] = float(Decimal(str(entry.get('amount_due', 0))) + amount)
+    entry['anomalies'] = entry.get('anomalies', 0) + anomalies
+    merged[month] = entry
+    return dict(sorted(merged.items()))
+
+
+def backfill_item_results(apps, schema_editor):
+    """
+    Marque les fiches déjà analysées et recalcule les totaux des groupes non terminés,
+    qui sont désormais cumulés fiche par fiche.
+    """
+    BulkAnalysisGroup = apps.get_model('analysis', 'BulkAnalysisGroup')
+    BulkAnalysisItem = apps.get_model('analysis', 'BulkAnalysisItem')
+    PayslipAnalysis = apps.get_model('analysis', 'PayslipAnalysis')
+
+    for group in BulkAnalysisGroup.objects.iterator():
+        in_progress = group.status != 'completed'
+        total, missing, summary = Decimal('0.00'), {}, {}
+        items = BulkAnalysisItem.objects.filter(group=group).select_related('payslip')
+        for item in items:
+            analysis = PayslipAnalysis.objects.filter(payslip_id=item.payslip_id).first()
+            if analysis is None or analysis.analysis_status not in ('success', 'error'):
+                continue
+            item.result_status = analysis.analysis_status
+            item.save(update_fields=['result_status'])
+            if in_progress and analysis.analysis_status == 'success':
+                amount, item_missing, month_summary = _item_contribution(item.payslip, analysis)
+                total += amount
+                missing = _merge_counts(missing, item_missing)
+                summary = _merge_month_summary(summary, *month_summary)
+        if in_progress:
+            group.total_amount_due = total
+            group.missing_benefits = missing
+            group.summary = summary
+            group.save(update_fields=['total_amount_due', 'missing_benefits', 'summary'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0016_payslipanalysis_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkanalysisitem',
+            name='result_status',
+            field=models.CharField(blank=True, choices=[('success', 'Succès'), ('error', 'Erreur')], default='', max_length=10, verbose_name='Résultat comptabilisé'),
+        ),
+        migrations.RunPython(backfill_item_results, migrations.RunPython.noop),
+    ]
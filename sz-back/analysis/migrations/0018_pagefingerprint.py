@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('analysis', '0017_bulkanalysisitem_result_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phash', models.CharField(max_length=256, verbose_name='Empreinte perceptuelle')),
+                ('documents_seen', models.IntegerField(default=0, verbose_name='Documents contenant la page')),
+                ('last_document_sha256', models.CharField(blank=True, default='', max_length=64, verbose_name='Dernier document')),
+                ('last_seen_at', models.DateTimeField(verbose_name='Vue pour la dernière fois')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='page_fingerprints', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Empreinte de page',
+                'verbose_name_plural': 'Empreintes de pages',
+                'unique_together': {('user', 'phash')},
+            },
+        ),
+    ]
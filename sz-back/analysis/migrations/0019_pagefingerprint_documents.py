@@ -0,0 +1,53 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_documents(apps, schema_editor):
+    PageFingerprint = apps.get_model('analysis', 'PageFingerprint')
+    PageFingerprintDocument = apps.get_model('analysis', 'PageFingerprintDocument')
+    documents = [
+        PageFingerprintDocument(fingerprint_id=fingerprint_id, document_sha256=sha)
+        for fingerprint_id, sha in PageFingerprint.objects.exclude(last_document_sha256='').values_list(
+            'id', 'last_document_sha256'
+        ).iterator()
+    ]
+    PageFingerprintDocument.objects.bulk_create(documents, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0018_pagefingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagefingerprint',
+            name='ink_ratio_min',
+            field=models.FloatField(blank=True, null=True, verbose_name="Taux d'encre minimal"),
+        ),
+        migrations.AddField(
+            model_name='pagefingerprint',
+            name='ink_ratio_max',
+            field=models.FloatField(blank=True, null=True, verbose_name="Taux d'encre maximal"),
+        ),
+        migrations.CreateModel(
+            name='PageFingerprintDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_sha256', models.CharField(max_length=64, verbose_name='Document')),
+                ('counted_at', models.DateTimeField(auto_now_add=True, verbose_name='Compté le')),
+                ('fingerprint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='analysis.pagefingerprint', verbose_name='Empreinte de page')),
+            ],
+            options={
+                'verbose_name': "Document d'une empreinte de page",
+                'verbose_name_plural': 'Documents des empreintes de pages',
+                'unique_together': {('fingerprint', 'document_sha256')},
+            },
+        ),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='pagefingerprint',
+            name='last_document_sha256',
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def drop_perceptual_fingerprints(apps, schema_editor):
+    # Les empreintes dHash ne sont pas comparables aux empreintes exactes: l'historique repart de zéro
+    PageFingerprint = apps.get_model('analysis', 'PageFingerprint')
+    PageFingerprint.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('analysis', '0019_pagefingerprint_documents'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_perceptual_fingerprints, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='pagefingerprint',
+            unique_together=set(),
+        ),
+        migrations.RemoveField(
+            model_name='pagefingerprint',
+            name='phash',
+        ),
+        migrations.RemoveField(
+            model_name='pagefingerprint',
+            name='ink_ratio_min',
+        ),
+        migrations.RemoveField(
+            model_name='pagefingerprint',
+            name='ink_ratio_max',
+        ),
+        migrations.AddField(
+            model_name='pagefingerprint',
+            name='page_hash',
+            field=models.CharField(default='', max_length=64, verbose_name='Empreinte de la page'),
+            preserve_default=False,
+        ),
+        migrations.AlterUniqueTogether(
+            name='pagefingerprint',
+            unique_together={('user', 'page_hash')},
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from documents.models import PaySlip # On importe PaySlip depuis documents
@@ -96,6 +98,13 @@ class PayslipAnalysis(models.Model):
         verbose_name=_('Statut de l\'analyse')
     )
     analysis_details = models.JSONField(default=dict, blank=True, verbose_name=_('Détails de l\'analyse'))
+    # Incrémentée à chaque enregistrement: sert d'ETag aux endpoints de résultats
+    version = models.PositiveIntegerField(default=1, verbose_name=_('Version'))
+    # Résumé dénormalisé de analysis_details, lu par les listes et le tableau de bord sans charger le JSON
+    global_score = models.FloatField(null=True, blank=True, db_index=True, verbose_name=_('Note globale'))
+    conformity_score = models.FloatField(null=True, blank=True, db_index=True, verbose_name=_('Note de conformité légale'))
+    anomaly_count = models.IntegerField(default=0, db_index=True, verbose_name=_('Anomalies affichées'))
+    observation_count = models.IntegerField(default=0, verbose_name=_('Anomalies observées'))
 
     class Meta:
         verbose_name = "Analyse de fiche de paie"
@@ -104,6 +113,176 @@ class PayslipAnalysis(models.Model):
     def __str__(self):
         return f"Analyse #{self.id} pour {self.payslip}"
 
+    def refresh_summary(self) -> None:
+        """Recalcule les colonnes de résumé depuis analysis_details."""
+        for field, value in summarize_analysis_details(self.analysis_details).items():
+            setattr(self, field, value)
+
+    def stats_contribution(self) -> dict:
+        """Part de cette analyse dans les statistiques du tableau de bord."""
+        return {'score': self.global_score, 'conformity': self.conformity_score, 'anomalies': self.observation_count}
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'analysis_details' in update_fields:
+            self.refresh_summary()
+            if update_fields is not None:
+                update_fields = set(update_fields) | set(SUMMARY_FIELDS)
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                self.version = (self.version or 0) + 1
+                if update_fields is not None:
+                    update_fields = set(update_fields) | {'version'}
+                row = (
+                    PayslipAnalysis.objects.filter(pk=self.pk)
+                    .values_list('global_score', 'conformity_score', 'observation_count')
+                    .first()
+                )
+                if row is not None:
+                    previous = {'score': row[0], 'conformity': row[1], 'anomalies': row[2]}
+            if update_fields is not None:
+                kwargs['update_fields'] = list(update_fields)
+            super().save(*args, **kwargs)
+            # Statistiques du tableau de bord mises à jour dans la même transaction
+            user_id = PaySlip.objects.filter(pk=self.payslip_id).values_list('user_id', flat=True).first()
+            if user_id is not None:
+                UserPayslipStats.apply_analysis_change(user_id, previous, self.stats_contribution())
+
+
+def _parse_score(value):
+    if value is None:
+        return None
+    try:
+        return float(str(value).replace(',', '.'))
+    except (TypeError, ValueError):
+        return None
+
+
+SUMMARY_FIELDS = ('global_score', 'conformity_score', 'anomaly_count', 'observation_count')
+
+
+def _is_displayed_anomaly(anomaly) -> bool:
+    # Comme côté front: tout sauf les contrôles 'ok' / 'positive_check'
+    anomaly = anomaly if isinstance(anomaly, dict) else {}
+    level = anomaly.get('level') or anomaly.get('gravite')
+    return not level or str(level).lower() not in {'positive_check', 'ok'}
+
+
+def summarize_analysis_details(analysis_details) -> dict:
+    """Valeurs des colonnes de résumé de PayslipAnalysis pour un JSON d'analyse."""
+    details = analysis_details if isinstance(analysis_details, dict) else {}
+    gpt = details.get('gpt_analysis') or {}
+    if not isinstance(gpt, dict):
+        gpt = {}
+    anomalies = gpt.get('anomalies_potentielles_observees') or []
+    if not isinstance(anomalies, list):
+        anomalies = []
+    return {
+        'global_score': _parse_score(gpt.get('note_globale')),
+        'conformity_score': _parse_score(gpt.get('note_conformite_legale')),
+        'anomaly_count': sum(1 for anomaly in anomalies if _is_displayed_anomaly(anomaly)),
+        'observation_count': len(anomalies),
+    }
+
+
+class UserPayslipStats(models.Model):
+    """
+    Statistiques du tableau de bord d'un utilisateur, tenues à jour à chaque enregistrement
+    ou suppression d'analyse (et de fiche) au lieu d'être recalculées depuis les JSON d'analyse.
+    La ligne est créée à l'inscription; pour un utilisateur plus ancien, elle est recalculée
+    (rebuild) à la première lecture et les mises à jour incrémentales l'ignorent jusque-là.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='payslip_stats',
+        verbose_name=_('Utilisateur')
+    )
+    payslip_count = models.IntegerField(default=0, verbose_name=_('Fiches de paie'))
+    last_upload_date = models.DateTimeField(null=True, blank=True, verbose_name=_('Dernier upload'))
+    score_count = models.IntegerField(default=0, verbose_name=_('Analyses notées'))
+    score_sum = models.FloatField(default=0, verbose_name=_('Somme des notes globales'))
+    conformity_count = models.IntegerField(default=0, verbose_name=_('Analyses avec note de conformité'))
+    conformity_sum = models.FloatField(default=0, verbose_name=_('Somme des notes de conformité'))
+    anomaly_total = models.IntegerField(default=0, verbose_name=_('Anomalies détectées'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Mise à jour'))
+
+    class Meta:
+        verbose_name = _('Statistiques utilisateur')
+        verbose_name_plural = _('Statistiques utilisateurs')
+
+    def __str__(self):
+        return f"Statistiques de l'utilisateur {self.user_id}"
+
+    @property
+    def avg_score(self) -> float:
+        return round(self.score_sum / self.score_count, 1) if self.score_count else 0.0
+
+    @property
+    def avg_conformity(self) -> float:
+        return round(self.conformity_sum / self.conformity_count, 1) if self.conformity_count else 0.0
+
+    @classmethod
+    def _increment(cls, user_id, **deltas):
+        # Jamais de création ici: une ligne absente (utilisateur antérieur aux statistiques) est
+        # recalculée entièrement à la première lecture (rebuild), un compteur partant de zéro serait faux
+        changes = {field: models.F(field) + delta for field, delta in deltas.items() if delta}
+        if changes:
+            cls.objects.filter(user_id=user_id).update(**changes)
+
+    @classmethod
+    def apply_analysis_change(cls, user_id, old, new) -> None:
+        """
+        Remplace la contribution de l'ancienne version d'une analyse par celle de la nouvelle
+        (dicts de PayslipAnalysis.stats_contribution(), None = absente).
+        """
+        deltas = {'score_count': 0, 'score_sum': 0.0, 'conformity_count': 0, 'conformity_sum': 0.0, 'anomaly_total': 0}
+        for sign, part in ((-1, old), (1, new)):
+            if part is None:
+                continue
+            if part['score'] is not None:
+                deltas['score_count'] += sign
+                deltas['score_sum'] += sign * part['score']
+            if part['conformity'] is not None:
+                deltas['conformity_count'] += sign
+                deltas['conformity_sum'] += sign * part['conformity']
+            deltas['anomaly_total'] += sign * part['anomalies']
+        cls._increment(user_id, **deltas)
+
+    @classmethod
+    def record_upload(cls, user_id, upload_date) -> None:
+        cls._increment(user_id, payslip_count=1)
+        cls.objects.filter(user_id=user_id).filter(
+            models.Q(last_upload_date__isnull=True) | models.Q(last_upload_date__lt=upload_date)
+        ).update(last_upload_date=upload_date)
+
+    @classmethod
+    def record_payslip_deleted(cls, user_id) -> None:
+        cls._increment(user_id, payslip_count=-1)
+        last_upload = PaySlip.objects.filter(user_id=user_id).aggregate(last=models.Max('upload_date'))['last']
+        cls.objects.filter(user_id=user_id).update(last_upload_date=last_upload)
+
+    @classmethod
+    def rebuild(cls, user_id) -> 'UserPayslipStats':
+        """Recalcule entièrement les statistiques d'un utilisateur (rattrapage, commande rebuild_payslip_stats)."""
+        with transaction.atomic():
+            payslips = PaySlip.objects.filter(user_id=user_id)
+            values = {
+                'payslip_count': payslips.count(),
+                'last_upload_date': payslips.aggregate(last=models.Max('upload_date'))['last'],
+            }
+            totals = PayslipAnalysis.objects.filter(payslip__user_id=user_id).aggregate(
+                score_count=models.Count('global_score'),
+                score_sum=models.Sum('global_score'),
+                conformity_count=models.Count('conformity_score'),
+                conformity_sum=models.Sum('conformity_score'),
+                anomaly_total=models.Sum('observation_count'),
+            )
+            values.update({field: total or 0 for field, total in totals.items()})
+            stats, _ = cls.objects.update_or_create(user_id=user_id, defaults=values)
+        return stats
+
 
 # --- NOUVEAUX MODÈLES POUR L'ANALYSE GROUPÉE ---
 class BulkAnalysisGroup(models.Model):
@@ -152,50 +331,96 @@ class BulkAnalysisGroup(models.Model):
     def __str__(self):
         return f"Analyse groupée #{self.id} - {self.user.username}"
 
-    def update_progress(self):
-        """Met à jour la progression et lance l'agrégation si terminé."""
-        self.processed_files = PayslipAnalysis.objects.filter(
-            payslip__bulk_analysis_items__group=self,
-            analysis_status__in=['success', 'error']
-        ).count()
-        
-        if self.processed_files >= self.total_files:
-            self.status = 'completed'
-            self.aggregate_results()
-        elif self.processed_files > 0:
-            self.status = 'processing'
-        
-        self.save(update_fields=['processed_files', 'status'])
-
-    def aggregate_results(self):
-        """Calcule les résultats agrégés à partir des analyses individuelles."""
-        total = Decimal('0.00')
+    def record_item_result(self, payslip) -> bool:
+        """
+        Applique le résultat de l'analyse d'une fiche du groupe, en temps constant quelle
+        que soit la taille du groupe: la fiche est marquée une seule fois (mise à jour
+        conditionnelle de BulkAnalysisItem.result_status), la progression et les totaux du
+        groupe sont incrémentés, et le groupe passe à 'completed' une seule fois.
+        Retourne True si cet appel a terminé le groupe.
+        """
+        analysis = (
+            PayslipAnalysis.objects.filter(payslip_id=payslip.id)
+            .only('analysis_status', 'analysis_details', 'anomaly_count')
+            .first()
+        )
+        if analysis is None or analysis.analysis_status not in ('success', 'error'):
+            return False
+        outcome = analysis.analysis_status
+        group_model = type(self)
+
+        with transaction.atomic():
+            # Verrou sur la ligne du groupe: les champs JSON cumulés sont fusionnés sans perte
+            locked = group_model.objects.select_for_update().only('missing_benefits', 'summary').get(pk=self.pk)
+            item = (
+                BulkAnalysisItem.objects.filter(group_id=self.pk, payslip_id=payslip.id)
+                .values_list('pk', 'result_status')
+                .first()
+            )
+            # Une fiche n'est comptée qu'une fois; une erreur suivie d'un succès (nouvelle tentative) ajoute ses résultats
+            if item is None or item[1] in ('success', outcome):
+                return False
+            item_pk, item_status = item
+            if not BulkAnalysisItem.objects.filter(pk=item_pk, result_status=item_status).update(result_status=outcome):
+                return False
+
+            updates = {}
+            if item_status == '':
+                updates['processed_files'] = models.F('processed_files') + 1
+            if outcome == 'success':
+                amount, missing, month_summary = self._item_contribution(payslip, analysis)
+                updates['total_amount_due'] = Coalesce(models.F('total_amount_due'), Value(Decimal('0.00'))) + amount
+                updates['missing_benefits'] = _merge_counts(locked.missing_benefits, missing)
+                updates['summary'] = _merge_month_summary(locked.summary, *month_summary)
+            group_model.objects.filter(pk=self.pk).update(**updates)
+
+            completed = group_model.objects.filter(
+                pk=self.pk, processed_files__gte=models.F('total_files')
+            ).exclude(status='completed').update(status='completed') == 1
+            if not completed:
+                group_model.objects.filter(pk=self.pk, status='pending').update(status='processing')
+
+        self.refresh_from_db(fields=['processed_files', 'status', 'total_amount_due', 'missing_benefits', 'summary'])
+        return completed
+
+    @staticmethod
+    def _item_contribution(payslip, analysis):
+        """Montant dû, primes manquantes et résumé du mois pour une analyse réussie."""
+        details = (analysis.analysis_details or {}).get('gpt_analysis', {}) or {}
+
+        amount = Decimal('0.00')
+        montant_du_str = (details.get('evaluation_financiere_salarie', {}) or {}).get('montant_potentiel_du_salarie')
+        if montant_du_str:
+            try:
+                amount = Decimal(str(montant_du_str).replace(',', '.').replace(' ', ''))
+            except InvalidOperation:
+                pass
+
         missing = {}
-        
-        analyses = PayslipAnalysis.objects.filter(
-            payslip__bulk_analysis_items__group=self,
-            analysis_status='success'
-        ).select_related('payslip').order_by('payslip__period_date')
-
-        for analysis in analyses:
-            details = analysis.analysis_details.get('gpt_analysis', {})
-            
-            montant_du_str = details.get('evaluation_financiere_salarie', {}).get('montant_potentiel_du_salarie')
-            if montant_du_str:
-                try:
-                    total += Decimal(str(montant_du_str).replace(',', '.').replace(' ', ''))
-                except InvalidOperation:
-                    pass
-            
-            primes = details.get('anomalies_potentielles_observees', [])
-            for prime_anomaly in primes:
-                if prime_anomaly.get('type') == 'prime_manquante':
-                    prime_name = prime_anomaly.get('description', 'Prime inconnue')
-                    missing[prime_name] = missing.get(prime_name, 0) + 1
-        
-        self.total_amount_due = total
-        self.missing_benefits = missing
-        self.save(update_fields=['total_amount_due', 'missing_benefits', 'status'])
+        for prime_anomaly in details.get('anomalies_potentielles_observees', []) or []:
+            if isinstance(prime_anomaly, dict) and prime_anomaly.get('type') == 'prime_manquante':
+                prime_name = prime_anomaly.get('description', 'Prime inconnue')
+                missing[prime_name] = missing.get(prime_name, 0) + 1
+
+        month = payslip.period_date.strftime('%Y-%m') if payslip.period_date else 'inconnu'
+        return amount, missing, (month, amount, analysis.anomaly_count)
+
+
+def _merge_counts(current, additions) -> dict:
+    merged = dict(current or {})
+    for key, count in additions.items():
+        merged[key] = merged.get(key, 0) + count
+    return merged
+
+
+def _merge_month_summary(current, month, amount, anomalies) -> dict:
+    merged = dict(current or {})
+    entry = dict(merged.get(month) or {})
+    entry['payslips'] = entry.get('payslips', 0) + 1
+    entry['amount_due'] = float(Decimal(str(entry.get('amount_due', 0))) + amount)
+    entry['anomalies'] = entry.get('anomalies', 0) + anomalies
+    merged[month] = entry
+    return dict(sorted(merged.items()))
 
 
 class BulkAnalysisItem(models.Model):
@@ -213,9 +438,253 @@ class BulkAnalysisItem(models.Model):
         verbose_name=_('Fiche de paie')
     )
     order = models.IntegerField(default=0, verbose_name=_('Ordre'))
+    # Résultat déjà pris en compte dans la progression et les totaux du groupe ('' = pas encore)
+    result_status = models.CharField(
+        max_length=10,
+        blank=True,
+        default='',
+        choices=[('success', 'Succès'), ('error', 'Erreur')],
+        verbose_name=_('Résultat comptabilisé')
+    )
     
     class Meta:
         verbose_name = _('Élément d\'analyse groupée')
         verbose_name_plural = _('Éléments d\'analyse groupée')
         ordering = ['order']
-        unique_together = ['group', 'payslip']
\ No newline at end of file
+        unique_together = ['group', 'payslip']
+
+# --- FILE D'ATTENTE DES ANALYSES ---
+class AnalysisBatch(models.Model):
+    """
+    Lot soumis à l'API Batch d'OpenAI (`manage.py run_analysis_batches`).
+    Les résultats arrivent en différé (fenêtre de 24 h) à moitié prix.
+    """
+    # Statuts renvoyés par l'API Batch
+    STATUS_CHOICES = [
+        ('validating', 'Validation'),
+        ('in_progress', 'En cours'),
+        ('finalizing', 'Finalisation'),
+        ('completed', 'Terminé'),
+        ('failed', 'Échec'),
+        ('expired', 'Expiré'),
+        ('cancelling', 'Annulation en cours'),
+        ('cancelled', 'Annulé'),
+    ]
+    TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+    openai_batch_id = models.CharField(max_length=100, unique=True, verbose_name=_('Identifiant OpenAI'))
+    input_file_id = models.CharField(max_length=100, verbose_name=_('Fichier d\'entrée'))
+    output_file_id = models.CharField(max_length=100, blank=True, default='', verbose_name=_('Fichier de résultats'))
+    error_file_id = models.CharField(max_length=100, blank=True, default='', verbose_name=_('Fichier d\'erreurs'))
+    endpoint = models.CharField(max_length=50, verbose_name=_('Endpoint'))
+    model = models.CharField(max_length=50, verbose_name=_('Modèle'))
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='validating', verbose_name=_('Statut'))
+    request_count = models.IntegerField(default=0, verbose_name=_('Nombre de requêtes'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Date de soumission'))
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Date de fin'))
+    last_error = models.TextField(blank=True, default='', verbose_name=_('Dernière erreur'))
+
+    class Meta:
+        verbose_name = _('Lot OpenAI')
+        verbose_name_plural = _('Lots OpenAI')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.openai_batch_id} ({self.status}, {self.request_count} requête(s))"
+
+
+class AnalysisJob(models.Model):
+    """
+    Tâche d'analyse persistée en base, consommée par `manage.py run_analysis_worker`.
+    Les workers réclament les tâches avec SELECT ... FOR UPDATE SKIP LOCKED.
+    Les tâches en mode 'batch' sont regroupées par `manage.py run_analysis_batches`.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'En file d\'attente'),
+        ('processing', 'En cours'),
+        ('completed', 'Terminée'),
+        ('error', 'Erreur'),
+    ]
+    MODE_CHOICES = [
+        ('live', 'Temps réel'),
+        ('batch', 'API Batch'),
+    ]
+
+    payslip = models.ForeignKey(
+        PaySlip,
+        on_delete=models.CASCADE,
+        related_name='analysis_jobs',
+        verbose_name=_('Fiche de paie')
+    )
+    # Renseigné pour les analyses groupées afin de borner le parallélisme par groupe
+    group = models.ForeignKey(
+        BulkAnalysisGroup,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        verbose_name=_('Groupe d\'analyse')
+    )
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default='live', verbose_name=_('Mode'))
+    batch = models.ForeignKey(
+        AnalysisBatch,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        verbose_name=_('Lot OpenAI')
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name=_('Statut'))
+    attempts = models.IntegerField(default=0, verbose_name=_('Tentatives'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Date de création'))
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Début du traitement'))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Fin du traitement'))
+    worker_id = models.CharField(max_length=255, blank=True, default='', verbose_name=_('Worker'))
+    # Bail renouvelé par le worker: passé cette date, la tâche est considérée abandonnée
+    lease_expires_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Expiration du bail'))
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Dernier signe de vie'))
+    # Crédits débités à la mise en file, remboursés si l'analyse est abandonnée
+    credits_charged = models.IntegerField(default=0, verbose_name=_('Crédits débités'))
+    last_error = models.TextField(blank=True, default='', verbose_name=_('Dernière erreur'))
+
+    class Meta:
+        verbose_name = _('Tâche d\'analyse')
+        verbose_name_plural = _('Tâches d\'analyse')
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'lease_expires_at']),
+        ]
+
+    def __str__(self):
+        return f"Tâche d'analyse #{self.id} ({self.status}) pour la fiche {self.payslip_id}"
+
+
+class AnalysisReuseStats(models.Model):
+    """
+    Compteurs de la réutilisation d'analyses pour les PDF déjà analysés (même contenu,
+    même contexte): nombre de recherches, de réutilisations et coût API évité.
+    """
+    key = models.CharField(max_length=50, unique=True, default='default', verbose_name=_('Clé'))
+    lookups = models.IntegerField(default=0, verbose_name=_('Recherches'))
+    hits = models.IntegerField(default=0, verbose_name=_('Analyses réutilisées'))
+    cost_saved = models.FloatField(default=0, verbose_name=_('Coût API évité (USD)'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Mise à jour'))
+
+    class Meta:
+        verbose_name = _('Réutilisation d\'analyses')
+        verbose_name_plural = _('Réutilisations d\'analyses')
+
+    def __str__(self):
+        return f"Réutilisation d'analyses ({self.hits}/{self.lookups})"
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    @classmethod
+    def record_lookup(cls, hit: bool, cost_saved: float = 0.0) -> None:
+        """Comptabilise une recherche (et la réutilisation éventuelle) par mise à jour atomique."""
+        cls.objects.get_or_create(key='default')
+        cls.objects.filter(key='default').update(
+            lookups=models.F('lookups') + 1,
+            hits=models.F('hits') + (1 if hit else 0),
+            cost_saved=models.F('cost_saved') + (cost_saved if hit else 0.0),
+        )
+
+
+class PageFingerprint(models.Model):
+    """
+    Empreinte exacte d'une page déjà envoyée par un utilisateur (hors première page).
+    Une page retrouvée à l'identique dans plusieurs documents récents (mentions légales
+    répétées chaque mois) n'est plus envoyée à l'API Vision si VISION_SKIP_BOILERPLATE_PAGES
+    est activé.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='page_fingerprints',
+        verbose_name=_('Utilisateur')
+    )
+    page_hash = models.CharField(max_length=64, verbose_name=_('Empreinte de la page'))
+    documents_seen = models.IntegerField(default=0, verbose_name=_('Documents contenant la page'))
+    last_seen_at = models.DateTimeField(verbose_name=_('Vue pour la dernière fois'))
+
+    class Meta:
+        verbose_name = _('Empreinte de page')
+        verbose_name_plural = _('Empreintes de pages')
+        unique_together = ['user', 'page_hash']
+
+    def __str__(self):
+        return f"Page {self.page_hash[:12]} ({self.documents_seen} document(s))"
+
+
+class PageFingerprintDocument(models.Model):
+    """Document (SHA-256 du PDF) déjà compté pour une empreinte: une ré-analyse ne compte pas deux fois."""
+    fingerprint = models.ForeignKey(
+        PageFingerprint,
+        on_delete=models.CASCADE,
+        related_name='documents',
+        verbose_name=_('Empreinte de page')
+    )
+    document_sha256 = models.CharField(max_length=64, verbose_name=_('Document'))
+    counted_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Compté le'))
+
+    class Meta:
+        verbose_name = _("Document d'une empreinte de page")
+        verbose_name_plural = _("Documents des empreintes de pages")
+        unique_together = ['fingerprint', 'document_sha256']
+
+    def __str__(self):
+        return f"{self.fingerprint} - {self.document_sha256[:12]}"
+
+
+class RateLimitBucket(models.Model):
+    """
+    État partagé d'un limiteur de débit OpenAI (token bucket), une ligne par modèle.
+    Tous les processus web et workers lisent et débitent la même ligne sous verrou.
+    """
+    key = models.CharField(max_length=100, unique=True, verbose_name=_('Clé'))
+    requests_available = models.FloatField(default=0, verbose_name=_('Requêtes disponibles'))
+    tokens_available = models.FloatField(default=0, verbose_name=_('Tokens disponibles'))
+    refilled_at = models.DateTimeField(verbose_name=_('Dernier remplissage'))
+
+    class Meta:
+        verbose_name = _('Limiteur de débit OpenAI')
+        verbose_name_plural = _('Limiteurs de débit OpenAI')
+
+    def __str__(self):
+        return f"{self.key}: {self.requests_available:.1f} req, {self.tokens_available:.0f} tokens"
+
+
+class CircuitBreakerState(models.Model):
+    """
+    Disjoncteur partagé de l'API Vision et compteurs de supervision associés.
+    Une ligne par service appelé; lue et mise à jour par tous les processus.
+    """
+    STATE_CHOICES = [
+        ('closed', 'Fermé'),
+        ('open', 'Ouvert'),
+        ('half_open', 'Semi-ouvert'),
+    ]
+
+    key = models.CharField(max_length=100, unique=True, verbose_name=_('Clé'))
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='closed', verbose_name=_('État'))
+    consecutive_failures = models.IntegerField(default=0, verbose_name=_('Échecs consécutifs'))
+    opened_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Ouvert depuis'))
+    probe_started_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Début de la requête de test'))
+    successes = models.IntegerField(default=0, verbose_name=_('Succès'))
+    failures = models.IntegerField(default=0, verbose_name=_('Échecs'))
+    slo_breaches = models.IntegerField(default=0, verbose_name=_('Dépassements du SLO de latence'))
+    short_circuits = models.IntegerField(default=0, verbose_name=_('Appels refusés'))
+    hedged_requests = models.IntegerField(default=0, verbose_name=_('Requêtes dupliquées'))
+    hedge_wins = models.IntegerField(default=0, verbose_name=_('Duplicatas plus rapides'))
+    p95_latency_seconds = models.FloatField(null=True, blank=True, verbose_name=_('Latence p95 (s)'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Mis à jour le'))
+
+    class Meta:
+        verbose_name = _('Disjoncteur API Vision')
+        verbose_name_plural = _('Disjoncteurs API Vision')
+
+    def __str__(self):
+        return f"{self.key}: {self.state}"
@@ -1,3 +1,5 @@
+import copy
+import hashlib
 import logging
 import traceback
 import datetime
@@ -5,18 +7,30 @@ import json
 from typing import Optional, Dict, Any
 from decimal import Decimal, InvalidOperation
 
+from django.conf import settings
 from django.db import models
 
 # On importe les modèles des bonnes applications
-from documents.models import PaySlip
-from analysis.models import BulkAnalysisItem, PayslipAnalysis # Import des modèles d'analyse
+from documents.models import PaySlip, file_sha256
+from analysis.models import BulkAnalysisItem, PayslipAnalysis, AnalysisReuseStats # Import des modèles d'analyse
+from .circuit_breaker import CircuitOpenError
 from .gpt_vision_service import GPTVisionService
-from .reference_data import get_convention_collective_text, SMIC_DATA, load_text_file
-import csv
-from io import StringIO
+from .reference_data import get_convention_collective_text
+from .smic_table import get_smic_table
+from .raster_cache import purge_raster_cache
 
 logger = logging.getLogger('salariz.analysis')
 
+# Version du barème de notation: toute modification du calcul des scores doit l'incrémenter
+# (elle fait partie de l'empreinte de contexte et invalide la réutilisation des analyses)
+SCORING_VERSION = '1.0'
+
+
+def _original_api_cost(details: Dict[str, Any]) -> float:
+    """Coût API de l'analyse d'origine (un clone porte le coût de l'analyse dont il est issu)."""
+    reused_from = details.get('reused_from') or {}
+    return float(reused_from.get('estimated_cost_saved') or details.get('estimated_cost') or 0.0)
+
 
 class AnalysisService:
     def __init__(self, gpt_vision_service=None):
@@ -26,6 +40,23 @@ class AnalysisService:
         """
         Analyse une seule fiche de paie, met à jour son statut et ses données,
         et déclenche la mise à jour de la progression si elle fait partie d'un groupe.
+
+        Enchaîne les trois étapes utilisées séparément par le pipeline du worker
+        (analysis.services.pipeline): préparation, appel API, post-traitement.
+        """
+        prepared = self.prepare_analysis(payslip_id)
+        if prepared is None:
+            return None
+        try:
+            result = self.submit_analysis(prepared)
+        except CircuitOpenError as e:
+            result = {'error': str(e)}
+        return self.finalize_analysis(prepared, result)
+
+    def prepare_analysis(self, payslip_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Étape CPU: charge la fiche, rasterise le PDF, encode les pages et construit le prompt.
+        Retourne None (statut 'error' enregistré) si la fiche ne peut pas être préparée.
         """
         payslip = None
         try:
@@ -50,6 +81,12 @@ class AnalysisService:
             if not payslip.uploaded_file or not hasattr(payslip.uploaded_file, 'path'):
                 raise ValueError("Fichier PDF manquant ou chemin invalide")
             pdf_path = payslip.uploaded_file.path
+
+            # Un PDF identique déjà analysé dans le même contexte: on réutilise son résultat
+            fingerprint = self._context_fingerprint(payslip)
+            reused = self._find_reusable_analysis(payslip, fingerprint)
+            if reused is not None:
+                return {'payslip': payslip, 'fingerprint': fingerprint, 'reused_analysis': reused}
             # Conserver le nom original pour l'affichage futur même si le fichier est supprimé
             try:
                 from os.path import basename
@@ -70,26 +107,73 @@ class AnalysisService:
             }
             additional_data = {k: v for k, v in additional_data.items() if v is not None}
 
-            result = self.gpt_vision_service.analyze_pdf(
+            vision_input = self.gpt_vision_service.prepare_pdf(
                 pdf_path=pdf_path,
-                additional_data=additional_data
+                additional_data=additional_data,
+                content_hash=payslip.content_sha256 or None,
+                user_id=payslip.user_id
             )
+            if 'error' in vision_input:
+                msg = vision_input.get('details', vision_input.get('error', 'Erreur inconnue'))
+                raise RuntimeError(f"Erreur GPT Vision: {msg}")
+
+            return {'payslip': payslip, 'fingerprint': fingerprint, 'vision_input': vision_input}
+
+        except PaySlip.DoesNotExist:
+            logger.error(f"PaySlip #{payslip_id} introuvable.")
+            return None
+        except Exception as e:
+            self._fail_analysis(e, payslip_id, payslip)
+            return None
+
+    def submit_analysis(self, prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Étape réseau: appel à l'API Vision (les erreurs sont renvoyées dans le dict résultat).
+        Lève CircuitOpenError si le disjoncteur a refusé l'appel sans l'envoyer.
+        """
+        payslip = prepared['payslip']
+        reused = prepared.get('reused_analysis')
+        if reused is not None:
+            # Aucun appel API: le résultat de l'analyse d'origine est cloné
+            return copy.deepcopy(reused.analysis_details)
+        return self.gpt_vision_service.submit_prepared(
+            prepared['vision_input'],
+            progress_callback=lambda message: self._update_payslip_progress(payslip, message)
+        )
 
+    def finalize_analysis(self, prepared: Dict[str, Any], result: Dict[str, Any]) -> Optional[PaySlip]:
+        """Étape de post-traitement: scores, enregistrement, progression du groupe et suppression du fichier."""
+        payslip = prepared['payslip']
+        try:
             if not result or 'error' in result:
-                msg = result.get('details', result.get('error', 'Erreur inconnue'))
+                msg = result.get('details', result.get('error', 'Erreur inconnue')) if result else 'Réponse vide'
                 raise RuntimeError(f"Erreur GPT Vision: {msg}")
 
             # Mise à jour du PaySlip ET de son analyse associée
-            self._update_payslip_from_analysis(payslip, result)
-            
+            reused = prepared.get('reused_analysis')
+            if reused is not None:
+                self._update_payslip_from_reused_analysis(payslip, reused, result)
+            else:
+                self._update_payslip_from_analysis(payslip, result)
+
+            # Empreinte du contexte: rend ce résultat réutilisable pour un PDF identique
+            fingerprint = prepared.get('fingerprint') or self._context_fingerprint(payslip)
+            if payslip.analysis_fingerprint != fingerprint:
+                payslip.analysis_fingerprint = fingerprint
+                payslip.save(update_fields=['analysis_fingerprint'])
+
             self._update_payslip_status(payslip, 'completed')
             logger.info(f"Analyse terminée avec succès pour PaySlip {payslip.id}")
 
+            if prepared.get('vision_input'):
+                # Seules les analyses réussies alimentent l'historique des pages de l'utilisateur
+                self.gpt_vision_service.record_page_history(prepared['vision_input'], payslip.user_id)
+
             # Gestion de l'analyse groupée
             group_item = BulkAnalysisItem.objects.filter(payslip=payslip).first()
             if group_item:
                 logger.info(f"PaySlip {payslip.id} fait partie du groupe {group_item.group.id}. Mise à jour de la progression.")
-                group_item.group.update_progress()
+                group_item.group.record_item_result(payslip)
 
             # Suppression optionnelle du fichier après analyse pour confidentialité
             try:
@@ -108,21 +192,22 @@ class AnalysisService:
                             payslip.uploaded_file.delete(save=False)
                             payslip.file_deleted = True
                             payslip.save(update_fields=['uploaded_file', 'file_deleted'])
+                            purge_raster_cache(payslip.content_sha256)
                 except Exception as del_err:
                     logger.warning(f"Échec suppression fichier PaySlip {payslip.id}: {del_err}")
 
             return payslip
 
-        except PaySlip.DoesNotExist:
-            logger.error(f"PaySlip #{payslip_id} introuvable.")
-            return None
         except Exception as e:
-            logger.error(f"Erreur majeure lors de l'analyse du PaySlip {payslip_id if payslip else 'ID inconnu'}: {e}")
-            logger.debug(traceback.format_exc())
-            if payslip:
-                self._handle_analysis_exception(e, payslip)
+            self._fail_analysis(e, payslip.id, payslip)
             return None
 
+    def _fail_analysis(self, exc: Exception, payslip_id: int, payslip: Optional[PaySlip]):
+        logger.error(f"Erreur majeure lors de l'analyse du PaySlip {payslip_id if payslip else 'ID inconnu'}: {exc}")
+        logger.debug(traceback.format_exc())
+        if payslip:
+            self._handle_analysis_exception(exc, payslip)
+
     def _update_payslip_from_analysis(self, payslip: PaySlip, analysis_result: Dict[str, Any]):
         """
         Met à jour le modèle PaySlip avec les données extraites ET crée/met à jour
@@ -146,8 +231,44 @@ class AnalysisService:
         
         # === ÉTAPE 3 : Mettre à jour les champs clés sur le PaySlip lui-même ===
         gpt_data = enriched_result.get('gpt_analysis', {})
+        self._update_payslip_fields(payslip, gpt_data)
+
+        # Vérification cohérence net_social vs net_a_payer (info)
+        try:
+            rem = gpt_data.get('remuneration') or {}
+            net_payer = rem.get('net_a_payer')
+            net_social = rem.get('net_social')
+            if net_payer is not None and net_social is not None:
+                n1 = float(str(net_payer).replace(',', '.'))
+                n2 = float(str(net_social).replace(',', '.'))
+                if n1 > 0:
+                    ratio = abs(n1 - n2) / n1
+                    if ratio <= 0.02:  # 2%
+                        anomalies = gpt_data.get('anomalies_potentielles_observees') or []
+                        anomalies.append({
+                            'type': 'coherence_nets',
+                            'description': 'Net à payer et Montant net social quasi équivalents (<=2%). Vérifiez les libellés pour éviter toute confusion.',
+                            'level': 'info'
+                        })
+                        gpt_data['anomalies_potentielles_observees'] = anomalies
+        except Exception:
+            pass
+
+        # Injecter une trace claire dans les détails pour différencier les nets si présents
+        try:
+            remu = gpt_data.get('remuneration') or {}
+            net_social = remu.get('net_social')
+            if net_social is not None:
+                if 'remuneration_details' not in gpt_data:
+                    gpt_data['remuneration_details'] = {}
+                gpt_data['remuneration_details']['note'] = "Distinction prise en compte: net_social vs net_imposable vs net_a_payer"
+        except Exception:
+            pass
+
+    def _update_payslip_fields(self, payslip: PaySlip, gpt_data: dict):
+        """Reporte sur le PaySlip les champs clés extraits (période, nom du salarié, net à payer)."""
         updated_fields = []
-        
+
         # Période (texte et date)
         periode_data = gpt_data.get('periode', {})
         du = periode_data.get('periode_du')
@@ -195,37 +316,88 @@ class AnalysisService:
             payslip.save(update_fields=list(set(updated_fields)))
             logger.info(f"PaySlip {payslip.id} mis à jour. Champs: {list(set(updated_fields))}")
 
-        # Vérification cohérence net_social vs net_a_payer (info)
-        try:
-            rem = gpt_data.get('remuneration') or {}
-            net_payer = rem.get('net_a_payer')
-            net_social = rem.get('net_social')
-            if net_payer is not None and net_social is not None:
-                n1 = float(str(net_payer).replace(',', '.'))
-                n2 = float(str(net_social).replace(',', '.'))
-                if n1 > 0:
-                    ratio = abs(n1 - n2) / n1
-                    if ratio <= 0.02:  # 2%
-                        anomalies = gpt_data.get('anomalies_potentielles_observees') or []
-                        anomalies.append({
-                            'type': 'coherence_nets',
-                            'description': 'Net à payer et Montant net social quasi équivalents (<=2%). Vérifiez les libellés pour éviter toute confusion.',
-                            'level': 'info'
-                        })
-                        gpt_data['anomalies_potentielles_observees'] = anomalies
-        except Exception:
-            pass
+    def _update_payslip_from_reused_analysis(self, payslip: PaySlip, source: PayslipAnalysis, details: Dict[str, Any]):
+        """
+        Enregistre le résultat cloné d'une analyse réussie d'un PDF identique (sans nouveau calcul
+        des scores: le clone porte déjà les scores et l'augmentation déterministe de l'original).
+        """
+        details['reused_from'] = {
+            'payslip_id': source.payslip_id,
+            'analysis_id': source.id,
+            'estimated_cost_saved': _original_api_cost(details),
+        }
+        # Aucun coût API pour cette analyse
+        details['estimated_cost'] = 0.0
+        analysis, created = PayslipAnalysis.objects.get_or_create(
+            payslip=payslip,
+            defaults={
+                'analysis_status': 'success',
+                'analysis_details': details
+            }
+        )
+        if not created:
+            analysis.analysis_status = 'success'
+            analysis.analysis_details = details
+            analysis.save()
 
-        # Injecter une trace claire dans les détails pour différencier les nets si présents
+        self._update_payslip_fields(payslip, details.get('gpt_analysis', {}))
+        logger.info(f"PaySlip {payslip.id}: analyse réutilisée depuis PaySlip {source.payslip_id} (aucun appel API)")
+
+    def _context_fingerprint(self, payslip: PaySlip) -> str:
+        """
+        Empreinte de tout ce qui, en dehors du PDF, influence le résultat: données saisies par
+        l'utilisateur (reprises dans le prompt), modèle utilisé et version du barème de notation.
+        """
+        def as_text(value):
+            return '' if value is None else str(value)
+
+        context = {
+            'convention_collective': as_text(payslip.convention_collective),
+            'contractual_salary': as_text(payslip.contractual_salary),
+            'expected_smic_percent': as_text(payslip.expected_smic_percent),
+            'working_time_ratio': as_text(payslip.working_time_ratio),
+            'employment_status': as_text(payslip.employment_status),
+            'additional_details': as_text(payslip.additional_details),
+            'model': getattr(settings, 'OPENAI_VISION_MODEL', 'gpt-5-mini'),
+            'scoring_version': SCORING_VERSION,
+        }
+        encoded = json.dumps(context, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _find_reusable_analysis(self, payslip: PaySlip, fingerprint: str) -> Optional[PayslipAnalysis]:
+        """
+        Recherche une analyse réussie d'un PDF identique (même SHA-256) faite dans le même contexte,
+        parmi les fiches du même utilisateur uniquement: le résultat d'un autre utilisateur ne doit
+        ni être copié ni révéler qu'il a envoyé le même document.
+        Chaque recherche est comptabilisée dans AnalysisReuseStats (taux de réutilisation, coût évité).
+        """
+        if not payslip.content_sha256:
+            try:
+                payslip.content_sha256 = file_sha256(payslip.uploaded_file)
+                payslip.save(update_fields=['content_sha256'])
+            except (OSError, ValueError) as e:
+                logger.warning(f"Empreinte du fichier indisponible pour PaySlip {payslip.id}: {e}")
+                return None
+
+        source = (
+            PayslipAnalysis.objects
+            .filter(
+                payslip__user_id=payslip.user_id,
+                payslip__content_sha256=payslip.content_sha256,
+                payslip__analysis_fingerprint=fingerprint,
+                payslip__processing_status='completed',
+                analysis_status='success',
+            )
+            .exclude(payslip_id=payslip.id)
+            .order_by('-analysis_date')
+            .first()
+        )
+        cost_saved = _original_api_cost(source.analysis_details or {}) if source else 0.0
         try:
-            remu = gpt_data.get('remuneration') or {}
-            net_social = remu.get('net_social')
-            if net_social is not None:
-                if 'remuneration_details' not in gpt_data:
-                    gpt_data['remuneration_details'] = {}
-                gpt_data['remuneration_details']['note'] = "Distinction prise en compte: net_social vs net_imposable vs net_a_payer"
-        except Exception:
-            pass
+            AnalysisReuseStats.record_lookup(source is not None, cost_saved)
+        except Exception as e:
+            logger.warning(f"Échec de l'enregistrement des statistiques de réutilisation: {e}")
+        return source
 
     def _parse_period_to_date(self, period_str: str) -> Optional[datetime.date]:
         """Tente de parser une chaîne de période en un objet date."""
@@ -252,13 +424,22 @@ class AnalysisService:
         """Met à jour le statut de traitement de la fiche de paie."""
         if payslip.processing_status != status:
             payslip.processing_status = status
-            payslip.save(update_fields=['processing_status'])
+            # La progression détaillée n'a de sens que pendant le traitement
+            payslip.processing_progress = ''
+            payslip.save(update_fields=['processing_status', 'processing_progress'])
             logger.info(f"Statut PaySlip {payslip.id} -> {status}")
 
+    def _update_payslip_progress(self, payslip: PaySlip, message: str):
+        """Publie l'étape d'analyse en cours (sans toucher aux autres champs de la fiche)."""
+        payslip.processing_progress = message[:100]
+        PaySlip.objects.filter(id=payslip.id).update(processing_progress=payslip.processing_progress)
+        logger.info(f"Progression PaySlip {payslip.id}: {message}")
+
     def _handle_analysis_exception(self, exc: Exception, payslip: PaySlip):
         """Gère les erreurs d'analyse, met à jour le statut et sauvegarde les détails."""
         payslip.processing_status = 'error'
-        payslip.save(update_fields=['processing_status'])
+        payslip.processing_progress = ''
+        payslip.save(update_fields=['processing_status', 'processing_progress'])
         
         # Créer ou mettre à jour l'analyse avec l'erreur
         analysis, created = PayslipAnalysis.objects.get_or_create(
@@ -276,7 +457,7 @@ class AnalysisService:
         # Mise à jour du groupe si applicable
         group_item = BulkAnalysisItem.objects.filter(payslip=payslip).first()
         if group_item:
-            group_item.group.update_progress()
+            group_item.group.record_item_result(payslip)
         
         # Suppression optionnelle du fichier même en cas d'erreur (confidentialité)
         try:
@@ -301,6 +482,7 @@ class AnalysisService:
                     payslip.uploaded_file.delete(save=False)
                     payslip.file_deleted = True
                     payslip.save(update_fields=['uploaded_file', 'file_deleted', 'original_filename'])
+                    purge_raster_cache(payslip.content_sha256)
                     logger.info(f"Fichier supprimé après erreur pour PaySlip {payslip.id}")
             except Exception as del_err:
                 logger.warning(f"Échec suppression fichier PaySlip {payslip.id} après erreur: {del_err}")
@@ -335,7 +517,7 @@ class AnalysisService:
             
         # Ajouter des métadonnées sur le scoring
         enriched_result['scoring_metadata'] = {
-            'version': '1.0',
+            'version': SCORING_VERSION,
             'calculation_date': datetime.datetime.now().isoformat(),
             'total_anomalies': len(anomalies),
             'anomalies_by_severity': self._count_anomalies_by_severity(anomalies)
@@ -356,77 +538,9 @@ class AnalysisService:
         return enriched_result
 
     # === Helpers déterministes ===
-    def _build_smic_index(self):
-        if not hasattr(self, '_smic_index'):
-            index = {}
-            try:
-                # Recharger dynamiquement le CSV pour prendre en compte les mises à jour
-                csv_text = load_text_file('smic.csv') or SMIC_DATA
-                reader = csv.DictReader(StringIO(csv_text))
-                for row in reader:
-                    try:
-                        year = int(row.get('Année'))
-                        month = (row.get('Mois') or '').strip().lower()
-                        hourly_val = row.get('SMIC_horaire_brut')
-                        monthly_val = row.get('SMIC_mensuel')
-                        hourly = float(str(hourly_val).replace(',', '.')) if hourly_val not in (None, '') else None
-                        monthly = float(str(monthly_val).replace(',', '.')) if monthly_val not in (None, '') else None
-                        index[(year, month)] = {'hourly': hourly, 'monthly': monthly}
-                    except Exception:
-                        continue
-            except Exception:
-                index = {}
-            self._smic_index = index
-        return self._smic_index
-
     def _get_smic_info(self, date_obj: datetime.date) -> Optional[dict]:
-        # Overrides officiels des montants mensuels (pour coller aux valeurs de référence)
-        MONTHLY_SMIC_OVERRIDES = {
-            # 2022
-            (2022, 'octobre'): 1678.95,
-            (2022, 'novembre'): 1678.95,
-            (2022, 'décembre'): 1678.95,
-            # 2023
-            (2023, 'janvier'): 1709.28,
-            (2023, 'février'): 1709.28,
-            (2023, 'mars'): 1709.28,
-            (2023, 'avril'): 1709.28,
-            (2023, 'mai'): 1747.20,
-            (2023, 'juin'): 1747.20,
-            (2023, 'juillet'): 1747.20,
-            (2023, 'août'): 1747.20,
-            (2023, 'septembre'): 1747.20,
-            (2023, 'octobre'): 1747.20,
-            (2023, 'novembre'): 1747.20,
-            (2023, 'décembre'): 1747.20,
-            # 2024
-            (2024, 'janvier'): 1766.92,
-            (2024, 'février'): 1766.92,
-            (2024, 'mars'): 1766.92,
-            (2024, 'avril'): 1766.92,
-            (2024, 'mai'): 1766.92,
-            (2024, 'juin'): 1766.92,
-            (2024, 'juillet'): 1766.92,
-            (2024, 'août'): 1766.92,
-            (2024, 'septembre'): 1766.92,
-            (2024, 'octobre'): 1766.92,
-            (2024, 'novembre'): 1766.92,
-            (2024, 'décembre'): 1766.92,
-        }
-        idx = self._build_smic_index()
-        month_names = {
-            1: 'janvier', 2: 'février', 3: 'mars', 4: 'avril', 5: 'mai', 6: 'juin',
-            7: 'juillet', 8: 'août', 9: 'septembre', 10: 'octobre', 11: 'novembre', 12: 'décembre'
-        }
-        month_key = month_names[date_obj.month]
-        key = (date_obj.year, month_key)
-        info = idx.get(key) or {}
-        # Appliquer override mensuel si défini
-        monthly_override = MONTHLY_SMIC_OVERRIDES.get(key)
-        if monthly_override is not None:
-            info = dict(info or {})
-            info['monthly'] = monthly_override
-        return info
+        """Valeurs SMIC du mois (table partagée par le processus, rechargée si smic.csv change)."""
+        return get_smic_table().lookup(date_obj)
 
     def _augment_with_expected_vs_received(self, payslip: PaySlip, gpt_data: dict) -> None:
         # Nécessite une date de période (depuis le modèle ou les données GPT) et des données utilisateur
@@ -0,0 +1,201 @@
+"""
+Client asyncio pour l'API Vision d'OpenAI.
+
+Même contrat de retour que OpenAIVisionClient (`gpt_analysis`, `raw`, `usage`,
+`estimated_cost`), mais les appels ne bloquent pas de thread: un worker asyncio
+peut garder des dizaines d'analyses en vol en partageant un pool de connexions.
+"""
+import asyncio
+import json
+import logging
+import time
+import weakref
+from typing import Dict, Any, List, Optional
+
+from .request_body import RequestBody
+from .vision_api_client import BaseVisionClient, ImageData, OPENAI_CHAT_COMPLETIONS_URL, OPENAI_RESPONSES_URL
+
+logger = logging.getLogger('salariz.gpt_vision')
+
+# Un client httpx par boucle d'événements: le pool de connexions est partagé
+# par toutes les instances de AsyncOpenAIVisionClient de cette boucle.
+_shared_http_clients = weakref.WeakKeyDictionary()
+
+
+def _import_httpx():
+    try:
+        import httpx  # type: ignore
+    except ImportError:
+        logger.error("Le module 'httpx' n'est pas installé. Installez-le pour utiliser le client Vision asynchrone.")
+        raise ImportError("Dépendance manquante: httpx (client Vision asynchrone)")
+    return httpx
+
+
+def _get_setting(name: str, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def get_shared_http_client():
+    """Retourne le client httpx partagé de la boucle courante (créé à la demande)."""
+    loop = asyncio.get_running_loop()
+    client = _shared_http_clients.get(loop)
+    if client is None or client.is_closed:
+        httpx = _import_httpx()
+        max_connections = _get_setting('OPENAI_ASYNC_MAX_CONNECTIONS', 50)
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        _shared_http_clients[loop] = client
+    return client
+
+
+async def close_shared_http_client() -> None:
+    """Ferme le pool de connexions de la boucle courante (à appeler à l'arrêt du worker)."""
+    client = _shared_http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class AsyncOpenAIVisionClient(BaseVisionClient):
+    """Client asyncio pour communiquer avec l'API Vision d'OpenAI"""
+
+    def __init__(self, api_key: str, http_client=None, max_in_flight: Optional[int] = None):
+        super().__init__(api_key)
+        self._http_client = http_client
+        self.max_in_flight = max_in_flight or _get_setting('OPENAI_ASYNC_MAX_IN_FLIGHT', 32)
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        return self._http_client or get_shared_http_client()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Borne le nombre de requêtes simultanées de ce client dans la boucle courante
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def call_vision_api(self,
+                              prompt: str,
+                              images: List[ImageData],
+                              model: str = None,
+                              temperature: float = None,
+                              max_tokens: int = None,
+                              timeout: int = 180) -> Dict[str, Any]:
+        """
+        Appelle l'API Vision d'OpenAI pour analyser des images, sans bloquer la boucle.
+
+        Args et retour identiques à OpenAIVisionClient.call_vision_api.
+
+        Raises:
+            httpx.HTTPError: Pour les erreurs de communication API
+        """
+        httpx = _import_httpx()
+        model, temperature, max_tokens = self._resolve_options(model, temperature, max_tokens)
+        self._log_request_configuration(prompt, images, model, temperature, max_tokens)
+        # Disjoncteur et limiteur partagés interrogent la base: hors de la boucle d'événements
+        breaker = self._get_circuit_breaker()
+        if breaker is not None:
+            await asyncio.to_thread(breaker.before_call)
+        estimated_tokens, rate_limit_wait = await asyncio.to_thread(
+            self._acquire_rate_limit, prompt, images, model
+        )
+
+        if self._uses_responses_api(model):
+            url = OPENAI_RESPONSES_URL
+            payload = self._build_responses_payload(prompt, images, model, max_tokens)
+        else:
+            url = OPENAI_CHAT_COMPLETIONS_URL
+            payload = self._build_chat_payload(prompt, images, model, temperature, max_tokens)
+
+        try:
+            logger.info(f"Envoi asynchrone de la requête à l'API OpenAI (modèle: {model})...")
+            started = time.monotonic()
+            try:
+                response, retry_stats = await self._post(url, payload, timeout)
+            except Exception as call_err:
+                await asyncio.to_thread(self._record_call_outcome, started, call_err)
+                raise
+            await asyncio.to_thread(self._record_call_outcome, started)
+            logger.info(f"Réponse reçue de l'API OpenAI (status {response.status_code}).")
+            result = response.json()
+        except httpx.TimeoutException:
+            logger.error("Timeout lors de l'appel asynchrone à l'API OpenAI.")
+            raise
+        except httpx.HTTPStatusError as status_err:
+            try:
+                error_details = status_err.response.json()
+                logger.error(f"Détails de l'erreur API: {json.dumps(error_details, indent=2)}")
+            except json.JSONDecodeError:
+                logger.error(f"Réponse d'erreur brute: {status_err.response.text}")
+            raise
+        except httpx.HTTPError as req_err:
+            logger.error(f"Erreur de requête vers l'API OpenAI: {req_err}", exc_info=True)
+            raise
+
+        if self._uses_responses_api(model):
+            parsed = self._attach_retry_stats(self._parse_responses_result(result, model), retry_stats)
+        else:
+            parsed = self._attach_retry_stats(self._parse_chat_result(result, model), retry_stats)
+        return await asyncio.to_thread(self._settle_rate_limit, parsed, model, estimated_tokens, rate_limit_wait)
+
+    async def _post(self, url: str, payload: Dict[str, Any], timeout: int):
+        """
+        Envoie la requête avec nouvelles tentatives sur les erreurs transitoires, toutes
+        bornées par le délai total `timeout` (cf. OpenAIVisionClient._post).
+        """
+        httpx = _import_httpx()
+        body = RequestBody(payload)
+        # Longueur annoncée: le corps est transmis par blocs sans envoi chunked
+        headers = dict(self._headers(), **{'Content-Length': str(len(body))})
+        max_retries = self._max_retries()
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        backoff_total = 0.0
+        while True:
+            try:
+                # L'attente entre deux tentatives ne consomme pas d'emplacement du sémaphore
+                async with self._semaphore():
+                    attempt_timeout = self._attempt_timeout(timeout, deadline)
+                    if attempt_timeout is None:
+                        raise httpx.TimeoutException(f"Délai total dépassé après {attempt} tentative(s)")
+                    response = await self._client().post(
+                        url, headers=headers, content=body.aiter_chunks(), timeout=attempt_timeout
+                    )
+            except httpx.ConnectError as conn_err:
+                if attempt >= max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                if not self._retry_fits(delay, deadline):
+                    logger.warning(f"Connexion à l'API OpenAI impossible ({conn_err}), délai total épuisé")
+                    raise
+                logger.warning(f"Connexion à l'API OpenAI impossible ({conn_err}), nouvelle tentative dans {delay:.2f}s")
+            else:
+                if response.is_success:
+                    return response, {
+                        'retry_attempts': attempt, 'retry_backoff_seconds': round(backoff_total, 3),
+                        'request_bytes': len(body),
+                    }
+                try:
+                    error_body = response.json()
+                except ValueError:
+                    error_body = None
+                if attempt >= max_retries or not self._should_retry(response.status_code, error_body):
+                    response.raise_for_status()
+                delay = self._retry_delay(attempt, response.headers)
+                if not self._retry_fits(delay, deadline):
+                    logger.warning(f"API OpenAI: statut {response.status_code}, délai total épuisé")
+                    response.raise_for_status()
+                logger.warning(
+                    f"API OpenAI: statut {response.status_code}, tentative {attempt + 1}/{max_retries}, "
+                    f"nouvelle tentative dans {delay:.2f}s"
+                )
+            attempt += 1
+            backoff_total += delay
+            await asyncio.sleep(delay)
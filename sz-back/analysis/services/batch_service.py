@@ -0,0 +1,254 @@
+"""
+Mode API Batch d'OpenAI pour les analyses groupées et les ré-analyses hors ligne.
+
+Les tâches en mode 'batch' sont préparées comme en temps réel (rasterisation,
+prompt), regroupées dans un fichier JSONL envoyé à /v1/files puis /v1/batches,
+et les résultats sont récupérés par interrogation périodique. Chaque réponse est
+ensuite traitée par AnalysisService.finalize_analysis, comme une analyse classique.
+Ces appels ne consomment pas le budget du limiteur de débit temps réel et sont
+facturés à moitié prix.
+"""
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from analysis.models import AnalysisBatch, AnalysisJob
+from .job_queue import _abandon_job, claim_batch_jobs, finish_job, renew_leases, requeue_job
+from .request_body import RequestBody
+from .vision_api_client import BaseVisionClient, ImageData, get_http_session
+
+logger = logging.getLogger('salariz.analysis')
+
+# Remise appliquée par OpenAI aux requêtes de l'API Batch
+BATCH_PRICE_FACTOR = 0.5
+
+
+class OpenAIBatchClient(BaseVisionClient):
+    """Client des endpoints /files et /batches d'OpenAI."""
+
+    def __init__(self, api_key: str, api_base: Optional[str] = None):
+        super().__init__(api_key)
+        self.api_base = (api_base or getattr(settings, 'OPENAI_BATCH_API_BASE', 'https://api.openai.com/v1')).rstrip('/')
+
+    def endpoint_for(self, model: str) -> str:
+        return '/v1/responses' if self._uses_responses_api(model) else '/v1/chat/completions'
+
+    def build_request_line(self, custom_id: str, prompt: str, images: List[ImageData], model: str) -> str:
+        """Une ligne JSONL de requête, avec le même payload que l'appel temps réel."""
+        model, temperature, max_tokens = self._resolve_options(model, None, None)
+        if self._uses_responses_api(model):
+            body = self._build_responses_payload(prompt, images, model, max_tokens)
+        else:
+            body = self._build_chat_payload(prompt, images, model, temperature, max_tokens)
+        return RequestBody({
+            'custom_id': custom_id,
+            'method': 'POST',
+            'url': self.endpoint_for(model),
+            'body': body,
+        }).to_bytes().decode('ascii')
+
+    def upload_jsonl(self, content: bytes, filename: str = 'analyses.jsonl') -> str:
+        response = get_http_session().post(
+            f"{self.api_base}/files",
+            headers={'Authorization': f"Bearer {self.api_key}"},
+            data={'purpose': 'batch'},
+            files={'file': (filename, content, 'application/jsonl')},
+            timeout=300,
+        )
+        response.raise_for_status()
+        return response.json()['id']
+
+    def create_batch(self, input_file_id: str, endpoint: str) -> Dict[str, Any]:
+        response = get_http_session().post(
+            f"{self.api_base}/batches",
+            headers=self._headers(),
+            json={'input_file_id': input_file_id, 'endpoint': endpoint, 'completion_window': '24h'},
+            timeout=60,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def retrieve_batch(self, batch_id: str) -> Dict[str, Any]:
+        response = get_http_session().get(f"{self.api_base}/batches/{batch_id}", headers=self._headers(), timeout=60)
+        response.raise_for_status()
+        return response.json()
+
+    def download_file(self, file_id: str) -> str:
+        response = get_http_session().get(f"{self.api_base}/files/{file_id}/content", headers=self._headers(), timeout=300)
+        response.raise_for_status()
+        return response.text
+
+    def parse_output_line(self, line: str, model: str) -> Tuple[str, Dict[str, Any]]:
+        """Convertit une ligne du fichier de résultats au format de call_vision_api."""
+        record = json.loads(line)
+        custom_id = record.get('custom_id', '')
+        response = record.get('response') or {}
+        if record.get('error') or response.get('status_code') != 200:
+            error = record.get('error') or (response.get('body') or {}).get('error') or response
+            return custom_id, {'error': "Requête en lot refusée par l'API", 'details': error}
+
+        body = response.get('body') or {}
+        if self._uses_responses_api(model):
+            result = self._parse_responses_result(body, model)
+        else:
+            result = self._parse_chat_result(body, model)
+        if result.get('estimated_cost') is not None:
+            result['estimated_cost'] = result['estimated_cost'] * BATCH_PRICE_FACTOR
+        if isinstance(result.get('usage'), dict):
+            result['usage']['batch'] = True
+        return custom_id, result
+
+
+def _default_service_factory():
+    from .analysis_service import AnalysisService
+    return AnalysisService()
+
+
+class BatchAnalysisService:
+    """Soumission des tâches 'batch' en attente et traitement des lots terminés."""
+
+    def __init__(self, client: Optional[OpenAIBatchClient] = None,
+                 service_factory: Optional[Callable[[], Any]] = None):
+        self.client = client or OpenAIBatchClient(settings.OPENAI_API_KEY)
+        self._service_factory = service_factory or _default_service_factory
+
+    def submit_pending(self, worker_id: str, max_jobs: Optional[int] = None) -> Optional[AnalysisBatch]:
+        """Prépare les tâches 'batch' en file et les soumet dans un lot. Retourne le lot créé."""
+        max_jobs = max_jobs or getattr(settings, 'ANALYSIS_BATCH_MAX_JOBS', 100)
+        max_bytes = getattr(settings, 'ANALYSIS_BATCH_MAX_BYTES', 150 * 1024 * 1024)
+        jobs = claim_batch_jobs(worker_id, max_jobs)
+        if not jobs:
+            return None
+
+        model, _, _ = self.client._resolve_options(None, None, None)
+        service = self._service_factory()
+        lines, included, total_bytes = [], [], 0
+        for job in jobs:
+            # La préparation d'un lot complet peut dépasser la durée du bail
+            renew_leases(worker_id)
+            prepared = service.prepare_analysis(job.payslip_id)
+            if prepared is None:
+                finish_job(job, False)
+                continue
+            if prepared.get('reused_analysis') is not None:
+                # PDF identique déjà analysé: rien à envoyer dans le lot
+                payslip = service.finalize_analysis(prepared, service.submit_analysis(prepared))
+                finish_job(job, payslip is not None)
+                continue
+            vision_input = prepared['vision_input']
+            line = self.client.build_request_line(
+                f"job-{job.id}", vision_input['prompt'], vision_input['images'], model
+            )
+            if included and total_bytes + len(line) + 1 > max_bytes:
+                # Lot plein: la tâche attendra le prochain lot, sans compter de tentative
+                requeue_job(job, "Lot plein, reportée au lot suivant")
+                continue
+            lines.append(line)
+            included.append((job, prepared['payslip']))
+            total_bytes += len(line) + 1
+
+        if not included:
+            return None
+
+        endpoint = self.client.endpoint_for(model)
+        try:
+            file_id = self.client.upload_jsonl(('\n'.join(lines) + '\n').encode('utf-8'))
+            remote = self.client.create_batch(file_id, endpoint)
+        except Exception as e:
+            logger.error(f"Échec de la soumission du lot OpenAI ({len(included)} tâche(s)): {e}", exc_info=True)
+            # Les tâches retournent en file (tentative comptée), ou sont abandonnées et remboursées
+            # après ANALYSIS_JOB_MAX_ATTEMPTS échecs: le reaper ne surveille pas les tâches en file
+            error = f"Échec de la soumission du lot OpenAI: {e}"
+            max_attempts = getattr(settings, 'ANALYSIS_JOB_MAX_ATTEMPTS', 3)
+            for job, _ in included:
+                if job.attempts >= max_attempts:
+                    job.last_error = error
+                    job.lease_expires_at = None
+                    _abandon_job(job, error, self._service_factory)
+                else:
+                    requeue_job(job, error, count_attempt=True)
+            return None
+
+        batch = AnalysisBatch.objects.create(
+            openai_batch_id=remote['id'],
+            input_file_id=file_id,
+            endpoint=endpoint,
+            model=model,
+            status=remote.get('status', 'validating'),
+            request_count=len(included),
+        )
+        AnalysisJob.objects.filter(id__in=[job.id for job, _ in included]).update(batch=batch)
+        for _, payslip in included:
+            service._update_payslip_progress(payslip, "Analyse soumise en lot, résultat différé")
+        logger.info(f"Lot OpenAI {batch.openai_batch_id} soumis avec {len(included)} tâche(s)")
+        return batch
+
+    def poll_batches(self) -> int:
+        """
+        Met à jour les lots en cours; traite les lots terminés. Retourne le nombre de lots clos.
+        Un lot dont le traitement échoue (téléchargement, base de données) reste ouvert et
+        sera repris à la consultation suivante; les tâches déjà closes ne sont pas retraitées.
+        """
+        closed = 0
+        for batch in AnalysisBatch.objects.exclude(status__in=AnalysisBatch.TERMINAL_STATUSES):
+            try:
+                closed += self._poll_batch(batch)
+            except Exception as e:
+                logger.exception(f"Échec du traitement du lot {batch.openai_batch_id}, nouvel essai au prochain passage: {e}")
+        return closed
+
+    def _poll_batch(self, batch: AnalysisBatch) -> int:
+        try:
+            remote = self.client.retrieve_batch(batch.openai_batch_id)
+        except Exception as e:
+            logger.warning(f"Impossible de consulter le lot {batch.openai_batch_id}: {e}")
+            return 0
+        status = remote.get('status', batch.status)
+        batch.output_file_id = remote.get('output_file_id') or ''
+        batch.error_file_id = remote.get('error_file_id') or ''
+        if status not in AnalysisBatch.TERMINAL_STATUSES:
+            batch.status = status
+            batch.save(update_fields=['status', 'output_file_id', 'error_file_id'])
+            return 0
+
+        batch.status = status
+        if batch.status != 'completed':
+            batch.last_error = json.dumps(remote.get('errors') or {}, ensure_ascii=False)[:2000]
+        self._route_results(batch)
+        batch.completed_at = timezone.now()
+        batch.save(update_fields=['status', 'output_file_id', 'error_file_id', 'completed_at', 'last_error'])
+        logger.info(f"Lot OpenAI {batch.openai_batch_id} clos avec le statut '{batch.status}'")
+        return 1
+
+    def _route_results(self, batch: AnalysisBatch) -> None:
+        """Applique chaque résultat du lot à sa fiche de paie, puis clôt les tâches sans réponse."""
+        jobs = {
+            f"job-{job.id}": job
+            for job in AnalysisJob.objects.filter(batch=batch, status='processing').select_related('payslip')
+        }
+        service = self._service_factory()
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.download_file(file_id).splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    custom_id, result = self.client.parse_output_line(line, batch.model)
+                except Exception as e:
+                    # Ligne illisible: sa tâche sera close plus bas comme restée sans résultat
+                    logger.error(f"Ligne de résultat illisible dans le lot {batch.openai_batch_id}: {e}")
+                    continue
+                job = jobs.pop(custom_id, None)
+                if job is None:
+                    continue
+                payslip = service.finalize_analysis({'payslip': job.payslip}, result)
+                finish_job(job, payslip is not None)
+
+        for job in jobs.values():
+            error = f"Aucun résultat dans le lot {batch.openai_batch_id} (statut {batch.status})"
+            service.finalize_analysis({'payslip': job.payslip}, {'error': error})
+            finish_job(job, False, error)
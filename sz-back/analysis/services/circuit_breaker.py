@@ -0,0 +1,246 @@
+"""
+Disjoncteur (circuit breaker) partagé autour de l'API Vision d'OpenAI.
+
+- Fermé: les appels passent; après OPENAI_BREAKER_FAILURE_THRESHOLD échecs
+  consécutifs (erreurs serveur, timeouts, 429 persistants, ou réponses plus lentes
+  que OPENAI_LATENCY_SLO_SECONDS), le disjoncteur s'ouvre.
+- Ouvert: les appels échouent immédiatement (CircuitOpenError) au lieu d'attendre
+  le timeout; les workers cessent de réclamer des tâches.
+- Semi-ouvert: après OPENAI_BREAKER_RESET_TIMEOUT secondes, une seule requête de
+  test est autorisée; son succès referme le disjoncteur, son échec le rouvre.
+
+L'état est stocké en base (CircuitBreakerState) afin que tous les processus
+basculent ensemble et que l'état soit consultable depuis l'administration.
+Disjoncteur fermé, chaque appel ne fait qu'une lecture et des UPDATE
+conditionnels (compteurs en F()); le verrou de ligne n'est pris que pour un
+changement d'état (ouverture, requête de test, fermeture).
+"""
+import logging
+import threading
+from collections import deque
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger('salariz.gpt_vision')
+
+# Une requête de test restée sans issue au-delà de ce délai est considérée perdue
+PROBE_STALE_SECONDS = 300
+# Nombre minimal de mesures avant d'estimer un percentile de latence
+MIN_LATENCY_SAMPLES = 20
+
+
+class CircuitOpenError(RuntimeError):
+    """L'API Vision est considérée indisponible: appel refusé sans attendre."""
+
+
+class LatencyTracker:
+    """Latences des derniers appels réussis (par processus), pour le p95 et le hedging."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+latency_tracker = LatencyTracker()
+
+
+def is_service_failure(exc: Exception) -> bool:
+    """Distingue une défaillance du service (comptée par le disjoncteur) d'une erreur de requête."""
+    response = getattr(exc, 'response', None)
+    status_code = getattr(response, 'status_code', None)
+    if status_code is not None:
+        return status_code >= 500 or status_code in (408, 429)
+    if isinstance(exc, requests.exceptions.RequestException):
+        # Timeout ou connexion impossible
+        return True
+    try:
+        import httpx  # type: ignore
+    except ImportError:
+        return False
+    return isinstance(exc, httpx.TransportError)
+
+
+class VisionCircuitBreaker:
+    """Disjoncteur de l'API Vision dont l'état est partagé via la base de données."""
+
+    def __init__(self, key: str = 'openai-vision', failure_threshold: Optional[int] = None,
+                 reset_timeout: Optional[float] = None, latency_slo: Optional[float] = None):
+        self.key = key
+        self.failure_threshold = failure_threshold or getattr(settings, 'OPENAI_BREAKER_FAILURE_THRESHOLD', 5)
+        self.reset_timeout = reset_timeout if reset_timeout is not None else getattr(
+            settings, 'OPENAI_BREAKER_RESET_TIMEOUT', 60.0
+        )
+        self.latency_slo = latency_slo if latency_slo is not None else getattr(
+            settings, 'OPENAI_LATENCY_SLO_SECONDS', 120.0
+        )
+
+    def allows_requests(self) -> bool:
+        """Lecture sans effet de bord: un appel aurait-il une chance de passer maintenant ?"""
+        from analysis.models import CircuitBreakerState
+        state = CircuitBreakerState.objects.filter(key=self.key).first()
+        return state is None or state.state == 'closed' or self._probe_due(state, timezone.now())
+
+    def before_call(self) -> None:
+        """
+        À appeler avant chaque requête.
+
+        Raises:
+            CircuitOpenError: si le disjoncteur est ouvert (ou si une requête de test est déjà en cours)
+        """
+        from analysis.models import CircuitBreakerState
+        state = CircuitBreakerState.objects.filter(key=self.key).first()
+        if state is None or state.state == 'closed':
+            return
+        if self._probe_due(state, timezone.now()):
+            with transaction.atomic():
+                # Relecture sous verrou: un seul processus obtient la requête de test
+                state = self._locked_state()
+                now = timezone.now()
+                if state.state == 'closed':
+                    return
+                if self._probe_due(state, now):
+                    if state.state == 'open':
+                        logger.info(f"Disjoncteur {self.key}: semi-ouvert, envoi d'une requête de test")
+                    else:
+                        logger.info(f"Disjoncteur {self.key}: requête de test précédente perdue, nouvelle tentative")
+                    state.state = 'half_open'
+                    state.probe_started_at = now
+                    state.save(update_fields=['state', 'probe_started_at', 'updated_at'])
+                    return
+        CircuitBreakerState.objects.filter(key=self.key).update(
+            short_circuits=F('short_circuits') + 1, updated_at=timezone.now()
+        )
+        raise CircuitOpenError("API Vision temporairement indisponible (disjoncteur ouvert), réessayez plus tard")
+
+    def record_success(self, latency: Optional[float] = None) -> None:
+        """
+        Enregistre un appel réussi; une latence au-delà du SLO compte comme un échec.
+        Sans latence (erreur de requête 4xx), l'appel compte comme un succès pour le
+        disjoncteur: il libère la requête de test sans fausser le p95.
+        """
+        from analysis.models import CircuitBreakerState
+        if latency is not None:
+            latency_tracker.add(latency)
+            if self.latency_slo and latency > self.latency_slo:
+                logger.warning(f"Disjoncteur {self.key}: latence {latency:.1f}s au-delà du SLO de {self.latency_slo}s")
+                self._record_failure(slo_breach=True)
+                return
+        updates = {'successes': F('successes') + 1, 'consecutive_failures': 0, 'updated_at': timezone.now()}
+        p95 = latency_tracker.percentile(0.95)
+        if p95 is not None:
+            updates['p95_latency_seconds'] = p95
+        if CircuitBreakerState.objects.filter(key=self.key, state='closed').update(**updates):
+            return
+        with transaction.atomic():
+            state = self._locked_state()
+            state.successes += 1
+            state.consecutive_failures = 0
+            if state.state != 'closed':
+                logger.info(f"Disjoncteur {self.key}: requête de test réussie, fermeture")
+                state.state = 'closed'
+                state.opened_at = None
+                state.probe_started_at = None
+            if p95 is not None:
+                state.p95_latency_seconds = p95
+            state.save()
+
+    def record_failure(self) -> None:
+        self._record_failure()
+
+    def _record_failure(self, slo_breach: bool = False) -> None:
+        from analysis.models import CircuitBreakerState
+        counter = 'slo_breaches' if slo_breach else 'failures'
+        # Échec sous le seuil, disjoncteur fermé: simple incrément
+        below_threshold = CircuitBreakerState.objects.filter(
+            key=self.key, state='closed', consecutive_failures__lt=self.failure_threshold - 1
+        ).update(
+            consecutive_failures=F('consecutive_failures') + 1,
+            updated_at=timezone.now(),
+            **{counter: F(counter) + 1}
+        )
+        if below_threshold:
+            return
+        with transaction.atomic():
+            state = self._locked_state()
+            setattr(state, counter, getattr(state, counter) + 1)
+            self._register_failure(state)
+            state.save()
+
+    def record_hedge(self, hedge_won: bool) -> None:
+        from analysis.models import CircuitBreakerState
+        self._ensure_state()
+        updates = {'hedged_requests': F('hedged_requests') + 1}
+        if hedge_won:
+            updates['hedge_wins'] = F('hedge_wins') + 1
+        CircuitBreakerState.objects.filter(key=self.key).update(**updates)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """État courant et compteurs, pour la supervision."""
+        from analysis.models import CircuitBreakerState
+        state = CircuitBreakerState.objects.filter(key=self.key).first()
+        if state is None:
+            return {'key': self.key, 'state': 'closed'}
+        return {
+            'key': state.key,
+            'state': state.state,
+            'consecutive_failures': state.consecutive_failures,
+            'opened_at': state.opened_at,
+            'successes': state.successes,
+            'failures': state.failures,
+            'slo_breaches': state.slo_breaches,
+            'short_circuits': state.short_circuits,
+            'hedged_requests': state.hedged_requests,
+            'hedge_wins': state.hedge_wins,
+            'p95_latency_seconds': state.p95_latency_seconds,
+            'failure_threshold': self.failure_threshold,
+            'reset_timeout_seconds': self.reset_timeout,
+            'latency_slo_seconds': self.latency_slo,
+            'updated_at': state.updated_at,
+        }
+
+    def _probe_due(self, state, now) -> bool:
+        """Le disjoncteur peut-il laisser passer une requête de test ?"""
+        if state.state == 'open':
+            return state.opened_at is None or now - state.opened_at >= timedelta(seconds=self.reset_timeout)
+        if state.state == 'half_open':
+            return state.probe_started_at is None or now - state.probe_started_at > timedelta(seconds=PROBE_STALE_SECONDS)
+        return False
+
+    def _register_failure(self, state) -> None:
+        state.consecutive_failures += 1
+        if state.state == 'half_open' or (
+            state.state == 'closed' and state.consecutive_failures >= self.failure_threshold
+        ):
+            logger.warning(
+                f"Disjoncteur {self.key}: ouverture après {state.consecutive_failures} échec(s) consécutif(s), "
+                f"appels refusés pendant {self.reset_timeout}s"
+            )
+            state.state = 'open'
+            state.opened_at = timezone.now()
+            state.probe_started_at = None
+
+    def _locked_state(self):
+        from analysis.models import CircuitBreakerState
+        state, _ = CircuitBreakerState.objects.select_for_update().get_or_create(key=self.key)
+        return state
+
+    def _ensure_state(self) -> None:
+        from analysis.models import CircuitBreakerState
+        CircuitBreakerState.objects.get_or_create(key=self.key)
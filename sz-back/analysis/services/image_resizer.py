@@ -0,0 +1,95 @@
+"""
+Redimensionnement des pages envoyées à l'API Vision selon un budget de tuiles.
+
+En détail "high", une image est facturée 85 tokens plus 170 par tuile de 512 px
+(après ajustement dans 2048x2048 et côté court ramené à 768). Une page A4 rendue
+à 150 DPI coûte ainsi 6 tuiles, alors que 4 suffisent à garder les chiffres
+lisibles. Pour chaque page, on essaie chaque grille de tuiles du budget
+(VISION_IMAGE_MAX_TILES) avec l'échelle qui fait tomber l'image exactement sur
+les bords de la grille, et on retient la plus petite dont le côté court reste
+au-dessus du seuil de lisibilité (VISION_IMAGE_MIN_SHORT_SIDE).
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from PIL import Image
+
+from .rate_limiter import IMAGE_MAX_LONG_SIDE, IMAGE_MAX_SHORT_SIDE, IMAGE_TILE_SIZE, estimate_image_tokens, image_tiles
+
+logger = logging.getLogger('salariz.gpt_vision')
+
+DEFAULT_MAX_TILES = 6
+# Environ 85 DPI sur la largeur d'une page A4: chiffres de 7 pt encore lisibles
+DEFAULT_MIN_SHORT_SIDE = 700
+
+
+def resize_settings() -> Tuple[int, int]:
+    """(budget de tuiles par page, côté court minimal en pixels) configurés; budget 0 = pas de redimensionnement."""
+    return (
+        getattr(settings, 'VISION_IMAGE_MAX_TILES', DEFAULT_MAX_TILES),
+        getattr(settings, 'VISION_IMAGE_MIN_SHORT_SIDE', DEFAULT_MIN_SHORT_SIDE),
+    )
+
+
+def plan_page_size(width: int, height: int, max_tiles: int, min_short_side: int) -> Tuple[int, int]:
+    """
+    Dimensions d'envoi d'une page de `width` x `height` pixels (jamais agrandie).
+    Parmi les grilles de au plus `max_tiles` tuiles, la page est mise à l'échelle qui
+    la fait tenir exactement dans la grille; on retient la moins coûteuse qui reste
+    lisible, ou à défaut la plus grande du budget.
+    """
+    if max_tiles <= 0:
+        return width, height
+    # Au-delà, l'API réduit elle-même l'image: envoyer plus grand n'apporte que des octets
+    cap = min(1.0, IMAGE_MAX_LONG_SIDE / max(width, height), IMAGE_MAX_SHORT_SIDE / min(width, height))
+    legible_short_side = min(min_short_side, int(min(width, height) * cap))
+
+    best_legible = None
+    best_fallback = None
+    for cols in range(1, max_tiles + 1):
+        for rows in range(1, max_tiles // cols + 1):
+            scale = min(cap, cols * IMAGE_TILE_SIZE / width, rows * IMAGE_TILE_SIZE / height)
+            size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            tiles = image_tiles(*size)
+            area = size[0] * size[1]
+            if min(size) >= legible_short_side:
+                candidate = (tiles, -area, size)
+                if best_legible is None or candidate < best_legible:
+                    best_legible = candidate
+            candidate = (-area, tiles, size)
+            if best_fallback is None or candidate < best_fallback:
+                best_fallback = candidate
+
+    if best_legible is not None:
+        return best_legible[2]
+    logger.warning(
+        f"Budget de {max_tiles} tuile(s) insuffisant pour une page {width}x{height} lisible "
+        f"(côté court minimal {min_short_side} px)"
+    )
+    return best_fallback[2]
+
+
+def resize_page(image: Image.Image, max_tiles: Optional[int] = None, min_short_side: Optional[int] = None) -> Image.Image:
+    """Page redimensionnée selon le budget de tuiles (l'image d'origine si rien ne change)."""
+    default_tiles, default_short_side = resize_settings()
+    target = plan_page_size(
+        image.width, image.height,
+        default_tiles if max_tiles is None else max_tiles,
+        default_short_side if min_short_side is None else min_short_side,
+    )
+    if target == image.size:
+        return image
+    return image.resize(target, Image.LANCZOS)
+
+
+def image_token_metrics(source_sizes: List[Tuple[int, int]], sent_sizes: List[Tuple[int, int]]) -> Dict[str, int]:
+    """Tokens d'image estimés avant et après redimensionnement, pour le suivi des économies."""
+    tokens_before = sum(estimate_image_tokens(w, h) for w, h in source_sizes)
+    tokens_after = sum(estimate_image_tokens(w, h) for w, h in sent_sizes)
+    return {
+        'pages': len(sent_sizes),
+        'image_tokens_before': tokens_before,
+        'image_tokens_after': tokens_after,
+        'image_tokens_saved': tokens_before - tokens_after,
+    }
@@ -8,6 +8,16 @@ from PIL import Image
 
 logger = logging.getLogger('salariz.gpt_vision')
 
+def pil_image_to_bytes(image: Image.Image, format="JPEG") -> bytes:
+    """
+    Encode une image PIL (JPEG qualité 70 par défaut), telle qu'envoyée à l'API.
+    """
+    buffered = io.BytesIO()
+    if image.mode == 'RGBA' or image.mode == 'P':  # Check for RGBA or P (paletted) mode
+        image = image.convert('RGB')  # Convert to RGB to ensure JPEG compatibility
+    image.save(buffered, format=format, quality=70)
+    return buffered.getvalue()
+
 def pil_image_to_base64(image: Image.Image, format="JPEG") -> str:
     """
     Convertit une image PIL en chaîne base64.
@@ -19,11 +29,7 @@ def pil_image_to_base64(image: Image.Image, format="JPEG") -> str:
     Returns:
         La chaîne base64 encodée de l'image
     """
-    buffered = io.BytesIO()
-    if image.mode == 'RGBA' or image.mode == 'P':  # Check for RGBA or P (paletted) mode
-        image = image.convert('RGB')  # Convert to RGB to ensure JPEG compatibility
-    image.save(buffered, format=format, quality=70)
-    return base64.b64encode(buffered.getvalue()).decode('utf-8')
+    return base64.b64encode(pil_image_to_bytes(image, format)).decode('utf-8')
 
 def image_file_to_base64(image_path: str) -> str:
     """
@@ -39,4 +45,32 @@ def image_file_to_base64(image_path: str) -> str:
         FileNotFoundError: Si le fichier n'existe pas
     """
     with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
\ No newline at end of file
+        return base64.b64encode(image_file.read()).decode('utf-8')
+def image_bytes_size(data: bytes) -> tuple:
+    """Dimensions (largeur, hauteur) d'une image encodée (seul l'en-tête est lu)."""
+    with Image.open(io.BytesIO(data)) as image:
+        return image.size
+
+def encoded_image_size(image) -> tuple:
+    """Dimensions d'une page envoyée à l'API: JPEG brut (bytes) ou image en base64 (str)."""
+    if isinstance(image, str):
+        return base64_image_size(image)
+    try:
+        return image_bytes_size(image)
+    except Exception:
+        raise ValueError("Image illisible")
+
+def base64_image_size(b64_image: str) -> tuple:
+    """
+    Retourne les dimensions (largeur, hauteur) d'une image encodée en base64.
+    Seul l'en-tête est décodé quand il suffit (les JPEG produits ici ont leurs
+    dimensions dans les premiers kilo-octets).
+    """
+    for head in (b64_image[:8192], b64_image):
+        try:
+            data = base64.b64decode(head[:len(head) - len(head) % 4])
+            with Image.open(io.BytesIO(data)) as image:
+                return image.size
+        except Exception:
+            continue
+    raise ValueError("Image base64 illisible")
@@ -0,0 +1,294 @@
+"""
+File d'attente persistée des analyses de fiches de paie.
+
+Les tâches sont créées dans la même transaction que la fiche de paie, puis les
+workers (`manage.py run_analysis_worker`) sont réveillés via `transaction.on_commit`.
+Chaque worker réclame une tâche avec SELECT ... FOR UPDATE SKIP LOCKED, ce qui
+permet à plusieurs processus (sur plusieurs machines) de vider la file sans conflit.
+
+Une tâche réclamée est tenue par un bail (ANALYSIS_JOB_LEASE_SECONDS) que le
+worker renouvelle tant qu'il est en vie (`renew_leases`). Si le worker meurt
+(timeout, OOM, déploiement), `reap_expired_leases` remet la tâche en file,
+puis l'abandonne après ANALYSIS_JOB_MAX_ATTEMPTS tentatives en remboursant le crédit.
+"""
+import logging
+import select
+import time
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from documents.models import PaySlip
+from analysis.models import AnalysisJob
+
+logger = logging.getLogger('salariz.analysis')
+
+# Canal LISTEN/NOTIFY PostgreSQL utilisé pour réveiller les workers
+NOTIFY_CHANNEL = 'analysis_jobs'
+
+
+def enqueue_analysis(payslip: PaySlip, mode: str = 'live', credits_charged: int = 0) -> AnalysisJob:
+    """
+    Place une fiche de paie dans la file d'analyse.
+    Les workers ne sont réveillés qu'une fois la transaction courante validée.
+    En mode 'batch', la tâche attend d'être regroupée dans un lot de l'API Batch.
+    `credits_charged` est le nombre de crédits à rembourser si l'analyse est abandonnée.
+    """
+    with transaction.atomic():
+        job = AnalysisJob.objects.create(payslip=payslip, mode=mode, credits_charged=credits_charged)
+        if payslip.processing_status != 'queued':
+            payslip.processing_status = 'queued'
+            payslip.save(update_fields=['processing_status'])
+        transaction.on_commit(_notify_workers)
+    logger.info(f"Fiche {payslip.id} placée en file d'analyse (tâche {job.id})")
+    return job
+
+
+def _notify_workers() -> None:
+    """Réveille les workers en attente (PostgreSQL uniquement, sinon ils interrogent la file)."""
+    if connection.vendor != 'postgresql':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, '')", [NOTIFY_CHANNEL])
+    except Exception as e:
+        logger.warning(f"Échec de la notification des workers d'analyse: {e}")
+
+
+def wait_for_jobs(timeout: float) -> None:
+    """Attend une notification de nouvelle tâche, au plus `timeout` secondes."""
+    if connection.vendor != 'postgresql':
+        time.sleep(timeout)
+        return
+    try:
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        pg_conn = connection.connection
+        if select.select([pg_conn], [], [], timeout) != ([], [], []):
+            pg_conn.poll()
+            pg_conn.notifies.clear()
+    except Exception as e:
+        logger.warning(f"Attente LISTEN indisponible, repli sur une attente simple: {e}")
+        time.sleep(timeout)
+
+
+def claim_next_job(worker_id: str, group_limit: Optional[int] = None, scheduler=None) -> Optional[AnalysisJob]:
+    """
+    Réclame la prochaine tâche en attente et la passe en 'processing'.
+    Le choix de l'utilisateur et du niveau de priorité est délégué au FairScheduler;
+    pour un utilisateur donné, la plus ancienne tâche passe en premier.
+    Les lignes déjà verrouillées par un autre worker sont ignorées (SKIP LOCKED).
+    Si `group_limit` est fourni, les groupes ayant déjà autant d'analyses en cours sont ignorés.
+    """
+    if scheduler is None:
+        from .scheduler import get_default_scheduler
+        scheduler = get_default_scheduler()
+
+    candidates = AnalysisJob.objects.filter(status='queued', mode='live')
+    if group_limit:
+        saturated_groups = (
+            AnalysisJob.objects
+            .filter(status='processing', mode='live', group__isnull=False)
+            .values('group')
+            .annotate(in_flight=Count('id'))
+            .filter(in_flight__gte=group_limit)
+            .values('group')
+        )
+        candidates = candidates.exclude(group__in=saturated_groups)
+
+    for user_id, level_filter in scheduler.plan(candidates):
+        with transaction.atomic():
+            job = (
+                candidates
+                .filter(level_filter, payslip__user_id=user_id)
+                # Ne verrouiller que la tâche, pas la fiche de paie jointe
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('created_at', 'id')
+                .first()
+            )
+            if job is None:
+                continue
+            _start_lease(job, worker_id, timezone.now())
+            job.save(update_fields=LEASE_FIELDS)
+        scheduler.charge(user_id)
+        return job
+    return None
+
+
+def claim_batch_jobs(worker_id: str, limit: int) -> List[AnalysisJob]:
+    """Réclame jusqu'à `limit` tâches en mode 'batch' (les plus anciennes d'abord)."""
+    with transaction.atomic():
+        jobs = list(
+            AnalysisJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='queued', mode='batch')
+            .order_by('created_at', 'id')[:limit]
+        )
+        now = timezone.now()
+        for job in jobs:
+            _start_lease(job, worker_id, now)
+        AnalysisJob.objects.bulk_update(jobs, LEASE_FIELDS)
+    return jobs
+
+
+LEASE_FIELDS = ['status', 'attempts', 'started_at', 'worker_id', 'lease_expires_at', 'heartbeat_at']
+
+
+def _lease_duration() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'ANALYSIS_JOB_LEASE_SECONDS', 300))
+
+
+def _start_lease(job: AnalysisJob, worker_id: str, now) -> None:
+    job.status = 'processing'
+    job.attempts += 1
+    job.started_at = now
+    job.worker_id = worker_id
+    job.heartbeat_at = now
+    job.lease_expires_at = now + _lease_duration()
+
+
+def renew_leases(worker_id: str) -> int:
+    """Prolonge le bail de toutes les tâches en cours de ce worker (signe de vie)."""
+    now = timezone.now()
+    return AnalysisJob.objects.filter(status='processing', worker_id=worker_id).update(
+        heartbeat_at=now, lease_expires_at=now + _lease_duration()
+    )
+
+
+def reap_expired_leases(max_attempts: Optional[int] = None,
+                        service_factory: Optional[Callable[[], object]] = None) -> Dict[str, int]:
+    """
+    Récupère les tâches dont le worker a cessé de renouveler le bail.
+    Elles sont remises en file tant que `max_attempts` n'est pas atteint, sinon
+    marquées en erreur et le crédit débité est rendu à l'utilisateur.
+    Les tâches rattachées à un lot OpenAI sont suivies par `run_analysis_batches`.
+    Plusieurs workers peuvent l'exécuter en même temps (SKIP LOCKED).
+    """
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'ANALYSIS_JOB_MAX_ATTEMPTS', 3)
+    counts = {'requeued': 0, 'abandoned': 0}
+    with transaction.atomic():
+        expired = list(
+            AnalysisJob.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .filter(status='processing', lease_expires_at__lt=timezone.now(), batch__isnull=True)
+            .select_related('payslip')
+        )
+        for job in expired:
+            error = f"Bail expiré (worker {job.worker_id or 'inconnu'}, tentative {job.attempts})"
+            logger.warning(f"Tâche {job.id} (fiche {job.payslip_id}): {error}")
+            job.last_error = error
+            job.lease_expires_at = None
+            if job.attempts < max_attempts:
+                job.status = 'queued'
+                job.worker_id = ''
+                job.save(update_fields=['status', 'worker_id', 'lease_expires_at', 'last_error'])
+                PaySlip.objects.filter(id=job.payslip_id).update(processing_status='queued', processing_progress='')
+                counts['requeued'] += 1
+            else:
+                _abandon_job(job, error, service_factory)
+                counts['abandoned'] += 1
+        if counts['requeued']:
+            transaction.on_commit(_notify_workers)
+    return counts
+
+
+def _abandon_job(job: AnalysisJob, error: str, service_factory: Optional[Callable[[], object]]) -> None:
+    """Clôt en erreur une tâche abandonnée et rembourse les crédits débités à sa mise en file."""
+    job.status = 'error'
+    job.finished_at = timezone.now()
+    refund = job.credits_charged
+    job.credits_charged = 0
+    job.save(update_fields=['status', 'finished_at', 'lease_expires_at', 'last_error', 'credits_charged'])
+
+    if service_factory is None:
+        from .analysis_service import AnalysisService
+        service_factory = AnalysisService
+    # Enregistre l'erreur sur l'analyse et fait avancer le groupe éventuel
+    service_factory()._handle_analysis_exception(
+        RuntimeError(f"Analyse abandonnée après {job.attempts} tentative(s): {error}"), job.payslip
+    )
+
+    if refund > 0:
+        from billing.models import CreditTransaction
+        user = job.payslip.user
+        user.add_credits(refund)
+        CreditTransaction.objects.create(
+            user=user, type='refund', amount=refund,
+            description=f"Remboursement: analyse de la fiche {job.payslip_id} abandonnée",
+        )
+        logger.info(f"{refund} crédit(s) remboursé(s) à l'utilisateur {user.id} (tâche {job.id})")
+
+
+def run_job(job: AnalysisJob, analysis_service=None) -> AnalysisJob:
+    """Exécute l'analyse associée à une tâche réclamée et enregistre son issue."""
+    if analysis_service is None:
+        from .analysis_service import AnalysisService
+        analysis_service = AnalysisService()
+
+    logger.info(f"Worker {job.worker_id}: début de la tâche {job.id} (fiche {job.payslip_id})")
+    error = ''
+    try:
+        result = analysis_service.analyze_payslip(job.payslip_id)
+    except Exception as e:
+        # analyze_payslip gère déjà ses erreurs; filet de sécurité pour le worker
+        logger.exception(f"Erreur inattendue pendant la tâche {job.id}: {e}")
+        result = None
+        error = str(e)
+    return finish_job(job, result is not None, error)
+
+
+def finish_job(job: AnalysisJob, succeeded: bool, error: str = '') -> AnalysisJob:
+    """Enregistre l'issue d'une tâche (l'erreur de l'analyse est reprise si aucune n'est fournie)."""
+    if succeeded:
+        job.status = 'completed'
+    else:
+        job.status = 'error'
+        job.last_error = error or _payslip_error_message(job.payslip_id)
+    job.finished_at = timezone.now()
+    job.lease_expires_at = None
+    # Si le bail a expiré entre-temps, la tâche appartient désormais à un autre worker
+    updated = AnalysisJob.objects.filter(id=job.id, status='processing', worker_id=job.worker_id).update(
+        status=job.status, finished_at=job.finished_at, last_error=job.last_error, lease_expires_at=None
+    )
+    if not updated:
+        logger.warning(f"Worker {job.worker_id}: tâche {job.id} reprise par un autre worker, issue ignorée")
+        return job
+    logger.info(f"Worker {job.worker_id}: tâche {job.id} terminée avec le statut '{job.status}'")
+    return job
+
+
+def requeue_job(job: AnalysisJob, reason: str = '', count_attempt: bool = False) -> bool:
+    """
+    Remet en file une tâche réclamée et libère son bail. Par défaut la tentative n'est pas
+    comptée (appel API jamais parti, ex. disjoncteur ouvert); `count_attempt` la conserve
+    pour qu'un échec répété finisse abandonné (ANALYSIS_JOB_MAX_ATTEMPTS).
+    Retourne False si la tâche appartient déjà à un autre worker.
+    """
+    with transaction.atomic():
+        updated = AnalysisJob.objects.filter(id=job.id, status='processing', worker_id=job.worker_id).update(
+            status='queued', attempts=F('attempts') - (0 if count_attempt else 1), worker_id='',
+            started_at=None, lease_expires_at=None, heartbeat_at=None, last_error=reason,
+        )
+        if updated:
+            PaySlip.objects.filter(id=job.payslip_id).update(processing_status='queued', processing_progress='')
+            transaction.on_commit(_notify_workers)
+    if updated:
+        logger.info(f"Worker {job.worker_id}: tâche {job.id} remise en file ({reason or 'non envoyée'})")
+    return bool(updated)
+
+
+def _payslip_error_message(payslip_id: int) -> str:
+    from analysis.models import PayslipAnalysis
+    details = (
+        PayslipAnalysis.objects
+        .filter(payslip_id=payslip_id)
+        .values_list('analysis_details', flat=True)
+        .first()
+    ) or {}
+    return str(details.get('error', 'Erreur inconnue'))
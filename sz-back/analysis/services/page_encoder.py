@@ -0,0 +1,110 @@
+"""
+Transformation d'une page rasterisée en JPEG envoyé à l'API Vision:
+prétraitement (page_preprocessing), redimensionnement au budget de tuiles
+(image_resizer) puis encodage. Les paramètres sont lus une fois dans les settings
+et résumés dans une clé de rendu, utilisée par le cache de rasterisation.
+Les pages d'un document sont traitées en parallèle par un pool de threads partagé
+(PDF_PAGE_WORKERS): Pillow et NumPy relâchent le GIL pendant le redimensionnement,
+les calculs sur les pixels et l'encodage JPEG.
+Un PDF est rendu sur disque puis chaque page est chargée, encodée et libérée par
+un worker (encode_pdf): au plus PDF_PAGE_WORKERS pages décodées sont en mémoire,
+quel que soit le nombre de pages du document.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+from django.conf import settings
+from PIL import Image
+
+from .image_resizer import resize_page, resize_settings
+from .image_utils import pil_image_to_bytes
+from .page_filter import page_signature
+from .pdf_converter import PDF_RASTER_DPI, rendered_page_files
+
+S = TypeVar('S')
+T = TypeVar('T')
+
+_executors: Dict[int, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def page_workers() -> int:
+    return max(1, getattr(settings, 'PDF_PAGE_WORKERS', 1))
+
+
+def _get_executor(workers: int) -> ThreadPoolExecutor:
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='page-encoder')
+            _executors[workers] = executor
+        return executor
+
+
+def map_pages(func: Callable[[S], T], pages: List[S], workers: Optional[int] = None) -> List[T]:
+    """Applique `func` à chaque page, en parallèle sur `workers` threads (ordre des pages conservé)."""
+    workers = page_workers() if workers is None else workers
+    if workers <= 1 or len(pages) <= 1:
+        return [func(page) for page in pages]
+    return list(_get_executor(workers).map(func, pages))
+
+
+class PageEncoder:
+    """Encode les pages d'un document avec les paramètres configurés."""
+
+    def __init__(self, max_tiles: Optional[int] = None, min_short_side: Optional[int] = None,
+                 preprocess: Optional[bool] = None, deskew: Optional[bool] = None):
+        default_tiles, default_short_side = resize_settings()
+        self.max_tiles = default_tiles if max_tiles is None else max_tiles
+        self.min_short_side = default_short_side if min_short_side is None else min_short_side
+        self.preprocess = getattr(settings, 'VISION_PAGE_PREPROCESSING', False) if preprocess is None else preprocess
+        self.deskew = getattr(settings, 'VISION_PAGE_DESKEW', False) if deskew is None else deskew
+
+    @property
+    def render_key(self) -> str:
+        """Identifie le rendu produit (DPI et paramètres) dans le cache de rasterisation."""
+        key = f"{PDF_RASTER_DPI}"
+        if self.max_tiles > 0:
+            key += f"-t{self.max_tiles}-s{self.min_short_side}"
+        if self.preprocess:
+            key += "-gd" if self.deskew else "-g"
+        return key
+
+    def prepare(self, page: Image.Image) -> Image.Image:
+        """Page prête à être encodée (prétraitée et redimensionnée)."""
+        if self.preprocess:
+            from .page_preprocessing import preprocess_page
+            page = preprocess_page(page, deskew_page=self.deskew)
+        return resize_page(page, self.max_tiles, self.min_short_side)
+
+    def encode(self, page: Image.Image) -> bytes:
+        return pil_image_to_bytes(self.prepare(page))
+
+    def encode_file(self, path: str) -> Tuple[Tuple[int, int], dict, bytes]:
+        """(dimensions rendues, signature, JPEG) d'une page rendue sur disque, supprimée ensuite."""
+        with Image.open(path) as page:
+            page.load()
+            result = page.size, page_signature(page), self.encode(page)
+        os.remove(path)
+        return result
+
+
+def encode_pdf(pdf_path: str, max_pages: Optional[int] = None, encoder: Optional[PageEncoder] = None,
+               workers: Optional[int] = None) -> Tuple[List[Tuple[int, int]], List[dict], List[bytes]]:
+    """
+    Rend le PDF page par page sur disque et encode les pages sur `workers` threads.
+
+    Returns:
+        (dimensions rendues, signatures, JPEG) des pages, dans l'ordre
+    """
+    encoder = encoder or PageEncoder()
+    workers = page_workers() if workers is None else workers
+    with rendered_page_files(pdf_path, max_pages, dpi=PDF_RASTER_DPI, thread_count=workers) as paths:
+        processed = map_pages(encoder.encode_file, paths, workers)
+    return (
+        [size for size, _, _ in processed],
+        [signature for _, signature, _ in processed],
+        [data for _, _, data in processed],
+    )
@@ -0,0 +1,139 @@
+"""
+Sélection des pages envoyées à l'API Vision.
+
+Chaque page rendue reçoit une signature: taux d'encre (part des pixels sombres,
+mesurée sur une version réduite) et empreinte exacte de la page (SHA-256 de la
+page binarisée en pleine résolution). Deux pages ne sont considérées identiques
+que si leurs empreintes sont égales: un seul chiffre différent change l'empreinte,
+une page de même mise en page mais aux montants différents reste donc envoyée.
+Sont écartées:
+- les pages blanches (taux d'encre sous VISION_BLANK_PAGE_INK_RATIO), dos de feuille
+  ou pages ne portant qu'un numéro;
+- si VISION_SKIP_BOILERPLATE_PAGES est activé (désactivé par défaut), hors première
+  page, les pages que l'utilisateur a déjà envoyées à l'identique dans au moins
+  VISION_BOILERPLATE_MIN_DOCUMENTS documents récents (mentions légales).
+Au moins une page est toujours envoyée. Les décisions sont jointes au résultat de
+l'analyse (`page_selection`); l'historique n'est mis à jour qu'après une analyse
+réussie (PageSelector.record).
+"""
+import logging
+import hashlib
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+from PIL import Image
+
+logger = logging.getLogger('salariz.gpt_vision')
+
+# Luminance en dessous de laquelle un pixel compte comme de l'encre
+INK_THRESHOLD = 200
+# Largeur de l'image réduite utilisée pour le taux d'encre (un trait de 1 px reste sombre)
+INK_SAMPLE_WIDTH = 600
+
+
+def page_signature(image: Image.Image) -> Dict[str, object]:
+    """Taux d'encre et empreinte exacte (SHA-256 hexadécimal) d'une page rendue."""
+    gray = image.convert('L')
+    factor = max(1, gray.width // INK_SAMPLE_WIDTH)
+    sample = gray.reduce(factor) if factor > 1 else gray
+    histogram = np.asarray(sample.histogram(), dtype=np.int64)
+    ink_ratio = float(histogram[:INK_THRESHOLD].sum()) / max(1, int(histogram.sum()))
+
+    # Page binarisée en pleine résolution: le rendu Poppler d'une même page est reproductible
+    ink = np.asarray(gray) < INK_THRESHOLD
+    digest = hashlib.sha256(f"{gray.width}x{gray.height}".encode('ascii'))
+    digest.update(np.packbits(ink).tobytes())
+    return {'ink_ratio': round(ink_ratio, 6), 'page_hash': digest.hexdigest()}
+
+
+class PageSelector:
+    """Choisit les pages à envoyer d'après leurs signatures et l'historique de l'utilisateur."""
+
+    def __init__(self, user_id: Optional[int] = None, document_sha256: str = ''):
+        self.user_id = user_id
+        self.document_sha256 = document_sha256 or ''
+        self.skip_blank = getattr(settings, 'VISION_SKIP_BLANK_PAGES', True)
+        self.blank_ink_ratio = getattr(settings, 'VISION_BLANK_PAGE_INK_RATIO', 0.001)
+        self.skip_boilerplate = getattr(settings, 'VISION_SKIP_BOILERPLATE_PAGES', False)
+        self.boilerplate_min_documents = getattr(settings, 'VISION_BOILERPLATE_MIN_DOCUMENTS', 3)
+        self.fingerprint_days = getattr(settings, 'VISION_PAGE_FINGERPRINT_DAYS', 400)
+
+    def _known_fingerprints(self, signatures: List[dict]) -> Dict[str, object]:
+        """Empreintes récentes de l'utilisateur correspondant exactement aux pages, par empreinte."""
+        from analysis.models import PageFingerprint
+        hashes = {signature['page_hash'] for signature in signatures if signature.get('page_hash')}
+        if not hashes:
+            return {}
+        since = timezone.now() - timedelta(days=self.fingerprint_days)
+        return {
+            fingerprint.page_hash: fingerprint
+            for fingerprint in PageFingerprint.objects.filter(
+                user_id=self.user_id, page_hash__in=hashes, last_seen_at__gte=since
+            )
+        }
+
+    def select(self, signatures: List[dict]) -> Tuple[List[int], List[dict]]:
+        """(indices des pages à envoyer, décisions d'exclusion)."""
+        known = {}
+        if self.skip_boilerplate and self.user_id and len(signatures) > 1:
+            known = self._known_fingerprints(signatures[1:])
+        kept, skipped = [], []
+        for index, signature in enumerate(signatures):
+            decision = None
+            fingerprint = known.get(signature.get('page_hash')) if index > 0 else None
+            if self.skip_blank and signature['ink_ratio'] < self.blank_ink_ratio:
+                decision = {'reason': 'blank', 'ink_ratio': signature['ink_ratio']}
+            elif fingerprint is not None and fingerprint.documents_seen >= self.boilerplate_min_documents:
+                decision = {'reason': 'boilerplate', 'documents_seen': fingerprint.documents_seen}
+            if decision is None:
+                kept.append(index)
+            else:
+                skipped.append(dict(decision, page=index + 1))
+        if not kept and signatures:
+            # Jamais de requête sans image: la première page est envoyée malgré tout
+            kept = [0]
+            skipped = [decision for decision in skipped if decision['page'] != 1]
+        for decision in skipped:
+            logger.info(f"Page {decision['page']} non envoyée à l'API ({decision['reason']})")
+        return kept, skipped
+
+    def record(self, signatures: List[dict]) -> None:
+        """
+        Comptabilise les pages de ce document (hors première et pages blanches) dans
+        l'historique, à appeler une fois l'analyse réussie. Chaque document n'est
+        compté qu'une fois par empreinte, même ré-analysé plus tard.
+        """
+        if not (self.skip_boilerplate and self.user_id and self.document_sha256) or len(signatures) < 2:
+            return
+        from analysis.models import PageFingerprint, PageFingerprintDocument
+        now = timezone.now()
+        counted = set()
+        for signature in signatures[1:]:
+            page_hash = signature.get('page_hash')
+            # Signature d'une entrée de cache antérieure à l'empreinte exacte: non comptée
+            if not page_hash or page_hash in counted or signature['ink_ratio'] < self.blank_ink_ratio:
+                continue
+            counted.add(page_hash)
+            fingerprint, _ = PageFingerprint.objects.get_or_create(
+                user_id=self.user_id, page_hash=page_hash, defaults={'last_seen_at': now}
+            )
+            try:
+                with transaction.atomic():
+                    _, created = PageFingerprintDocument.objects.get_or_create(
+                        fingerprint=fingerprint, document_sha256=self.document_sha256
+                    )
+            except IntegrityError:
+                # Même document compté en parallèle par un autre worker
+                created = False
+            updates = {'last_seen_at': now}
+            if created:
+                updates['documents_seen'] = models.F('documents_seen') + 1
+            PageFingerprint.objects.filter(id=fingerprint.id).update(**updates)
+
+
+def selection_metadata(kept: List[int], skipped: List[dict], page_count: int) -> dict:
+    return {'pages': page_count, 'sent_pages': [index + 1 for index in kept], 'skipped': skipped}
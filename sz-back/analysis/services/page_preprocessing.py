@@ -0,0 +1,127 @@
+"""
+Prétraitement des pages rasterisées avant redimensionnement et encodage.
+
+Les fiches de paie sont surtout du texte noir sur fond blanc avec de larges marges:
+la page passe en niveaux de gris (JPEG plus petit et plus rapide à encoder), le
+contraste des scans ternes est étiré d'après l'histogramme, l'inclinaison d'un scan
+peut être corrigée (VISION_PAGE_DESKEW) et les marges blanches sont rognées, ce qui
+réduit aussi le nombre de tuiles facturées. Les calculs se font avec NumPy sur le
+tableau de pixels.
+"""
+import logging
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger('salariz.gpt_vision')
+
+# Luminance en dessous de laquelle un pixel est considéré comme de l'encre
+INK_THRESHOLD = 200
+# Part minimale d'encre d'une ligne/colonne pour ne pas être prise pour une poussière de scan
+MIN_INK_RATIO = 0.002
+# Marge conservée autour du contenu (pixels)
+MARGIN_PADDING = 16
+# Étirement du contraste entre ces centiles de l'histogramme
+CONTRAST_LOW_PERCENTILE = 0.01
+CONTRAST_HIGH_PERCENTILE = 0.99
+# Plage de niveaux en dessous de laquelle la page est laissée telle quelle (page vide)
+MIN_CONTRAST_RANGE = 32
+# Correction d'inclinaison: angles testés (degrés) et seuil d'application
+DESKEW_MAX_ANGLE = 3.0
+DESKEW_STEP = 0.25
+DESKEW_MIN_ANGLE = 0.3
+# Largeur de l'image réduite utilisée pour estimer l'inclinaison
+DESKEW_SAMPLE_WIDTH = 800
+
+
+def to_grayscale(image: Image.Image) -> np.ndarray:
+    """Tableau uint8 (hauteur, largeur) de la luminance de la page."""
+    return np.asarray(image.convert('L'), dtype=np.uint8)
+
+
+def _percentile_level(histogram: np.ndarray, fraction: float) -> int:
+    cumulative = np.cumsum(histogram)
+    return int(np.searchsorted(cumulative, fraction * cumulative[-1]))
+
+
+def normalize_contrast(gray: np.ndarray) -> np.ndarray:
+    """
+    Étire les niveaux entre les centiles 1 % et 99 % de l'histogramme (table de
+    correspondance de 256 entrées). Sans effet sur une page déjà contrastée ou vide.
+    """
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    low = _percentile_level(histogram, CONTRAST_LOW_PERCENTILE)
+    high = _percentile_level(histogram, CONTRAST_HIGH_PERCENTILE)
+    if high - low < MIN_CONTRAST_RANGE or (low <= 8 and high >= 247):
+        return gray
+    levels = np.arange(256, dtype=np.float32)
+    lut = np.clip((levels - low) * (255.0 / (high - low)), 0, 255).astype(np.uint8)
+    return lut[gray]
+
+
+def estimate_skew(gray: np.ndarray) -> float:
+    """
+    Angle d'inclinaison du texte (degrés) par profil de projection: pour chaque angle
+    testé, les pixels d'encre sont projetés sur l'axe vertical et l'angle retenu est
+    celui qui donne les lignes les plus nettes (variance maximale du profil).
+    """
+    step = max(1, gray.shape[1] // DESKEW_SAMPLE_WIDTH)
+    ys, xs = np.nonzero(gray[::step, ::step] < INK_THRESHOLD)
+    if ys.size < 100:
+        return 0.0
+    ys = ys.astype(np.float32)
+    xs = xs.astype(np.float32)
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP / 2, DESKEW_STEP):
+        projected = ys - xs * math.tan(math.radians(angle))
+        projected -= projected.min()
+        profile = np.bincount(projected.astype(np.int64))
+        score = float(profile.var())
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def deskew(gray: np.ndarray) -> np.ndarray:
+    """Redresse la page si son inclinaison estimée dépasse DESKEW_MIN_ANGLE."""
+    angle = estimate_skew(gray)
+    if abs(angle) < DESKEW_MIN_ANGLE:
+        return gray
+    logger.info(f"Correction d'inclinaison de la page: {angle:.2f}°")
+    rotated = Image.fromarray(gray).rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return np.asarray(rotated, dtype=np.uint8)
+
+
+def content_bounds(gray: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """(haut, bas, gauche, droite) du contenu avec une marge de MARGIN_PADDING, ou None pour une page vide."""
+    ink = gray < INK_THRESHOLD
+    height, width = ink.shape
+    rows = np.flatnonzero(ink.sum(axis=1) > max(1, width * MIN_INK_RATIO))
+    cols = np.flatnonzero(ink.sum(axis=0) > max(1, height * MIN_INK_RATIO))
+    if rows.size == 0 or cols.size == 0:
+        return None
+    return (
+        max(0, int(rows[0]) - MARGIN_PADDING),
+        min(height, int(rows[-1]) + 1 + MARGIN_PADDING),
+        max(0, int(cols[0]) - MARGIN_PADDING),
+        min(width, int(cols[-1]) + 1 + MARGIN_PADDING),
+    )
+
+
+def crop_margins(gray: np.ndarray) -> np.ndarray:
+    """Rogne les marges blanches (une page vide est renvoyée entière)."""
+    bounds = content_bounds(gray)
+    if bounds is None:
+        return gray
+    top, bottom, left, right = bounds
+    return gray[top:bottom, left:right]
+
+
+def preprocess_page(image: Image.Image, deskew_page: bool = False) -> Image.Image:
+    """Page en niveaux de gris, contraste normalisé, éventuellement redressée, marges rognées."""
+    gray = normalize_contrast(to_grayscale(image))
+    if deskew_page:
+        gray = deskew(gray)
+    return Image.fromarray(np.ascontiguousarray(crop_margins(gray)))
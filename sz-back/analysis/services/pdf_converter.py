@@ -3,13 +3,25 @@ Utilitaires de conversion PDF en images
 """
 import os
 import logging
+import tempfile
 import traceback
-from typing import List, Optional, Dict, Any
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Dict, Any
 from PIL import Image
 
 logger = logging.getLogger('salariz.gpt_vision')
 
-def convert_pdf_to_images(pdf_path: str, max_pages: Optional[int] = None, dpi: int = 150) -> List[Image.Image]:
+# Résolution de rendu des pages envoyées à l'API (fait partie de la clé du cache de rasterisation)
+PDF_RASTER_DPI = 150
+
+def _conversion_kwargs(max_pages: Optional[int], dpi: int, thread_count: int) -> Dict[str, Any]:
+    kwargs = {"dpi": dpi, "first_page": 1, "thread_count": max(1, thread_count)}
+    if max_pages is not None:
+        kwargs["last_page"] = max_pages
+    return kwargs
+
+def convert_pdf_to_images(pdf_path: str, max_pages: Optional[int] = None, dpi: int = PDF_RASTER_DPI,
+                          thread_count: int = 1) -> List[Image.Image]:
     """
     Convertit un PDF en liste d'images PIL.
     
@@ -17,6 +29,7 @@ def convert_pdf_to_images(pdf_path: str, max_pages: Optional[int] = None, dpi: i
         pdf_path: Chemin vers le fichier PDF
         max_pages: Nombre maximum de pages à convertir (None = toutes)
         dpi: Résolution des images en DPI
+        thread_count: Nombre de processus Poppler, chacun rendant une plage de pages
         
     Returns:
         Liste des images PIL correspondant aux pages du PDF
@@ -33,13 +46,8 @@ def convert_pdf_to_images(pdf_path: str, max_pages: Optional[int] = None, dpi: i
     try:
         from pdf2image import convert_from_path # type: ignore
         
-        # Prépare les arguments pour la conversion
-        kwargs = {"dpi": dpi, "first_page": 1}
-        if max_pages is not None:
-            kwargs["last_page"] = max_pages
-
         # Conversion du PDF
-        pages = convert_from_path(pdf_path, **kwargs)
+        pages = convert_from_path(pdf_path, **_conversion_kwargs(max_pages, dpi, thread_count))
         logger.info(f"Conversion réussie de {len(pages)} page(s) du PDF: {pdf_path}")
         
         return pages
@@ -52,4 +60,42 @@ def convert_pdf_to_images(pdf_path: str, max_pages: Optional[int] = None, dpi: i
         raise ImportError("Dépendance manquante: pdf2image ou Poppler non configuré")
     except Exception as e:
         logger.error(f"Erreur lors de la conversion PDF de {pdf_path}: {e}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
+
+
+@contextmanager
+def rendered_page_files(pdf_path: str, max_pages: Optional[int] = None, dpi: int = PDF_RASTER_DPI,
+                        thread_count: int = 1) -> Iterator[List[str]]:
+    """
+    Rend les pages du PDF dans un répertoire temporaire, sans les charger en mémoire,
+    et fournit les chemins des images dans l'ordre des pages. Le répertoire est
+    supprimé à la sortie du bloc.
+
+    Raises:
+        FileNotFoundError: Si le fichier PDF n'existe pas
+        ImportError: Si pdf2image n'est pas installé
+    """
+    if not os.path.exists(pdf_path):
+        logger.error(f"Le fichier PDF n'existe pas: {pdf_path}")
+        raise FileNotFoundError(f"Fichier PDF non trouvé: {pdf_path}")
+
+    try:
+        from pdf2image import convert_from_path # type: ignore
+    except ImportError:
+        logger.error(
+            "Le module 'pdf2image' n'est pas installé ou Poppler non configuré. "
+            "Installez pdf2image et assurez-vous que Poppler est dans votre PATH."
+        )
+        raise ImportError("Dépendance manquante: pdf2image ou Poppler non configuré")
+
+    with tempfile.TemporaryDirectory(prefix='salariz-pages-') as output_folder:
+        try:
+            paths = convert_from_path(
+                pdf_path, output_folder=output_folder, paths_only=True,
+                **_conversion_kwargs(max_pages, dpi, thread_count)
+            )
+        except Exception as e:
+            logger.error(f"Erreur lors de la conversion PDF de {pdf_path}: {e}", exc_info=True)
+            raise
+        logger.info(f"Conversion réussie de {len(paths)} page(s) du PDF: {pdf_path}")
+        yield paths
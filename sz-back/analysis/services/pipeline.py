@@ -0,0 +1,182 @@
+"""
+Pipeline d'analyse en trois étapes: préparation (CPU) → appel API (réseau) → post-traitement.
+
+Chaque étape dispose de ses propres threads et les étapes communiquent par des
+files bornées: pendant qu'une analyse attend la réponse d'OpenAI, le document
+suivant est déjà rasterisé et encodé, sans garder en mémoire plus de
+`buffer_size` documents préparés en attente d'envoi.
+"""
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from django.db import close_old_connections, connection
+
+from analysis.models import AnalysisJob
+from .circuit_breaker import CircuitOpenError
+from .job_queue import finish_job, requeue_job
+
+logger = logging.getLogger('salariz.analysis')
+
+# Marqueur de fin envoyé à chaque thread d'une étape lors de l'arrêt
+_STOP = object()
+
+
+def _default_service_factory():
+    from .analysis_service import AnalysisService
+    return AnalysisService()
+
+
+class AnalysisPipeline:
+    """
+    Exécute des tâches d'analyse réclamées dans la file, étape par étape.
+
+    Une instance d'AnalysisService est créée par tâche (GPTVisionService n'est pas
+    partageable entre threads) et suit la tâche d'une étape à l'autre.
+    """
+
+    def __init__(self,
+                 prepare_workers: int = 2,
+                 submit_workers: int = 12,
+                 finalize_workers: int = 1,
+                 buffer_size: int = 2,
+                 service_factory: Optional[Callable[[], Any]] = None,
+                 on_finished: Callable[[AnalysisJob, bool, str], Any] = finish_job,
+                 on_requeued: Callable[[AnalysisJob, str], Any] = requeue_job):
+        self.prepare_workers = max(1, prepare_workers)
+        self.submit_workers = max(1, submit_workers)
+        self.finalize_workers = max(1, finalize_workers)
+        self.buffer_size = max(1, buffer_size)
+        self._service_factory = service_factory or _default_service_factory
+        self._on_finished = on_finished
+        self._on_requeued = on_requeued
+
+        # L'entrée n'est pas bornée: l'admission est limitée par `capacity`
+        self._incoming = queue.Queue()
+        self._prepared = queue.Queue(maxsize=self.buffer_size)
+        self._answered = queue.Queue(maxsize=self.buffer_size)
+        self._stages = [
+            (self._incoming, self._prepare, self._prepared, self.prepare_workers, 'prepare'),
+            (self._prepared, self._submit, self._answered, self.submit_workers, 'submit'),
+            (self._answered, self._finalize, None, self.finalize_workers, 'finalize'),
+        ]
+        self._threads = []
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.requeued = 0
+
+    @property
+    def capacity(self) -> int:
+        """Nombre de tâches que le pipeline peut porter sans qu'elles attendent à l'entrée."""
+        return self.prepare_workers + self.buffer_size + self.submit_workers
+
+    @property
+    def in_flight(self) -> int:
+        with self._condition:
+            return self._in_flight
+
+    def start(self) -> 'AnalysisPipeline':
+        for source, handler, target, count, name in self._stages:
+            threads = [
+                threading.Thread(
+                    target=self._run_stage, args=(source, handler, target),
+                    name=f'analysis-{name}-{i}', daemon=True,
+                )
+                for i in range(count)
+            ]
+            for thread in threads:
+                thread.start()
+            self._threads.append(threads)
+        return self
+
+    def submit(self, job: AnalysisJob) -> None:
+        """Ajoute une tâche déjà réclamée (statut 'processing') au pipeline."""
+        with self._condition:
+            self._in_flight += 1
+        self._incoming.put({'job': job})
+
+    def wait(self, timeout: float) -> None:
+        """Attend qu'une place se libère (pipeline plein) ou qu'une tâche se termine, au plus `timeout` s."""
+        with self._condition:
+            if self._in_flight >= self.capacity:
+                self._condition.wait_for(lambda: self._in_flight < self.capacity, timeout)
+            else:
+                self._condition.wait(timeout)
+
+    def shutdown(self) -> None:
+        """Laisse les tâches en cours traverser toutes les étapes, puis arrête les threads."""
+        for (source, _handler, _target, count, _name), threads in zip(self._stages, self._threads):
+            for _ in range(count):
+                source.put(_STOP)
+            for thread in threads:
+                thread.join()
+        self._threads = []
+
+    def _run_stage(self, source: queue.Queue, handler, target: Optional[queue.Queue]) -> None:
+        try:
+            while True:
+                item = source.get()
+                if item is _STOP:
+                    return
+                close_old_connections()
+                try:
+                    item = handler(item)
+                except Exception as e:
+                    logger.exception(f"Erreur inattendue dans le pipeline pour la tâche {item['job'].id}: {e}")
+                    self._complete(item['job'], False, str(e))
+                    continue
+                if item is not None and target is not None:
+                    # Bloque si l'étape suivante est saturée (contre-pression)
+                    target.put(item)
+        finally:
+            connection.close()
+
+    def _prepare(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        job = item['job']
+        logger.info(f"Worker {job.worker_id}: préparation de la tâche {job.id} (fiche {job.payslip_id})")
+        item['service'] = self._service_factory()
+        item['prepared'] = item['service'].prepare_analysis(job.payslip_id)
+        if item['prepared'] is None:
+            self._complete(job, False)
+            return None
+        return item
+
+    def _submit(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        try:
+            item['result'] = item['service'].submit_analysis(item['prepared'])
+        except CircuitOpenError as e:
+            # Refus immédiat du disjoncteur: la tâche n'a rien coûté, elle repart en file
+            self._requeue(item['job'], str(e))
+            return None
+        return item
+
+    def _finalize(self, item: Dict[str, Any]) -> None:
+        payslip = item['service'].finalize_analysis(item['prepared'], item['result'])
+        self._complete(item['job'], payslip is not None)
+        return None
+
+    def _requeue(self, job: AnalysisJob, reason: str) -> None:
+        try:
+            self._on_requeued(job, reason)
+        except Exception as e:
+            logger.exception(f"Impossible de remettre en file la tâche {job.id}: {e}")
+        with self._condition:
+            self._in_flight -= 1
+            self.requeued += 1
+            self._condition.notify_all()
+
+    def _complete(self, job: AnalysisJob, succeeded: bool, error: str = '') -> None:
+        try:
+            self._on_finished(job, succeeded, error)
+        except Exception as e:
+            logger.exception(f"Impossible d'enregistrer l'issue de la tâche {job.id}: {e}")
+        with self._condition:
+            self._in_flight -= 1
+            if succeeded:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._condition.notify_all()
@@ -0,0 +1,287 @@
+"""
+Construction des prompts d'analyse à partir de morceaux immuables.
+
+Le gabarit d'instructions est découpé une seule fois par processus (littéraux et
+emplacements nommés). Les extraits SMIC (tableau par défaut et un extrait par mois)
+et les blocs de convention collective tronqués sont calculés une fois puis
+réutilisés: chaque prompt est assemblé par concaténation, sans modifier d'état
+partagé entre deux requêtes.
+"""
+import logging
+import string
+import time
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .reference_data import SMIC_DATA, load_text_file
+
+logger = logging.getLogger('salariz.gpt_vision')
+
+# Nombre de lignes du tableau SMIC incluses quand aucune date de paiement n'est connue
+SMIC_EXCERPT_ROWS = 18
+
+MONTH_NAMES = {
+    1: 'Janvier', 2: 'Février', 3: 'Mars', 4: 'Avril', 5: 'Mai', 6: 'Juin',
+    7: 'Juillet', 8: 'Août', 9: 'Septembre', 10: 'Octobre', 11: 'Novembre', 12: 'Décembre'
+}
+
+ANOMALY_DETECTION_GUIDELINES = """UTILISE IMPÉRATIVEMENT LES INFORMATIONS FOURNIES (CONTEXTE UTILISATEUR, TABLEAU SMIC, EXTRAITS DE CONVENTION) POUR AFFINER TON ANALYSE ET DÉTECTER LES ANOMALIES POTENTIELLES, notamment:
+- Écart significatif (>2%) entre le salaire contractuel indiqué (si fourni) et le salaire de base brut extrait.
+- Si une convention collective est spécifiée, confronter les informations extraites avec les extraits de la convention fournis.
+- Vérifier si le taux horaire extrait est cohérent avec le salaire de base et les heures de base.
+- Signaler si le taux horaire extrait est inférieur au SMIC de référence (consulter le tableau SMIC fourni et choisir la valeur la plus pertinente pour la période de la fiche de paie).
+- Tiens compte des 'Détails supplémentaires fournis par l'utilisateur' pour interpréter les chiffres (ex: un temps partiel, un statut d'apprenti, une absence justifierait un salaire plus bas que le contractuel temps plein).
+"""
+
+# Gabarit str.format: les accolades doublées sont des accolades littérales du JSON attendu
+ANALYSIS_PROMPT_TEMPLATE = """
+        Tu es un expert en analyse de fiches de paie françaises. Tu vas recevoir plusieurs images représentant les pages consécutives d'UNE SEULE fiche de paie. Analyse l'ensemble des pages.
+
+        CONTEXTE IMPORTANT POUR L'ANALYSE (POC):
+        {smic_table}
+        
+        DISTINCTION CRITIQUE ENTRE MONTANTS (NE PAS CONFONDRE):
+        - Salaire brut (brut de base / salaire de base brut): Montant contractuel avant cotisations, hors primes exceptionnelles. Sert aux comparaisons SMIC et conventions.
+        - Salaire brut total: Brut de base + primes/HS éventuelles.
+        - Net imposable: Net fiscal utilisé pour l'impôt (inclut certaines cotisations, diffère du net à payer).
+        - Net à payer (ou net à payer avant acompte): Montant réellement versé au salarié (hors acomptes). C'est le « salaire net » usuel d'affichage.
+        - Montant net social (ou « net social »): Indicateur légal affiché sur les bulletins depuis 2023. À extraire séparément si présent.
+        RÈGLE: N'assigne JAMAIS le net social au champ "net_a_payer". Renseigne chaque champ distinctement. Utilise les libellés exacts de la fiche de paie (synonymes fréquents: « montant net social », « net social », « net imposable », « net à payer », « net à payer avant acompte »).
+
+        CONTEXTE SPÉCIFIQUE À LA CONVENTION COLLECTIVE:
+        {convention_block}
+
+        {user_context_prompt}
+        {status_line}
+
+        TÂCHE:
+        Extrait les informations clés de cette fiche de paie en te basant sur TOUTES les pages fournies et le contexte ci-dessus. Identifie les anomalies potentielles. Structure ta réponse au format JSON demandé.
+        
+        IMPORTANT: CALCULE ÉGALEMENT UN "MONTANT POTENTIELLEMENT DÛ AU SALARIÉ" si tu détectes des erreurs claires en sa défaveur.
+        Pour ce calcul, suis CET ORDRE DE PRIORITÉ:
+        1.  **ÉCART AU SALAIRE CONTRACTUEL (PRIORITAIRE SI CONTEXTE UTILISATEUR PERTINENT, EX: APPRENTI, TEMPS PARTIEL INDIQUÉ DANS LES DÉTAILS SUPPLÉMENTAIRES)**:
+            Si un salaire brut mensuel contractuel attendu est fourni dans le CONTEXTE UTILISATEUR (par exemple, "{contractual_salary_context}€") et que le `salaire_de_base_brut` extrait de la fiche de paie est inférieur à ce montant contractuel (en tenant compte des `additional_details` qui pourraient justifier un montant inférieur, comme un temps partiel), alors le `montant_potentiel_du_salarie` principal est la différence: `salaire_contractuel_attendu_ajusté_si_nécessaire - salaire_de_base_brut_extrait`. L'explication doit clairement se baser sur cet écart par rapport au salaire contractuel attendu et aux détails fournis.
+        2.  **ÉCART AU SMIC HORAIRE GÉNÉRAL (SUBSIDIAIRE)**:
+            Si aucun salaire contractuel pertinent n'est fourni dans le contexte, OU si le salaire contractuel est respecté MAIS que le `taux_horaire` extrait semble incorrect par rapport au SMIC général:
+            Si le `taux_horaire` extrait est inférieur au SMIC horaire applicable (voir tableau SMIC fourni), calcule le différentiel dû sur les `heures_travaillees_base` extraites. `montant_potentiel_du_salarie` = (`SMIC_horaire_applicable - taux_horaire_extrait`) * `heures_travaillees_base_extraites`.
+        3.  **AJOUTS POUR HEURES SUPPLÉMENTAIRES / PRIMES**:
+            Si des heures supplémentaires semblent non payées ou sous-payées, ajoute le montant estimé au montant calculé précédemment.
+            Si une prime ou indemnité obligatoire (ex: prime de vacances Syntec si applicable et non versée) est absente, ajoute le montant estimé.
+        
+        - Fournis une explication concise et claire pour le `montant_potentiel_du_salarie` total calculé, en indiquant la base principale du calcul (écart au contractuel ou écart au SMIC général).
+        - Si aucun montant n'est clairement dû, indique 0 ou null pour `montant_potentiel_du_salarie`.
+
+        {anomaly_detection_guidelines}
+
+        INSTRUCTIONS IMPORTANTES:
+        1. Considère toutes les images comme un seul document. Synthétise les informations.
+        2. Réponds UNIQUEMENT avec un objet JSON valide, sans texte avant ou après. Le JSON doit commencer par `{{` et finir par `}}`.
+        3. Si une information n'est pas visible ou identifiable sur l'ensemble des pages, utilise la valeur `null`.
+        4. Montants financiers: valeurs numériques (ex: 1500.50). Point comme séparateur décimal. N'inclus pas de symboles monétaires ou de séparateurs de milliers dans les valeurs numériques.
+        5. Dates: format JJ/MM/AAAA si possible. Sinon, utilise le format tel qu'il apparaît.
+        6. N'invente AUCUNE information. Base-toi strictement sur le contenu visible et le contexte fourni.
+        7. Heures supplémentaires: extraire nombre d'heures et taux de majoration si possible.
+        8. Anomalies: sois précis, justifie en te basant sur les règles fournies ou incohérences.
+        9. Pour les calculs SMIC/quotité, utilise STRICTEMENT le salaire de base brut ("salaire_de_base_brut") et jamais un net (net social, net imposable, net à payer).
+
+        FORMAT DE RÉPONSE JSON ATTENDU (NE PAS INCLURE LES COMMENTAIRES DANS LE JSON FINAL):
+        ```json
+        {{
+            "informations_generales": {{
+            "nom_salarie": string | null,
+            "poste": string | null,
+            "classification_conventionnelle": string | null,
+            "nom_entreprise": string | null,
+            "siret_entreprise": string | null,
+            "convention_collective_applicable": string | null
+            }},
+            "periode": {{
+            "periode_du": string | null,
+            "periode_au": string | null,
+            "date_paiement": string | null
+            }},
+            "remuneration": {{
+            "salaire_de_base_brut": number | null,
+            "salaire_brut_total": number | null,
+            "total_cotisations_salariales": number | null,
+            "net_imposable": number | null,
+            "net_social": number | null,
+            "impot_preleve_a_la_source": number | null,
+            "net_a_payer_avant_acomptes": number | null,
+            "net_a_payer": number | null,
+            "taux_horaire": number | null,
+            "heures_travaillees_base": number | null,
+            "heures_supplementaires_majorees": [ {{ "nombre": number, "taux_majoration_pourcent": number }} ] | null,
+            "total_heures_travaillees_mois": number | null
+            }},
+            "conges_et_absences": {{
+            "conges_payes_acquis": number | null,
+            "conges_payes_pris": number | null,
+            "solde_conges_payes": number | null,
+            "rtt_acquis": number | null,
+            "rtt_pris": number | null,
+            "solde_rtt": number | null
+            }},
+            "anomalies_potentielles_observees": [
+            {{ "type": string, "description": string, "level": "critical" | "warning" | "info" | "positive_check" }}
+            ],
+            "evaluation_financiere_salarie": {{
+            "montant_potentiel_du_salarie": number | null,
+            "explication_montant_du": string | null
+            }}
+        }}
+        ```
+        NOTE SUR LES ANOMALIES ET MONTANT DÛ (RAPPEL):
+        - **Salaire de base / Taux horaire**: Si un salaire contractuel est fourni par l'utilisateur (ex: "{contractual_salary_context}€"), l'anomalie principale doit porter sur l'écart entre le `salaire_de_base_brut` extrait et ce salaire contractuel. Prends en compte les `additional_details` (ex: temps partiel, absence longue) pour évaluer si un salaire de base inférieur au contractuel est justifié. Le calcul du montant dû doit prioriser cet écart. La comparaison du `taux_horaire` au SMIC général devient alors une vérification secondaire.
+        - **Cotisations Apprenti**: Si le statut d'apprenti est identifié (via le contexte utilisateur, les `additional_details` ou la fiche de paie) et que le `total_cotisations_salariales` est nul ou très faible, cela est généralement normal. Signale-le comme une "Observation" ou une caractéristique du statut plutôt qu'une "Anomalie" critique, sauf si d'autres éléments indiquent une erreur.
+        - Calculs (brut/net, heures*taux): signaler si écart >5% ou >10€. Si en défaveur du salarié, estime le montant.
+        - Heures supplémentaires: si des HS sont mentionnées mais non payées ou sous-payées, estime le dû.
+        - Si aucune anomalie conduisant à un montant dû, renvoyer "montant_potentiel_du_salarie": 0 (ou null) et une explication comme "Aucun montant clairement dû détecté".
+        """
+
+
+def compile_template(template: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """Découpe un gabarit str.format en (littéral, nom d'emplacement), une fois pour toutes."""
+    return tuple((literal, field_name) for literal, field_name, _, _ in string.Formatter().parse(template))
+
+
+def render_template(compiled: Tuple[Tuple[str, Optional[str]], ...], values: Dict[str, str]) -> str:
+    """Assemble un gabarit compilé avec des valeurs déjà converties en texte."""
+    parts = []
+    for literal, field_name in compiled:
+        parts.append(literal)
+        if field_name is not None:
+            parts.append(values[field_name])
+    return ''.join(parts)
+
+
+COMPILED_ANALYSIS_PROMPT = compile_template(ANALYSIS_PROMPT_TEMPLATE)
+
+
+class SmicSnippets:
+    """Extraits du tableau SMIC précalculés pour un contenu de smic.csv donné (immuable)."""
+
+    def __init__(self, smic_csv: str):
+        lines = [ln for ln in (smic_csv or '').splitlines() if ln.strip()]
+        if not lines:
+            self.default = smic_csv
+            self._by_month = {}
+            return
+        header, data = lines[0], lines[1:]
+        tail = data[-SMIC_EXCERPT_ROWS:] if len(data) > SMIC_EXCERPT_ROWS else data
+        self.default = "\n".join([header] + tail)
+
+        rows_by_month: Dict[Tuple[int, str], List[str]] = {}
+        for line in data:
+            parts = [part.strip() for part in line.split(',')]
+            try:
+                key = (int(parts[0]), parts[1].lower())
+            except (IndexError, ValueError):
+                continue
+            rows_by_month.setdefault(key, []).append(line)
+        self._by_month = {key: "\n".join([header] + rows) for key, rows in rows_by_month.items()}
+
+    def for_date(self, payment_date: Optional[date]) -> str:
+        """Extrait limité au mois de paiement s'il figure dans le tableau, sinon l'extrait par défaut."""
+        if payment_date is None:
+            return self.default
+        return self._by_month.get((payment_date.year, MONTH_NAMES[payment_date.month].lower()), self.default)
+
+
+@lru_cache(maxsize=4)
+def get_smic_snippets(smic_csv: str) -> SmicSnippets:
+    return SmicSnippets(smic_csv)
+
+
+@lru_cache(maxsize=256)
+def convention_block(convention_text: str, max_chars: int) -> str:
+    """Texte de convention tronqué pour limiter la taille du prompt."""
+    if convention_text and len(convention_text) > max_chars:
+        return convention_text[:max_chars] + "\n[...]"
+    return convention_text
+
+
+def parse_payment_date(date_str: Optional[str]) -> Optional[date]:
+    if not date_str:
+        return None
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%m/%Y'):
+        try:
+            return datetime.strptime(date_str, fmt).date().replace(day=1) if fmt == '%m/%Y' \
+                else datetime.strptime(date_str, fmt).date()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class PromptBuilder:
+    """Assemble le prompt d'analyse d'une requête à partir des morceaux précalculés."""
+
+    def __init__(self, smic_csv: Optional[str] = None):
+        self._smic_csv = smic_csv
+
+    @property
+    def smic_snippets(self) -> SmicSnippets:
+        # smic.csv courant (rechargé par le registre s'il change); extraits mis en cache par contenu
+        smic_csv = self._smic_csv if self._smic_csv is not None else (load_text_file('smic.csv') or SMIC_DATA)
+        return get_smic_snippets(smic_csv)
+
+    def build(self, additional_data: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Retourne le prompt et ses métriques d'assemblage:
+        {'assembly_ms': durée de construction, 'prompt_chars': taille du prompt}.
+        """
+        started = time.perf_counter()
+        additional_data = additional_data or {}
+
+        user_context_details = self.user_context_details(additional_data)
+        user_context_prompt = (
+            "\nCONTEXTE SUPPLÉMENTAIRE FOURNI PAR L'UTILISATEUR (À UTILISER POUR L'ANALYSE):\n" + "\n".join(user_context_details)
+            if user_context_details else "\nAucun contexte utilisateur spécifique fourni."
+        )
+        max_chars = getattr(settings, 'CONVENTION_TEXT_MAX_CHARS', 3000)
+        convention_text = additional_data.get('convention_collective_text', 'Aucune convention collective spécifiée.')
+
+        prompt = render_template(COMPILED_ANALYSIS_PROMPT, {
+            'smic_table': self.smic_snippets.for_date(parse_payment_date(additional_data.get('date_paiement'))),
+            'convention_block': convention_block(convention_text, max_chars),
+            'user_context_prompt': user_context_prompt,
+            'status_line': self.status_line(additional_data),
+            'contractual_salary_context': str(additional_data.get('contractual_salary', 'NON FOURNI')),
+            'anomaly_detection_guidelines': ANOMALY_DETECTION_GUIDELINES,
+        })
+        metrics = {
+            'assembly_ms': round((time.perf_counter() - started) * 1000, 3),
+            'prompt_chars': len(prompt),
+        }
+        return prompt, metrics
+
+    @staticmethod
+    def user_context_details(additional_data: Dict[str, Any]) -> List[str]:
+        """Construit les éléments de contexte à partir des données supplémentaires"""
+        details = []
+        if additional_data.get('contractual_salary'):
+            details.append(f"- Salaire brut mensuel contractuel indiqué: {additional_data['contractual_salary']}€")
+        if additional_data.get('additional_details'):
+            details.append(f"- Détails supplémentaires fournis par l'utilisateur: {additional_data['additional_details']}")
+        if additional_data.get('convention_collective'):
+            details.append(f"- Convention collective indiquée par l'utilisateur: {additional_data['convention_collective']}")
+        if additional_data.get('date_paiement'):
+            details.append(f"- Date de paiement indiquée (pour référence SMIC): {additional_data['date_paiement']}")
+        return details
+
+    @staticmethod
+    def status_line(additional_data: Dict[str, Any]) -> str:
+        status_line = ''
+        employment_status = additional_data.get('employment_status')
+        expected_smic_percent = additional_data.get('expected_smic_percent')
+        working_time_ratio = additional_data.get('working_time_ratio')
+        if employment_status:
+            status_line += f"- Statut/contrat déclaré: {employment_status}. "
+        if expected_smic_percent is not None:
+            status_line += f"- Pourcentage SMIC attendu: {expected_smic_percent}%. "
+        if working_time_ratio is not None and working_time_ratio != 1:
+            status_line += f"- Quotité de travail: {working_time_ratio*100:.0f}%. "
+        return status_line
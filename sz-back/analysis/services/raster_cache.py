@@ -0,0 +1,197 @@
+"""
+Cache disque des pages rasterisées (JPEG encodés), pour ne pas relancer Poppler
+sur un document déjà rendu (nouvelle tentative, ré-analyse, comparaison de modèles).
+
+Organisation: <RASTER_CACHE_DIR>/<sha[:2]>/<sha>/<rendu>/<page>.jpg, où <rendu> est
+la clé de rendu (DPI et paramètres de redimensionnement), plus un manifest.json par
+(empreinte, rendu) qui indique le nombre de pages rendues, si le document est complet
+et des métadonnées libres (dimensions des pages sources). La date de modification du manifest sert à l'éviction
+LRU: quand la taille totale dépasse RASTER_CACHE_MAX_BYTES, les rendus les moins
+récemment utilisés sont supprimés. Le cache d'un document est purgé lorsque son
+fichier est supprimé (confidentialité).
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger('salariz.gpt_vision')
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def path_sha256(path: str) -> str:
+    """SHA-256 d'un fichier sur disque (lu par blocs)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Écriture dans un fichier temporaire puis renommage: un lecteur concurrent ne voit jamais de page tronquée
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class RasterCache:
+    """Cache LRU borné en taille des pages JPEG d'un PDF, par empreinte du fichier, DPI et page."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.max_bytes > 0
+
+    def _document_dir(self, content_hash: str) -> str:
+        return os.path.join(self.directory, content_hash[:2], content_hash)
+
+    def _entry_dir(self, content_hash: str, render_key) -> str:
+        return os.path.join(self._document_dir(content_hash), str(render_key))
+
+    def _read_manifest(self, entry_dir: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(entry_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _pages_needed(manifest: dict, max_pages: Optional[int]) -> Optional[int]:
+        """Nombre de pages à relire pour cette demande, ou None si le rendu en cache ne suffit pas."""
+        page_count = manifest.get('page_count', 0)
+        if max_pages is not None and max_pages <= page_count:
+            return max_pages
+        if manifest.get('complete'):
+            return page_count
+        return None
+
+    def get(self, content_hash: str, render_key, max_pages: Optional[int] = None) -> Optional[List[bytes]]:
+        """Pages JPEG en cache pour ce document, ou None si elles n'y sont pas toutes."""
+        if not self.enabled or not content_hash:
+            return None
+        entry_dir = self._entry_dir(content_hash, render_key)
+        manifest = self._read_manifest(entry_dir)
+        if manifest is None:
+            return None
+        needed = self._pages_needed(manifest, max_pages)
+        if not needed:
+            return None
+        pages = []
+        try:
+            for index in range(needed):
+                with open(os.path.join(entry_dir, f'{index}.jpg'), 'rb') as f:
+                    pages.append(f.read())
+            # Marque le rendu comme récemment utilisé
+            os.utime(os.path.join(entry_dir, MANIFEST_NAME))
+        except OSError:
+            # Entrée évincée ou purgée pendant la lecture
+            return None
+        logger.info(f"Cache de rasterisation: {len(pages)} page(s) relue(s) pour {content_hash[:12]} (rendu {render_key})")
+        return pages
+
+    def get_metadata(self, content_hash: str, render_key) -> dict:
+        """Métadonnées enregistrées avec un rendu ({} si absent)."""
+        if not self.enabled or not content_hash:
+            return {}
+        manifest = self._read_manifest(self._entry_dir(content_hash, render_key))
+        return (manifest or {}).get('metadata') or {}
+
+    def put(self, content_hash: str, render_key, max_pages: Optional[int], pages: List[bytes],
+            metadata: Optional[dict] = None) -> None:
+        """Enregistre les pages rendues (le document est complet s'il a moins de pages que la limite)."""
+        if not self.enabled or not content_hash or not pages:
+            return
+        entry_dir = self._entry_dir(content_hash, render_key)
+        existing = self._read_manifest(entry_dir)
+        if existing and self._pages_needed(existing, max_pages) is not None:
+            # Un rendu au moins aussi complet est déjà en cache
+            return
+        try:
+            os.makedirs(entry_dir, exist_ok=True)
+            for index, data in enumerate(pages):
+                _write_atomic(os.path.join(entry_dir, f'{index}.jpg'), data)
+            manifest = {
+                'page_count': len(pages),
+                'complete': max_pages is None or len(pages) < max_pages,
+                'metadata': metadata or {},
+            }
+            _write_atomic(os.path.join(entry_dir, MANIFEST_NAME), json.dumps(manifest).encode('utf-8'))
+        except OSError as e:
+            logger.warning(f"Échec d'écriture dans le cache de rasterisation ({entry_dir}): {e}")
+            return
+        self._evict(keep=entry_dir)
+
+    def purge(self, content_hash: str) -> None:
+        """Supprime tous les rendus d'un document (toutes résolutions)."""
+        if not self.directory or not content_hash:
+            return
+        document_dir = self._document_dir(content_hash)
+        if os.path.isdir(document_dir):
+            shutil.rmtree(document_dir, ignore_errors=True)
+            logger.info(f"Cache de rasterisation purgé pour {content_hash[:12]}")
+
+    def _entries(self):
+        """(date d'utilisation, taille, répertoire) de chaque rendu en cache."""
+        entries = []
+        for root, dirs, files in os.walk(self.directory):
+            if MANIFEST_NAME not in files:
+                continue
+            dirs[:] = []
+            size = 0
+            for name in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+            try:
+                used_at = os.path.getmtime(os.path.join(root, MANIFEST_NAME))
+            except OSError:
+                used_at = time.time()
+            entries.append((used_at, size, root))
+        return entries
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if entry_dir == keep:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            logger.info(f"Cache de rasterisation: éviction de {entry_dir}")
+
+
+def get_raster_cache() -> RasterCache:
+    return RasterCache(
+        getattr(settings, 'RASTER_CACHE_DIR', ''),
+        getattr(settings, 'RASTER_CACHE_MAX_BYTES', 0),
+    )
+
+
+def purge_raster_cache(content_hash: str) -> None:
+    """Purge le cache d'un document sans jamais faire échouer l'appelant."""
+    try:
+        get_raster_cache().purge(content_hash)
+    except Exception as e:
+        logger.warning(f"Échec de la purge du cache de rasterisation pour {content_hash[:12]}: {e}")
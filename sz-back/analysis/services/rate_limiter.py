@@ -0,0 +1,162 @@
+"""
+Limiteur de débit OpenAI partagé par tout le cluster.
+
+Deux token buckets par modèle (requêtes/minute et tokens/minute) sont stockés dans
+la table RateLimitBucket. Avant chaque appel, le client débite une requête et une
+estimation des tokens d'entrée (tuiles d'images + longueur du prompt); si le budget
+manque, il attend le temps de remplissage nécessaire au lieu de provoquer un 429.
+Après la réponse, l'écart entre estimation et usage réel est régularisé.
+"""
+import logging
+import math
+import time
+from typing import List, Optional, Union
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .image_utils import encoded_image_size
+
+logger = logging.getLogger('salariz.gpt_vision')
+
+# Approximation du nombre de caractères par token pour le texte du prompt
+CHARS_PER_TOKEN = 4
+# Coût d'une image en détail "high": base + par tuile de 512 px après redimensionnement
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+IMAGE_TILE_SIZE = 512
+
+
+# Redimensionnement appliqué par l'API avant le découpage en tuiles
+IMAGE_MAX_LONG_SIDE = 2048
+IMAGE_MAX_SHORT_SIDE = 768
+
+
+def image_tiles(width: int, height: int) -> int:
+    """Tuiles facturées pour une image: ajustée dans 2048x2048, côté court ramené à 768, puis tuiles de 512."""
+    scale = min(1.0, IMAGE_MAX_LONG_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, IMAGE_MAX_SHORT_SIDE / min(width, height))
+    width, height = width * scale, height * scale
+    return math.ceil(width / IMAGE_TILE_SIZE) * math.ceil(height / IMAGE_TILE_SIZE)
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Tokens facturés pour une image en détail "high"."""
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * image_tiles(width, height)
+
+
+def estimate_input_tokens(prompt: str, images: List[Union[bytes, str]]) -> int:
+    """Estimation des tokens d'entrée d'une requête Vision (images JPEG brutes ou en base64)."""
+    tokens = math.ceil(len(prompt or '') / CHARS_PER_TOKEN)
+    for image in images:
+        try:
+            tokens += estimate_image_tokens(*encoded_image_size(image))
+        except ValueError:
+            # Dimensions inconnues: compter une page A4 à 150 dpi
+            tokens += estimate_image_tokens(1240, 1754)
+    return tokens
+
+
+class OpenAIRateLimiter:
+    """Token buckets requêtes/minute et tokens/minute partagés via la base de données."""
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None,
+                 max_wait: Optional[float] = None):
+        self.requests_per_minute = (
+            requests_per_minute if requests_per_minute is not None
+            else getattr(settings, 'OPENAI_RATE_LIMIT_RPM', 0)
+        )
+        self.tokens_per_minute = (
+            tokens_per_minute if tokens_per_minute is not None
+            else getattr(settings, 'OPENAI_RATE_LIMIT_TPM', 0)
+        )
+        self.max_wait = max_wait if max_wait is not None else getattr(settings, 'OPENAI_RATE_LIMIT_MAX_WAIT', 120.0)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.requests_per_minute or self.tokens_per_minute)
+
+    def acquire(self, model: str, estimated_tokens: int) -> float:
+        """
+        Débite une requête et `estimated_tokens` du budget de `model`, en attendant si besoin.
+        Retourne le temps d'attente (secondes). Au-delà de `max_wait`, la requête part
+        quand même: la gestion des 429 du client prend alors le relais.
+        """
+        if not self.enabled:
+            return 0.0
+        # Une requête plus grosse que le budget d'une minute ne passerait jamais
+        if self.tokens_per_minute:
+            estimated_tokens = min(estimated_tokens, self.tokens_per_minute)
+
+        waited = 0.0
+        while True:
+            delay = self._try_consume(model, estimated_tokens)
+            if delay <= 0:
+                if waited:
+                    logger.info(f"Limiteur OpenAI ({model}): requête autorisée après {waited:.2f}s d'attente")
+                return waited
+            if waited + delay > self.max_wait:
+                logger.warning(
+                    f"Limiteur OpenAI ({model}): attente maximale de {self.max_wait}s atteinte, envoi sans budget"
+                )
+                # Débiter quand même: le budget devient négatif et les autres processus patientent
+                self._try_consume(model, estimated_tokens, force=True)
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def settle(self, model: str, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Régularise le budget de tokens avec l'usage réel renvoyé par l'API."""
+        if not self.tokens_per_minute or not actual_tokens:
+            return
+        difference = actual_tokens - min(estimated_tokens, self.tokens_per_minute)
+        if not difference:
+            return
+        from analysis.models import RateLimitBucket
+        with transaction.atomic():
+            bucket = self._locked_bucket(RateLimitBucket, model)
+            # Peut devenir négatif: les requêtes suivantes attendront le remboursement
+            bucket.tokens_available = min(self.tokens_per_minute, bucket.tokens_available - difference)
+            bucket.save(update_fields=['tokens_available'])
+
+    def _try_consume(self, model: str, tokens: int, force: bool = False) -> float:
+        """Débite le budget s'il suffit (retourne 0), sinon retourne le délai de remplissage nécessaire."""
+        from analysis.models import RateLimitBucket
+        with transaction.atomic():
+            bucket = self._locked_bucket(RateLimitBucket, model)
+            now = timezone.now()
+            elapsed = max(0.0, (now - bucket.refilled_at).total_seconds())
+            bucket.refilled_at = now
+            delay = 0.0
+            if self.requests_per_minute:
+                bucket.requests_available = min(
+                    self.requests_per_minute,
+                    bucket.requests_available + elapsed * self.requests_per_minute / 60.0,
+                )
+                if bucket.requests_available < 1:
+                    delay = max(delay, (1 - bucket.requests_available) * 60.0 / self.requests_per_minute)
+            if self.tokens_per_minute:
+                bucket.tokens_available = min(
+                    self.tokens_per_minute,
+                    bucket.tokens_available + elapsed * self.tokens_per_minute / 60.0,
+                )
+                if bucket.tokens_available < tokens:
+                    delay = max(delay, (tokens - bucket.tokens_available) * 60.0 / self.tokens_per_minute)
+            if delay <= 0 or force:
+                bucket.requests_available -= 1
+                bucket.tokens_available -= tokens
+            bucket.save(update_fields=['requests_available', 'tokens_available', 'refilled_at'])
+        return delay
+
+    def _locked_bucket(self, model_class, model: str):
+        bucket, _ = model_class.objects.select_for_update().get_or_create(
+            key=model,
+            defaults={
+                'requests_available': self.requests_per_minute,
+                'tokens_available': self.tokens_per_minute,
+                'refilled_at': timezone.now(),
+            },
+        )
+        return bucket
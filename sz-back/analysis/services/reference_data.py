@@ -1,37 +1,166 @@
 """
 Données de référence pour l'analyse des fiches de paie
+
+Les fichiers du répertoire data/ sont indexés une fois par processus et gardés en
+mémoire par ReferenceDataRegistry. Un fichier n'est relu que si sa date de
+modification change; ce contrôle (un seul parcours du répertoire) est fait au plus
+toutes les REFERENCE_DATA_CHECK_INTERVAL secondes, les lectures ne touchent donc
+pas au disque.
 """
+import difflib
+import logging
 import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
 from django.conf import settings
 
+logger = logging.getLogger('salariz.analysis')
+
 # Chemin vers le répertoire des données
 DATA_DIR = os.path.join(settings.BASE_DIR, 'data')
 
+NO_CONVENTION_TEXT = "Aucune convention collective spécifique n'a été sélectionnée pour cette analyse."
+
+
+def _normalize_key(value: str) -> str:
+    return re.sub(r'[^a-z0-9]', '', value.lower())
+
+
+class ReferenceDataRegistry:
+    """Contenu des fichiers de data/ en mémoire, rechargé fichier par fichier sur changement de mtime."""
+
+    def __init__(self, data_dir: str, check_interval: Optional[float] = None):
+        self.data_dir = data_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._files: Dict[str, Tuple[float, str]] = {}
+        self._convention_files: Optional[Dict[str, str]] = None
+        self._convention_texts: Dict[str, str] = {}
+        self._checked_at: Optional[float] = None
+
+    def _interval(self) -> float:
+        if self.check_interval is not None:
+            return self.check_interval
+        return getattr(settings, 'REFERENCE_DATA_CHECK_INTERVAL', 5.0)
+
+    def _ensure_fresh(self) -> None:
+        checked_at = self._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < self._interval():
+            return
+        with self._lock:
+            if self._checked_at is not None and time.monotonic() - self._checked_at < self._interval():
+                return
+            self._refresh()
+            self._checked_at = time.monotonic()
+
+    def _refresh(self) -> None:
+        """Parcourt data/, relit les fichiers nouveaux ou modifiés et recalcule l'index des conventions."""
+        try:
+            entries = [entry for entry in os.scandir(self.data_dir) if entry.is_file()]
+        except OSError as e:
+            logger.error(f"Répertoire des données de référence illisible ({self.data_dir}): {e}")
+            return
+
+        files, changed = {}, False
+        for entry in entries:
+            mtime = entry.stat().st_mtime
+            cached = self._files.get(entry.name)
+            if cached is not None and cached[0] == mtime:
+                files[entry.name] = cached
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    files[entry.name] = (mtime, f.read())
+                changed = True
+                if cached is not None:
+                    logger.info(f"Donnée de référence rechargée: {entry.name}")
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Lecture impossible de la donnée de référence {entry.name}: {e}")
+        changed = changed or files.keys() != self._files.keys()
+
+        # Remplacement en une fois: les lecteurs voient l'ancien ou le nouvel index, jamais un mélange
+        self._files = files
+        if changed:
+            # Index des conventions recalculé à la prochaine recherche
+            self._convention_files = None
+            self._convention_texts = {}
+
+    @staticmethod
+    def _map_conventions(files: Dict[str, Tuple[float, str]]) -> Dict[str, str]:
+        """Associe chaque code de CONVENTION_CHOICES à son fichier (ex: 'AIDE_ET_SOINS_A_DOMICILE' -> 'aide-et-soins-a-domicile.txt')."""
+        from analysis.models import CONVENTION_CHOICES
+
+        by_key = {_normalize_key(name[:-4]): name for name in files if name.endswith('.txt')}
+        mapping = {}
+        for code, _ in CONVENTION_CHOICES:
+            if code == 'AUTRE':
+                continue
+            key = _normalize_key(code)
+            # Tolère les petites différences d'orthographe entre codes et noms de fichiers
+            match = key if key in by_key else next(iter(difflib.get_close_matches(key, list(by_key), n=1, cutoff=0.9)), None)
+            if match is None:
+                logger.warning(f"Aucun fichier de données pour la convention collective {code}")
+                continue
+            mapping[code] = by_key[match]
+        return mapping
+
+    def get_text(self, filename: str) -> str:
+        """Contenu d'un fichier de data/ ('' s'il n'existe pas)."""
+        self._ensure_fresh()
+        cached = self._files.get(filename)
+        return cached[1] if cached else ""
+
+    def _conventions(self) -> Dict[str, str]:
+        mapping = self._convention_files
+        if mapping is None:
+            mapping = self._convention_files = self._map_conventions(self._files)
+        return mapping
+
+    def convention_filename(self, convention_code: str) -> Optional[str]:
+        self._ensure_fresh()
+        return self._conventions().get(convention_code.upper())
+
+    def get_convention_text(self, convention_code: str) -> str:
+        """Bloc de contexte d'une convention collective, mis en forme une fois par version du fichier."""
+        self._ensure_fresh()
+        texts = self._convention_texts
+        text = texts.get(convention_code)
+        if text is None:
+            filename = self._conventions().get(convention_code.upper())
+            content = self.get_text(filename) if filename else ""
+            if not content:
+                text = f"Les données pour la convention collective '{convention_code}' n'ont pas pu être chargées. L'analyse se fera sans ce contexte."
+            else:
+                text = f"EXTRAITS PERTINENTS DE LA CONVENTION COLLECTIVE {convention_code.upper()} (À CONSIDÉRER POUR L'ANALYSE) :\n{content}"
+            texts[convention_code] = text
+        return text
+
+    def preload(self) -> None:
+        """Indexe data/ immédiatement (appelé au démarrage de l'application)."""
+        with self._lock:
+            self._refresh()
+            self._checked_at = time.monotonic()
+
+
+reference_registry = ReferenceDataRegistry(DATA_DIR)
+
+
 def load_text_file(filename):
-    """Charge le contenu d'un fichier texte depuis le répertoire data."""
-    filepath = os.path.join(DATA_DIR, filename)
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return f.read()
-    except FileNotFoundError:
-        # En cas de fichier manquant, on retourne une chaîne vide pour ne pas bloquer l'analyse.
-        return ""
+    """Contenu d'un fichier texte du répertoire data (depuis la mémoire, '' si absent)."""
+    return reference_registry.get_text(filename)
 
 def get_convention_collective_text(convention_code: str) -> str:
     """
     Récupère le texte de la convention collective basé sur son code.
-    Le code doit correspondre au nom du fichier .txt en minuscules (ex: 'SYNTEC' -> 'syntec.txt').
+    Le code est associé au fichier correspondant de data/ (ex: 'SYNTEC' -> 'syntec.txt',
+    'AIDE_ET_SOINS_A_DOMICILE' -> 'aide-et-soins-a-domicile.txt').
     """
     if not convention_code or convention_code == 'AUTRE':
-        return "Aucune convention collective spécifique n'a été sélectionnée pour cette analyse."
-    
-    filename = f"{convention_code.lower()}.txt"
-    content = load_text_file(filename)
-    
-    if not content:
-        return f"Les données pour la convention collective '{convention_code}' n'ont pas pu être chargées. L'analyse se fera sans ce contexte."
-        
-    return f"EXTRAITS PERTINENTS DE LA CONVENTION COLLECTIVE {convention_code.upper()} (À CONSIDÉRER POUR L'ANALYSE) :\n{content}"
+        return NO_CONVENTION_TEXT
+    return reference_registry.get_convention_text(convention_code)
 
 # On charge les données SMIC qui sont toujours nécessaires
 SMIC_DATA = load_text_file('smic.csv')
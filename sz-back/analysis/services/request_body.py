@@ -0,0 +1,118 @@
+"""
+Corps JSON des requêtes Vision, produit sans copie intermédiaire des images.
+
+Les pages restent en mémoire sous forme de JPEG bruts (un seul exemplaire par page).
+Les payloads (cf. BaseVisionClient._build_chat_payload) portent une EmbeddedImage à
+la place de chaque data URL: seul le squelette JSON est sérialisé, et le corps est
+ensuite lu par blocs en encodant chaque image en base64 au fil de la lecture. Sa
+taille est connue d'avance (Content-Length) et chaque tentative ou duplicata
+(hedging) relit le même RequestBody depuis le début.
+"""
+import base64
+import json
+from typing import Any, AsyncIterator, Iterator, List, Union
+
+DATA_URL_PREFIX = b'data:image/jpeg;base64,'
+# Remplace chaque image dans le squelette JSON (jamais produit par un prompt réel)
+_PLACEHOLDER = '\x00salariz-image\x00'
+_PLACEHOLDER_JSON = json.dumps(_PLACEHOLDER).encode('ascii')
+# Octets de JPEG encodés par bloc: multiple de 3, donc sans remplissage base64 intermédiaire
+CHUNK_SIZE = 48 * 1024
+
+
+class EmbeddedImage:
+    """Image d'une requête: JPEG brut (bytes) ou déjà encodé en base64 (str)."""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data: Union[bytes, str]):
+        self.data = data
+
+    def encoded_length(self) -> int:
+        if isinstance(self.data, str):
+            return len(self.data)
+        return (len(self.data) + 2) // 3 * 4
+
+    def iter_base64(self) -> Iterator[bytes]:
+        if isinstance(self.data, str):
+            for start in range(0, len(self.data), CHUNK_SIZE):
+                yield self.data[start:start + CHUNK_SIZE].encode('ascii')
+            return
+        view = memoryview(self.data)
+        for start in range(0, len(view), CHUNK_SIZE):
+            yield base64.b64encode(view[start:start + CHUNK_SIZE])
+
+
+class RequestBody:
+    """Corps JSON d'une requête, relisible, dont les images sont encodées à la lecture."""
+
+    def __init__(self, payload: Any):
+        images: List[EmbeddedImage] = []
+
+        def embed(value):
+            if isinstance(value, EmbeddedImage):
+                images.append(value)
+                return _PLACEHOLDER
+            raise TypeError(f"Objet non sérialisable en JSON: {type(value).__name__}")
+
+        skeleton = json.dumps(payload, default=embed, allow_nan=False).encode('ascii')
+        self._parts = skeleton.split(_PLACEHOLDER_JSON)
+        if len(self._parts) != len(images) + 1:
+            raise ValueError("Marqueur d'image inattendu dans le payload")
+        self._images = images
+        self.length = sum(len(part) for part in self._parts) + sum(
+            len(DATA_URL_PREFIX) + image.encoded_length() + 2 for image in images
+        )
+
+    def __len__(self) -> int:
+        return self.length
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        for index, image in enumerate(self._images):
+            yield self._parts[index] + b'"' + DATA_URL_PREFIX
+            yield from image.iter_base64()
+            yield b'"'
+        yield self._parts[-1]
+
+    async def aiter_chunks(self) -> AsyncIterator[bytes]:
+        for chunk in self.iter_chunks():
+            yield chunk
+
+    def open(self) -> 'RequestBodyReader':
+        """Lecteur (fichier) positionné au début, pour une tentative d'envoi."""
+        return RequestBodyReader(self)
+
+    def to_bytes(self) -> bytes:
+        return b''.join(self.iter_chunks())
+
+
+class RequestBodyReader:
+    """
+    Objet fichier lu par requests/urllib3 par blocs; sa longueur fixe le
+    Content-Length (pas d'envoi chunked).
+    """
+
+    def __init__(self, body: RequestBody):
+        self._length = len(body)
+        self._chunks = body.iter_chunks()
+        self._pending = b''
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            data = self._pending + b''.join(self._chunks)
+            self._pending = b''
+            return data
+        while len(self._pending) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._pending += chunk
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+
+def request_body(payload: Any) -> RequestBody:
+    return payload if isinstance(payload, RequestBody) else RequestBody(payload)
@@ -0,0 +1,71 @@
+"""
+ETags et cache des réponses des endpoints de résultats d'analyse.
+
+L'ETag d'un résultat dérive de la version de la ligne PayslipAnalysis et des champs
+de la fiche affichés dans la réponse: il se calcule sans charger le JSON d'analyse,
+et un client qui le renvoie dans If-None-Match reçoit un 304. Les corps rendus sont
+mis en cache sous une clé qui contient l'ETag (une nouvelle version n'est jamais
+servie depuis une ancienne entrée) et supprimés à l'enregistrement de l'analyse.
+"""
+import hashlib
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+
+
+def analysis_result_etag(analysis_id: int, version: int, status: str, filename: Optional[str], file_deleted: bool) -> str:
+    """ETag fort d'une réponse FullAnalysisResultView."""
+    digest = hashlib.sha256(f"{analysis_id}:{version}:{status}:{filename}:{file_deleted}".encode('utf-8')).hexdigest()
+    return quote_etag(digest[:32])
+
+
+def content_etag(body: bytes) -> str:
+    """ETag fort dérivé du contenu d'une réponse."""
+    return quote_etag(hashlib.sha256(body).hexdigest()[:32])
+
+
+def etag_matches(request, etag: str) -> bool:
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags
+
+
+def not_modified(etag: str, cache_control: str) -> HttpResponseNotModified:
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def json_response(body: bytes, etag: str, cache_control: str) -> HttpResponse:
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def _cache_key(analysis_id: int) -> str:
+    return f"analysis-result:{analysis_id}"
+
+
+def get_cached_result(analysis_id: int, etag: str) -> Optional[bytes]:
+    """Corps rendu en cache pour cette version du résultat, sinon None."""
+    cached = cache.get(_cache_key(analysis_id))
+    if cached and cached[0] == etag:
+        return cached[1]
+    return None
+
+
+def set_cached_result(analysis_id: int, etag: str, body: bytes) -> None:
+    timeout = getattr(settings, 'ANALYSIS_RESULT_CACHE_TIMEOUT', 300)
+    if timeout:
+        cache.set(_cache_key(analysis_id), (etag, body), timeout)
+
+
+def invalidate_cached_result(analysis_id: int) -> None:
+    cache.delete(_cache_key(analysis_id))
@@ -0,0 +1,129 @@
+"""
+Ordonnancement équitable des tâches d'analyse en file.
+
+- Priorité: les analyses unitaires (sans groupe) passent avant les éléments des
+  analyses groupées (`BulkAnalysisGroup`).
+- Vieillissement: un élément groupé en attente depuis plus de
+  ANALYSIS_SCHEDULER_AGING_SECONDS est promu au niveau prioritaire, rien n'attend indéfiniment.
+- Équité: au sein d'un niveau, les utilisateurs sont servis à tour de rôle
+  (deficit round robin, une tâche par quantum), si bien qu'un utilisateur avec
+  des milliers d'éléments groupés n'obtient qu'une part parmi les autres.
+"""
+import logging
+import threading
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Q, QuerySet
+from django.utils import timezone
+
+logger = logging.getLogger('salariz.analysis')
+
+
+class FairScheduler:
+    """
+    Choisit l'utilisateur et le niveau de priorité de la prochaine tâche à réclamer.
+    L'état du tourniquet est propre au processus worker.
+    """
+
+    def __init__(self, aging_seconds: Optional[float] = None, user_weights: Optional[Dict[int, float]] = None):
+        self.aging_seconds = aging_seconds if aging_seconds is not None else getattr(
+            settings, 'ANALYSIS_SCHEDULER_AGING_SECONDS', 300
+        )
+        # Quantum par utilisateur (1 par défaut): un poids de 2 donne deux tâches par tour
+        self.user_weights = user_weights or {}
+        self._deficits: Dict[int, float] = {}
+        self._current: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def priority_filter(self) -> Q:
+        """Tâches du niveau prioritaire: analyses unitaires et éléments groupés ayant vieilli."""
+        cutoff = timezone.now() - timedelta(seconds=self.aging_seconds)
+        return Q(group__isnull=True) | Q(created_at__lte=cutoff)
+
+    def plan(self, candidates: QuerySet) -> List[Tuple[int, Q]]:
+        """
+        Ordre dans lequel tenter de réclamer une tâche parmi `candidates` (tâches en file):
+        liste de (utilisateur, filtre) à essayer, du plus prioritaire au moins prioritaire.
+        """
+        priority = self.priority_filter()
+        rows = (
+            candidates
+            .order_by()
+            .values('payslip__user_id')
+            .annotate(priority_jobs=Count('id', filter=priority))
+        )
+        priority_users = sorted(row['payslip__user_id'] for row in rows if row['priority_jobs'])
+        all_users = sorted(row['payslip__user_id'] for row in rows)
+        if not all_users:
+            return []
+
+        if priority_users:
+            level_users, level_filter = priority_users, priority
+        else:
+            level_users, level_filter = all_users, Q()
+        plan = [(user_id, level_filter) for user_id in self._round_robin(level_users)]
+        logger.debug(
+            f"Ordonnancement: utilisateur {plan[0][0]} servi "
+            f"({'prioritaire' if priority_users else 'analyses groupées'}, {len(level_users)} utilisateur(s) en attente)"
+        )
+        # Si toutes les tâches du niveau sont verrouillées par d'autres workers, se rabattre sur le reste
+        if priority_users:
+            plan += [(user_id, ~priority) for user_id in all_users]
+        return plan
+
+    def _round_robin(self, users: List[int]) -> List[int]:
+        """
+        Deficit round robin à coût unitaire: l'utilisateur courant garde la main tant
+        que son crédit couvre une tâche, puis le tour passe au suivant.
+        Retourne les utilisateurs dans l'ordre où les servir. Le crédit n'est débité
+        qu'une fois la tâche réclamée (charge): un utilisateur dont toutes les tâches
+        sont verrouillées par d'autres workers garde son tour.
+        """
+        with self._lock:
+            active = set(users)
+            # Un utilisateur sans tâche en file perd son crédit accumulé
+            for user_id in list(self._deficits):
+                if user_id not in active:
+                    del self._deficits[user_id]
+
+            if self._current in active and self._deficits.get(self._current, 0) >= 1:
+                chosen = self._current
+            else:
+                start = 0
+                if self._current is not None:
+                    start = next((i for i, u in enumerate(users) if u > self._current), 0)
+                chosen = None
+                # Chaque passage crédite le quantum de l'utilisateur visité, sauf s'il a déjà de quoi
+                # payer une tâche (au plus un tour complet si tous les poids sont >= 1, davantage
+                # pour des poids fractionnaires)
+                while chosen is None:
+                    for user_id in users[start:] + users[:start]:
+                        if self._deficits.get(user_id, 0) < 1:
+                            self._deficits[user_id] = self._deficits.get(user_id, 0) + max(self.user_weights.get(user_id, 1), 0.01)
+                        if self._deficits[user_id] >= 1:
+                            chosen = user_id
+                            break
+
+        index = users.index(chosen)
+        return users[index:] + users[:index]
+
+    def charge(self, user_id: int) -> None:
+        """Débite une tâche du crédit de l'utilisateur dont une tâche vient d'être réclamée."""
+        with self._lock:
+            self._deficits[user_id] = self._deficits.get(user_id, 0) - 1
+            self._current = user_id
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_default_scheduler() -> FairScheduler:
+    global _default_scheduler
+    if _default_scheduler is None:
+        with _default_scheduler_lock:
+            if _default_scheduler is None:
+                _default_scheduler = FairScheduler()
+    return _default_scheduler
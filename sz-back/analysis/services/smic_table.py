@@ -0,0 +1,108 @@
+"""
+Table SMIC partagée par tout le processus.
+
+Le CSV (data/smic.csv) et les montants mensuels officiels sont fusionnés une seule
+fois dans une table dense indexée par ordinal de mois (année * 12 + mois - 1): un
+mois absent du CSV reprend la dernière valeur connue (recherche par bisect lors de
+la construction). Une recherche par date est ensuite un simple accès par index.
+La table est reconstruite lorsque le contenu de smic.csv change (rechargé par le
+registre des données de référence).
+"""
+import bisect
+import csv
+import datetime
+import logging
+import threading
+from io import StringIO
+from typing import Dict, List, Optional, Tuple
+
+from .reference_data import SMIC_DATA, load_text_file
+
+logger = logging.getLogger('salariz.analysis')
+
+MONTH_NUMBERS = {
+    'janvier': 1, 'février': 2, 'mars': 3, 'avril': 4, 'mai': 5, 'juin': 6,
+    'juillet': 7, 'août': 8, 'septembre': 9, 'octobre': 10, 'novembre': 11, 'décembre': 12
+}
+
+# Overrides officiels des montants mensuels (pour coller aux valeurs de référence)
+MONTHLY_SMIC_OVERRIDES = {
+    (2022, 10): 1678.95, (2022, 11): 1678.95, (2022, 12): 1678.95,
+    (2023, 1): 1709.28, (2023, 2): 1709.28, (2023, 3): 1709.28, (2023, 4): 1709.28,
+    (2023, 5): 1747.20, (2023, 6): 1747.20, (2023, 7): 1747.20, (2023, 8): 1747.20,
+    (2023, 9): 1747.20, (2023, 10): 1747.20, (2023, 11): 1747.20, (2023, 12): 1747.20,
+    (2024, 1): 1766.92, (2024, 2): 1766.92, (2024, 3): 1766.92, (2024, 4): 1766.92,
+    (2024, 5): 1766.92, (2024, 6): 1766.92, (2024, 7): 1766.92, (2024, 8): 1766.92,
+    (2024, 9): 1766.92, (2024, 10): 1766.92, (2024, 11): 1766.92, (2024, 12): 1766.92,
+}
+
+
+def month_ordinal(year: int, month: int) -> int:
+    return year * 12 + month - 1
+
+
+def _parse_amount(value) -> Optional[float]:
+    if value in (None, ''):
+        return None
+    return float(str(value).replace(',', '.'))
+
+
+class SmicTable:
+    """Valeurs SMIC (horaire brut, mensuel) par mois, avec report du dernier mois connu."""
+
+    def __init__(self, smic_csv: str, monthly_overrides: Optional[Dict[Tuple[int, int], float]] = None):
+        known: Dict[int, Dict[str, Optional[float]]] = {}
+        for row in csv.DictReader(StringIO(smic_csv or '')):
+            try:
+                year = int(row.get('Année'))
+                month = MONTH_NUMBERS[(row.get('Mois') or '').strip().lower()]
+                known[month_ordinal(year, month)] = {
+                    'hourly': _parse_amount(row.get('SMIC_horaire_brut')),
+                    'monthly': _parse_amount(row.get('SMIC_mensuel')),
+                }
+            except (KeyError, TypeError, ValueError):
+                continue
+        for (year, month), monthly in (MONTHLY_SMIC_OVERRIDES if monthly_overrides is None else monthly_overrides).items():
+            known.setdefault(month_ordinal(year, month), {'hourly': None, 'monthly': None})['monthly'] = monthly
+
+        self._first: Optional[int] = None
+        self._values: List[Dict[str, Optional[float]]] = []
+        if not known:
+            return
+        self._first = min(known)
+        last = max(known)
+        # Un mois absent reprend l'entrée complète du dernier mois connu: un montant mensuel
+        # n'est jamais associé à un taux horaire plus récent
+        known_ordinals = sorted(known)
+        for ordinal in range(self._first, last + 1):
+            index = bisect.bisect_right(known_ordinals, ordinal) - 1
+            self._values.append(known[known_ordinals[index]])
+
+    def lookup(self, date_obj: datetime.date) -> Optional[Dict[str, Optional[float]]]:
+        """Valeurs SMIC applicables au mois de `date_obj` (dernière valeur connue au-delà du tableau)."""
+        if self._first is None:
+            return None
+        index = month_ordinal(date_obj.year, date_obj.month) - self._first
+        if index < 0:
+            return None
+        return dict(self._values[min(index, len(self._values) - 1)])
+
+
+_lock = threading.Lock()
+_cached: Tuple[Optional[str], Optional[SmicTable]] = (None, None)
+
+
+def get_smic_table() -> SmicTable:
+    """Table SMIC courante, reconstruite seulement si smic.csv a changé."""
+    global _cached
+    csv_text = load_text_file('smic.csv') or SMIC_DATA
+    cached_text, table = _cached
+    if table is not None and (cached_text is csv_text or cached_text == csv_text):
+        return table
+    with _lock:
+        cached_text, table = _cached
+        if table is None or cached_text != csv_text:
+            table = SmicTable(csv_text)
+            _cached = (csv_text, table)
+            logger.info("Table SMIC (re)construite depuis smic.csv")
+    return table
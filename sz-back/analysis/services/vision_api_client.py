@@ -3,55 +3,133 @@ Client pour l'API Vision d'OpenAI
 """
 import json
 import logging
+import os
+import random
+import re
+import threading
+import time
 import traceback
 import requests
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
+
+from requests.adapters import HTTPAdapter
 
 from .reference_data import MODEL_PRICING
+from .request_body import EmbeddedImage, RequestBody, request_body
 
 logger = logging.getLogger('salariz.gpt_vision')
 
-class OpenAIVisionClient:
-    """Client pour communiquer avec l'API Vision d'OpenAI"""
+OPENAI_CHAT_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
+OPENAI_RESPONSES_URL = "https://api.openai.com/v1/responses"
+
+# Statuts HTTP transitoires pour lesquels une nouvelle tentative a un sens
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Codes d'erreur OpenAI définitifs malgré un statut 429
+NON_RETRYABLE_ERROR_CODES = {'insufficient_quota'}
+# Temps minimal qu'une nouvelle tentative doit pouvoir disposer avant l'échéance de l'appel
+MIN_ATTEMPT_SECONDS = 5.0
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+# Sections de premier niveau du JSON attendu (ordre du prompt) et message de progression associé.
+# Une section est considérée extraite dès que la clé suivante apparaît dans le flux.
+STREAM_PROGRESS_SECTIONS = [
+    ('informations_generales', "Informations générales extraites"),
+    ('periode', "Période extraite"),
+    ('remuneration', "Section rémunération extraite"),
+    ('conges_et_absences', "Congés et absences extraits"),
+    ('anomalies_potentielles_observees', "Anomalies détectées"),
+    ('evaluation_financiere_salarie', "Évaluation financière extraite"),
+]
+
+# Page envoyée: JPEG brut ou image déjà encodée en base64
+ImageData = Union[bytes, str]
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_hedge_executor = None
+_hedge_executor_pid = None
+
+
+def _get_setting(name: str, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def get_http_session() -> requests.Session:
+    """
+    Session HTTP partagée par le processus (connexions keep-alive réutilisées).
+    Recréée après un fork pour ne pas partager de sockets entre workers gunicorn.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                pool_size = _get_setting('OPENAI_HTTP_POOL_SIZE', 16)
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session, _session_pid = session, pid
+    return _session
+
+
+def get_hedge_executor() -> ThreadPoolExecutor:
+    """Pool de threads du processus pour les requêtes dupliquées (hedging)."""
+    global _hedge_executor, _hedge_executor_pid
+    pid = os.getpid()
+    if _hedge_executor is None or _hedge_executor_pid != pid:
+        with _session_lock:
+            if _hedge_executor is None or _hedge_executor_pid != pid:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=_get_setting('OPENAI_HTTP_POOL_SIZE', 16), thread_name_prefix='openai-hedge'
+                )
+                _hedge_executor_pid = pid
+    return _hedge_executor
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Convertit une durée OpenAI ('1s', '6m0s', '20ms') ou un nombre de secondes en secondes."""
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class BaseVisionClient:
+    """
+    Construction des requêtes et interprétation des réponses de l'API Vision,
+    partagées par le client synchrone et le client asyncio.
+    """
 
     def __init__(self, api_key: str):
         self.api_key = api_key
-        
-    def call_vision_api(self, 
-                        prompt: str, 
-                        base64_images: List[str], 
-                        model: str = None,
-                        temperature: float = None, 
-                        max_tokens: int = None,
-                        timeout: int = 180) -> Dict[str, Any]:
-        """
-        Appelle l'API Vision d'OpenAI pour analyser des images.
-        
-        Args:
-            prompt: Le texte du prompt d'instruction
-            base64_images: Liste d'images encodées en base64
-            model: Le modèle OpenAI à utiliser
-            temperature: Température pour la génération (0.0-1.0)
-            max_tokens: Nombre max de tokens pour la réponse
-            timeout: Délai d'attente en secondes
-            
-        Returns:
-            Dict contenant la réponse analysée, les données brutes et les métriques d'usage
-            
-        Raises:
-            requests.exceptions.RequestException: Pour les erreurs de communication API
-            json.JSONDecodeError: Si la réponse n'est pas au format JSON
-            Exception: Pour les autres erreurs
-        """
-        # Préparation du contenu de la requête
-        content_list = [{"type": "text", "text": prompt}]
-        for b64_img in base64_images:
-            content_list.append({
-                "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{b64_img}", "detail": "high"}
-            })
+        self._rate_limiter = None
+        self._circuit_breaker = None
 
-        # Valeurs par défaut depuis les settings (permet override par argument)
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
+    def _resolve_options(self, model: Optional[str], temperature: Optional[float], max_tokens: Optional[int]) -> Tuple[str, float, int]:
+        """Applique les valeurs par défaut des settings (permet override par argument)."""
         try:
             from django.conf import settings
             default_model = getattr(settings, 'OPENAI_VISION_MODEL', 'gpt-5-mini')
@@ -63,15 +141,177 @@ class OpenAIVisionClient:
         model = model or default_model
         temperature = default_temperature if temperature is None else temperature
         max_tokens = default_max_tokens if max_tokens is None else max_tokens
+        return model, temperature, max_tokens
+
+    def _max_retries(self) -> int:
+        return _get_setting('OPENAI_MAX_RETRIES', 4)
+
+    def _should_retry(self, status_code: int, error_body: Optional[Dict[str, Any]] = None) -> bool:
+        """Indique si une réponse HTTP en erreur mérite une nouvelle tentative."""
+        if status_code not in RETRYABLE_STATUS_CODES:
+            return False
+        error = (error_body or {}).get('error') if isinstance(error_body, dict) else None
+        if isinstance(error, dict) and error.get('code') in NON_RETRYABLE_ERROR_CODES:
+            return False
+        return True
+
+    def _attempt_timeout(self, timeout, deadline: float):
+        """Délai d'une tentative borné par le temps restant avant `deadline` (None si épuisé)."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        if isinstance(timeout, tuple):
+            return tuple(min(part, remaining) for part in timeout)
+        return min(timeout, remaining)
+
+    def _retry_fits(self, delay: float, deadline: float) -> bool:
+        """Une nouvelle tentative après `delay` secondes a-t-elle encore le temps d'aboutir ?"""
+        return time.monotonic() + delay + MIN_ATTEMPT_SECONDS <= deadline
+
+    def _retry_delay(self, attempt: int, headers=None) -> float:
+        """
+        Délai avant la tentative suivante: Retry-After et en-têtes de rate limit
+        s'ils sont présents, sinon backoff exponentiel avec jitter complet.
+        """
+        base_delay = _get_setting('OPENAI_RETRY_BASE_DELAY', 1.0)
+        max_delay = _get_setting('OPENAI_RETRY_MAX_DELAY', 30.0)
+        headers = headers or {}
+
+        server_delay = None
+        retry_after_ms = headers.get('retry-after-ms')
+        if retry_after_ms:
+            try:
+                server_delay = float(retry_after_ms) / 1000.0
+            except ValueError:
+                server_delay = None
+        retry_after = headers.get('retry-after')
+        if server_delay is None and retry_after:
+            server_delay = parse_duration(retry_after)
+            if server_delay is None:
+                try:
+                    server_delay = max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    server_delay = None
+        if server_delay is None:
+            # Attendre la remise à zéro de la limite épuisée (requêtes ou tokens)
+            resets = []
+            for kind in ('requests', 'tokens'):
+                remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+                reset = parse_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+                if reset is not None and remaining is not None and str(remaining).strip() == '0':
+                    resets.append(reset)
+            if resets:
+                server_delay = max(resets)
+
+        if server_delay is not None:
+            # Petit jitter pour éviter que tous les workers repartent au même instant
+            return min(max_delay, server_delay + random.uniform(0, base_delay / 2))
+        return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+    def _attach_retry_stats(self, result: Dict[str, Any], retry_stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Ajoute le nombre de tentatives et le temps d'attente cumulé aux métriques d'usage."""
+        usage = result.get('usage')
+        if not isinstance(usage, dict):
+            usage = {}
+            result['usage'] = usage
+        usage.update(retry_stats)
+        return result
+
+    def _get_rate_limiter(self):
+        """Limiteur de débit partagé (None hors Django ou si aucune limite n'est configurée)."""
+        if self._rate_limiter is None:
+            try:
+                from .rate_limiter import OpenAIRateLimiter
+                self._rate_limiter = OpenAIRateLimiter()
+            except Exception as e:
+                logger.warning(f"Limiteur de débit OpenAI indisponible: {e}")
+                self._rate_limiter = False
+        return self._rate_limiter if self._rate_limiter and self._rate_limiter.enabled else None
+
+    def _get_circuit_breaker(self):
+        """Disjoncteur partagé (None hors Django ou si OPENAI_BREAKER_ENABLED est faux)."""
+        if self._circuit_breaker is None:
+            self._circuit_breaker = False
+            if _get_setting('OPENAI_BREAKER_ENABLED', False):
+                try:
+                    from .circuit_breaker import VisionCircuitBreaker
+                    self._circuit_breaker = VisionCircuitBreaker()
+                except Exception as e:
+                    logger.warning(f"Disjoncteur de l'API Vision indisponible: {e}")
+        return self._circuit_breaker or None
+
+    def _record_call_outcome(self, started: float, exc: Optional[Exception] = None) -> None:
+        """
+        Informe le disjoncteur de l'issue d'un appel. Une erreur de requête (4xx) prouve
+        que le service répond: elle compte comme un succès, ce qui libère aussi la
+        requête de test d'un disjoncteur semi-ouvert.
+        """
+        breaker = self._get_circuit_breaker()
+        if breaker is None:
+            return
+        from .circuit_breaker import is_service_failure
+        try:
+            if exc is None:
+                breaker.record_success(time.monotonic() - started)
+            elif is_service_failure(exc):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+        except Exception as e:
+            logger.warning(f"Mise à jour du disjoncteur impossible: {e}")
+
+    def _acquire_rate_limit(self, prompt: str, images: List[ImageData], model: str) -> Tuple[int, float]:
+        """Réserve le budget de la requête; retourne (tokens estimés, secondes d'attente)."""
+        limiter = self._get_rate_limiter()
+        if limiter is None:
+            return 0, 0.0
+        from .rate_limiter import estimate_input_tokens
+        estimated_tokens = estimate_input_tokens(prompt, images)
+        return estimated_tokens, limiter.acquire(model, estimated_tokens)
+
+    def _settle_rate_limit(self, result: Dict[str, Any], model: str, estimated_tokens: int, waited: float) -> Dict[str, Any]:
+        """Régularise le budget avec l'usage réel et note l'attente imposée par le limiteur."""
+        limiter = self._get_rate_limiter()
+        if limiter is None:
+            return result
+        usage = result.get('usage') if isinstance(result.get('usage'), dict) else {}
+        actual_tokens = (
+            usage.get('input_tokens', usage.get('prompt_tokens', 0))
+            + usage.get('output_tokens', usage.get('completion_tokens', 0))
+        )
+        try:
+            limiter.settle(model, estimated_tokens, actual_tokens)
+        except Exception as e:
+            logger.warning(f"Régularisation du limiteur OpenAI impossible: {e}")
+        if waited:
+            usage['rate_limit_wait_seconds'] = round(waited, 3)
+            result['usage'] = usage
+        return result
+
+    def _uses_responses_api(self, model: str) -> bool:
+        # GPT-5 utilise l'API responses, GPT-4 utilise chat/completions
+        return model.startswith('gpt-5')
+
+    def _build_chat_payload(self, prompt: str, images: List[ImageData], model: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
+        """
+        Construit la requête chat/completions (support GPT-4 et GPT-5).
+        Les images (JPEG bruts ou base64) ne sont encodées en data URL qu'à l'envoi (RequestBody).
+        """
+        # Préparation du contenu de la requête
+        content_list = [{"type": "text", "text": prompt}]
+        for image in images:
+            content_list.append({
+                "type": "image_url",
+                "image_url": {"url": EmbeddedImage(image), "detail": "high"}
+            })
 
-        # Configuration de la requête (support GPT-4 et GPT-5)
         payload = {
             "model": model,
             "messages": [{"role": "user", "content": content_list}],
             "response_format": {"type": "json_object"},
             "temperature": temperature
         }
-        
+
         # GPT-5 utilise 'max_completion_tokens', GPT-4 utilise 'max_tokens'
         if model.startswith('gpt-5'):
             payload["max_completion_tokens"] = max_tokens
@@ -81,135 +321,33 @@ class OpenAIVisionClient:
                 payload.pop("temperature", None)
         else:
             payload["max_tokens"] = max_tokens
-        
-        # DEBUG: Log de la configuration de la requête
-        logger.info(f"Configuration requête API:")
-        logger.info(f"  Modèle: {model}")
-        logger.info(f"  Max tokens: {max_tokens}")
-        logger.info(f"  Temperature: {temperature}")
-        logger.info(f"  Nombre d'images: {len(base64_images)}")
-        logger.info(f"  Taille du prompt: {len(prompt)} caractères")
-
-        try:
-            logger.info(f"Envoi de la requête à l'API OpenAI (modèle: {model})...")
-            
-            # GPT-5 utilise l'API responses, GPT-4 utilise chat/completions
-            if model.startswith('gpt-5'):
-                return self._call_responses_api(prompt, base64_images, model, max_tokens, timeout)
-            else:
-                response = requests.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {self.api_key}"
-                    },
-                    json=payload,
-                    timeout=timeout
-                )
-            
-            # Gestion des erreurs HTTP
-            response.raise_for_status()
-            logger.info(f"Réponse reçue de l'API OpenAI (status {response.status_code}).")
-            result = response.json()
-
-            # Vérification de la structure de la réponse
-            if not (result.get("choices") and
-                   isinstance(result["choices"], list) and
-                   len(result["choices"]) > 0 and
-                   result["choices"][0].get("message") and
-                   result["choices"][0]["message"].get("content")):
-                logger.error(f"Réponse inattendue ou malformée de l'API OpenAI: {result}")
-                return {
-                    "error": "Réponse API OpenAI malformée", 
-                    "details": result
-                }
-
-            # Extraction du contenu et calcul du coût
-            content_str = result["choices"][0]["message"]["content"].strip()
-            usage = result.get("usage", {})
-            prompt_tokens = usage.get("prompt_tokens", 0)
-            completion_tokens = usage.get("completion_tokens", 0)
-            
-            # Calcul du coût estimé
-            estimated_cost = self._calculate_cost(model, prompt_tokens, completion_tokens)
+        return payload
 
-            # Tentative de parser la réponse JSON
-            try:
-                json_result = json.loads(content_str)
-                logger.info("Analyse JSON extraite avec succès.")
-                
-                # DEBUG: Log détaillé de ce que retourne GPT
-                logger.info(f"=== DEBUG REPONSE GPT BRUTE ===")
-                logger.info(f"Réponse JSON parsée: {json.dumps(json_result, indent=2, ensure_ascii=False)}")
-                anomalies = json_result.get('anomalies_potentielles_observees', [])
-                logger.info(f"Anomalies détectées par GPT: {len(anomalies)}")
-                for i, anomalie in enumerate(anomalies):
-                    logger.info(f"  Anomalie GPT {i+1}: {anomalie}")
-                logger.info(f"Note conformité GPT: {json_result.get('note_conformite_legale', 'ABSENTE')}")
-                logger.info(f"Note globale GPT: {json_result.get('note_globale', 'ABSENTE')}")
-                logger.info(f"=== FIN DEBUG GPT ===")
-                
-                return {
-                    "gpt_analysis": json_result,  # JSON parsé
-                    "raw": content_str,          # Contenu brut
-                    "usage": usage,              # Métriques d'utilisation
-                    "estimated_cost": estimated_cost  # Coût estimé
-                }
-            except json.JSONDecodeError as json_err:
-                logger.error(f"Réponse non JSON malgré la demande: {content_str[:200]}... Erreur: {json_err}")
-                return {
-                    "error": "Réponse GPT non au format JSON valide",
-                    "raw_analysis": content_str,
-                    "details": str(json_err),
-                    "usage": usage,
-                    "estimated_cost": estimated_cost
-                }
-
-        except requests.exceptions.Timeout:
-            logger.error("Timeout lors de l'appel à l'API OpenAI.")
-            raise
-        except requests.exceptions.RequestException as req_err:
-            logger.error(f"Erreur de requête vers l'API OpenAI: {req_err}", exc_info=True)
-            error_details = str(req_err)
-            if req_err.response is not None:
-                try:
-                    error_details = req_err.response.json()
-                    logger.error(f"Détails de l'erreur API: {json.dumps(error_details, indent=2)}")
-                except json.JSONDecodeError:
-                    error_details = req_err.response.text
-                    logger.error(f"Réponse d'erreur brute: {error_details}")
-            raise
-        except Exception as e:
-            logger.error(f"Erreur inattendue: {str(e)}", exc_info=True)
-            raise
-
-    def _call_responses_api(self, prompt: str, base64_images: List[str], model: str, max_tokens: int, timeout: int) -> Dict[str, Any]:
-        """
-        Appelle l'API Responses d'OpenAI pour GPT-5 avec support des images.
-        """
+    def _build_responses_payload(self, prompt: str, images: List[ImageData], model: str, max_tokens: int) -> Dict[str, Any]:
+        """Construit la requête pour l'API Responses (GPT-5) avec les images."""
         # Construction du contenu avec images pour l'API responses
         content_list = []
-        
+
         # Ajouter le texte en premier
         content_list.append({
             "type": "message",
             "role": "user",
             "content": [{"type": "input_text", "text": prompt}]
         })
-        
+
         # Ajouter les images
-        for b64_img in base64_images:
+        for image in images:
             content_list.append({
                 "type": "message",
                 "role": "user",
                 "content": [{
                     "type": "input_image",
-                    "image_url": f"data:image/jpeg;base64,{b64_img}"
+                    "image_url": EmbeddedImage(image)
                 }]
             })
-        
+
         # Format pour l'API responses
-        payload = {
+        return {
             "model": model,
             "input": content_list,  # 'input' au lieu de 'messages'
             "max_output_tokens": max_tokens,  # API Responses utilise max_output_tokens
@@ -220,24 +358,73 @@ class OpenAIVisionClient:
             },
             "store": False
         }
-        
-        logger.info(f"Utilisation de l'API Responses pour GPT-5")
-        
-        response = requests.post(
-            "https://api.openai.com/v1/responses",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            },
-            json=payload,
-            timeout=timeout
-        )
-        
-        response.raise_for_status()
-        logger.info(f"Réponse reçue de l'API Responses (status {response.status_code}).")
-        result = response.json()
-        
-        # Adapter la réponse au format attendu (supporte différents formats de Responses)
+
+    def _log_request_configuration(self, prompt: str, images: List[ImageData], model: str, temperature: float, max_tokens: int) -> None:
+        # DEBUG: Log de la configuration de la requête
+        logger.info(f"Configuration requête API:")
+        logger.info(f"  Modèle: {model}")
+        logger.info(f"  Max tokens: {max_tokens}")
+        logger.info(f"  Temperature: {temperature}")
+        logger.info(f"  Nombre d'images: {len(images)}")
+        logger.info(f"  Taille du prompt: {len(prompt)} caractères")
+
+    def _parse_chat_result(self, result: Dict[str, Any], model: str) -> Dict[str, Any]:
+        """Interprète une réponse chat/completions et calcule le coût."""
+        # Vérification de la structure de la réponse
+        if not (result.get("choices") and
+               isinstance(result["choices"], list) and
+               len(result["choices"]) > 0 and
+               result["choices"][0].get("message") and
+               result["choices"][0]["message"].get("content")):
+            logger.error(f"Réponse inattendue ou malformée de l'API OpenAI: {result}")
+            return {
+                "error": "Réponse API OpenAI malformée",
+                "details": result
+            }
+
+        # Extraction du contenu et calcul du coût
+        content_str = result["choices"][0]["message"]["content"].strip()
+        usage = result.get("usage", {})
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+
+        # Calcul du coût estimé
+        estimated_cost = self._calculate_cost(model, prompt_tokens, completion_tokens)
+
+        # Tentative de parser la réponse JSON
+        try:
+            json_result = json.loads(content_str)
+            logger.info("Analyse JSON extraite avec succès.")
+
+            # DEBUG: Log détaillé de ce que retourne GPT
+            logger.info(f"=== DEBUG REPONSE GPT BRUTE ===")
+            logger.info(f"Réponse JSON parsée: {json.dumps(json_result, indent=2, ensure_ascii=False)}")
+            anomalies = json_result.get('anomalies_potentielles_observees', [])
+            logger.info(f"Anomalies détectées par GPT: {len(anomalies)}")
+            for i, anomalie in enumerate(anomalies):
+                logger.info(f"  Anomalie GPT {i+1}: {anomalie}")
+            logger.info(f"Note conformité GPT: {json_result.get('note_conformite_legale', 'ABSENTE')}")
+            logger.info(f"Note globale GPT: {json_result.get('note_globale', 'ABSENTE')}")
+            logger.info(f"=== FIN DEBUG GPT ===")
+
+            return {
+                "gpt_analysis": json_result,  # JSON parsé
+                "raw": content_str,          # Contenu brut
+                "usage": usage,              # Métriques d'utilisation
+                "estimated_cost": estimated_cost  # Coût estimé
+            }
+        except json.JSONDecodeError as json_err:
+            logger.error(f"Réponse non JSON malgré la demande: {content_str[:200]}... Erreur: {json_err}")
+            return {
+                "error": "Réponse GPT non au format JSON valide",
+                "raw_analysis": content_str,
+                "details": str(json_err),
+                "usage": usage,
+                "estimated_cost": estimated_cost
+            }
+
+    def _parse_responses_result(self, result: Dict[str, Any], model: str) -> Dict[str, Any]:
+        """Interprète une réponse de l'API Responses (supporte différents formats)."""
         content_str = None
         usage = result.get("usage", {})
         # Nouveau format: tableau 'output' avec un bloc 'message' contenant 'output_text'
@@ -283,7 +470,6 @@ class OpenAIVisionClient:
                 }
             except json.JSONDecodeError as json_err:
                 logger.error(f"Réponse GPT-5 non JSON: {content_str[:200]}... Erreur: {json_err}")
-                estimated_cost = self._calculate_cost(model, prompt_tokens, completion_tokens)
                 return {
                     "error": "Réponse GPT-5 non au format JSON valide",
                     "raw_analysis": content_str,
@@ -310,4 +496,323 @@ class OpenAIVisionClient:
             return cost
         else:
             logger.info(f"Aucun tarif défini pour le modèle {model}. Tokens: prompt={prompt_tokens}, completion={completion_tokens}")
-            return None
\ No newline at end of file
+            return None
+
+
+class OpenAIVisionClient(BaseVisionClient):
+    """Client pour communiquer avec l'API Vision d'OpenAI"""
+
+    def call_vision_api(self,
+                        prompt: str,
+                        images: List[ImageData],
+                        model: str = None,
+                        temperature: float = None,
+                        max_tokens: int = None,
+                        timeout: int = 180,
+                        progress_callback: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Appelle l'API Vision d'OpenAI pour analyser des images.
+
+        Args:
+            prompt: Le texte du prompt d'instruction
+            images: Pages à analyser, JPEG bruts (bytes) ou encodées en base64 (str)
+            model: Le modèle OpenAI à utiliser
+            temperature: Température pour la génération (0.0-1.0)
+            max_tokens: Nombre max de tokens pour la réponse
+            timeout: Délai total en secondes, nouvelles tentatives comprises (en mode streaming,
+                jusqu'à la fin du flux)
+            progress_callback: Appelée avec un message à chaque section extraite (mode streaming)
+
+        Returns:
+            Dict contenant la réponse analysée, les données brutes et les métriques d'usage
+
+        Raises:
+            requests.exceptions.RequestException: Pour les erreurs de communication API
+            json.JSONDecodeError: Si la réponse n'est pas au format JSON
+            Exception: Pour les autres erreurs
+        """
+        model, temperature, max_tokens = self._resolve_options(model, temperature, max_tokens)
+        self._log_request_configuration(prompt, images, model, temperature, max_tokens)
+        breaker = self._get_circuit_breaker()
+        if breaker is not None:
+            # Échoue immédiatement si l'API est considérée indisponible
+            breaker.before_call()
+        estimated_tokens, rate_limit_wait = self._acquire_rate_limit(prompt, images, model)
+
+        try:
+            logger.info(f"Envoi de la requête à l'API OpenAI (modèle: {model})...")
+            started = time.monotonic()
+            try:
+                if self._uses_responses_api(model):
+                    result = self._call_responses_api(prompt, images, model, max_tokens, timeout, progress_callback)
+                else:
+                    payload = self._build_chat_payload(prompt, images, model, temperature, max_tokens)
+                    response, retry_stats = self._post_hedged(OPENAI_CHAT_COMPLETIONS_URL, payload, timeout)
+                    logger.info(f"Réponse reçue de l'API OpenAI (status {response.status_code}).")
+                    result = self._attach_retry_stats(self._parse_chat_result(response.json(), model), retry_stats)
+            except Exception as call_err:
+                self._record_call_outcome(started, call_err)
+                raise
+            self._record_call_outcome(started)
+            return self._settle_rate_limit(result, model, estimated_tokens, rate_limit_wait)
+
+        except requests.exceptions.Timeout:
+            logger.error("Timeout lors de l'appel à l'API OpenAI.")
+            raise
+        except requests.exceptions.RequestException as req_err:
+            logger.error(f"Erreur de requête vers l'API OpenAI: {req_err}", exc_info=True)
+            error_details = str(req_err)
+            if req_err.response is not None:
+                try:
+                    error_details = req_err.response.json()
+                    logger.error(f"Détails de l'erreur API: {json.dumps(error_details, indent=2)}")
+                except json.JSONDecodeError:
+                    error_details = req_err.response.text
+                    logger.error(f"Réponse d'erreur brute: {error_details}")
+            raise
+        except Exception as e:
+            logger.error(f"Erreur inattendue: {str(e)}", exc_info=True)
+            raise
+
+    def _call_responses_api(self, prompt: str, images: List[ImageData], model: str, max_tokens: int, timeout: int,
+                            progress_callback: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Appelle l'API Responses d'OpenAI pour GPT-5 avec support des images.
+        """
+        payload = self._build_responses_payload(prompt, images, model, max_tokens)
+
+        if _get_setting('OPENAI_STREAM_RESPONSES', False):
+            return self._stream_responses_api(payload, model, timeout, progress_callback)
+
+        logger.info(f"Utilisation de l'API Responses pour GPT-5")
+
+        response, retry_stats = self._post_hedged(OPENAI_RESPONSES_URL, payload, timeout)
+        logger.info(f"Réponse reçue de l'API Responses (status {response.status_code}).")
+        return self._attach_retry_stats(self._parse_responses_result(response.json(), model), retry_stats)
+
+    def _stream_responses_api(self, payload: Dict[str, Any], model: str, timeout: int,
+                              progress_callback: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Consomme la réponse de l'API Responses en server-sent events.
+
+        Le texte JSON est accumulé au fil des événements `response.output_text.delta`;
+        chaque section du JSON attendu est signalée via `progress_callback` dès qu'elle
+        est complète. Le flux est abandonné s'il ne produit aucun événement pendant plus de
+        OPENAI_STREAM_IDLE_TIMEOUT secondes (les commentaires keep-alive ne comptent pas)
+        ou si le délai total `timeout` est dépassé.
+        """
+        idle_timeout = _get_setting('OPENAI_STREAM_IDLE_TIMEOUT', 30.0)
+        started = time.monotonic()
+        deadline = started + timeout
+
+        logger.info("Utilisation de l'API Responses pour GPT-5 (streaming)")
+        response, retry_stats = self._post(
+            OPENAI_RESPONSES_URL, dict(payload, stream=True),
+            timeout=(min(idle_timeout, timeout), min(idle_timeout, timeout)), stream=True, deadline=deadline,
+        )
+        logger.info(f"Flux ouvert sur l'API Responses (status {response.status_code}).")
+
+        buffered = ''
+        final_response = None
+        first_token_at = None
+        next_section = 0
+        last_event_at = started
+        try:
+            for event_type, data in self._iter_sse_events(response):
+                now = time.monotonic()
+                if now > deadline:
+                    raise requests.exceptions.Timeout(f"Délai total de {timeout}s dépassé pendant le streaming")
+                if data is None:
+                    # Keep-alive: la connexion vit mais le flux n'avance pas
+                    if now - last_event_at > idle_timeout:
+                        raise requests.exceptions.Timeout(
+                            f"Aucun événement depuis plus de {idle_timeout}s (keep-alive uniquement)"
+                        )
+                    continue
+                last_event_at = now
+
+                if event_type == 'response.output_text.delta':
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                        logger.info(f"Premier token reçu après {first_token_at - started:.2f}s")
+                    buffered += data.get('delta') or ''
+                    # Une section est complète quand la clé de la section suivante est apparue
+                    while next_section < len(STREAM_PROGRESS_SECTIONS) - 1:
+                        following_key = STREAM_PROGRESS_SECTIONS[next_section + 1][0]
+                        if f'"{following_key}"' not in buffered:
+                            break
+                        self._publish_progress(progress_callback, STREAM_PROGRESS_SECTIONS[next_section][1])
+                        next_section += 1
+                elif event_type == 'response.completed':
+                    final_response = data.get('response') or {}
+                elif event_type in ('response.failed', 'response.incomplete', 'error'):
+                    logger.error(f"Événement '{event_type}' reçu pendant le streaming: {data}")
+                    final_response = data.get('response') or {}
+                    break
+        except requests.exceptions.ConnectionError as stream_err:
+            # requests signale un read timeout pendant iter_lines comme une erreur de connexion
+            raise requests.exceptions.Timeout(f"Flux interrompu ou inactif depuis plus de {idle_timeout}s: {stream_err}")
+        finally:
+            response.close()
+
+        content_str = buffered
+        result = dict(final_response or {})
+        if content_str:
+            # Le texte reconstruit fait foi, la réponse finale peut omettre le contenu
+            result['output_text'] = content_str
+            result.pop('output', None)
+            self._publish_progress(progress_callback, "Réponse complète reçue, calcul des scores")
+
+        parsed = self._parse_responses_result(result, model)
+        stream_stats = dict(retry_stats, streamed=True)
+        stream_stats['stream_duration_seconds'] = round(time.monotonic() - started, 3)
+        if first_token_at is not None:
+            stream_stats['time_to_first_token_seconds'] = round(first_token_at - started, 3)
+        return self._attach_retry_stats(parsed, stream_stats)
+
+    def _iter_sse_events(self, response: requests.Response):
+        """
+        Découpe un flux server-sent events en couples (type d'événement, données JSON).
+        Chaque commentaire (keep-alive) produit (None, None) pour que l'appelant puisse
+        vérifier ses délais même sans événement.
+        """
+        # Les SSE sont toujours en UTF-8; requests supposerait ISO-8859-1 pour text/event-stream
+        response.encoding = 'utf-8'
+        event_type = None
+        data_lines: List[str] = []
+        for line in response.iter_lines(decode_unicode=True):
+            if line is None:
+                continue
+            if line == '':
+                if data_lines:
+                    raw = '\n'.join(data_lines)
+                    data_lines = []
+                    if raw.strip() == '[DONE]':
+                        return
+                    try:
+                        data = json.loads(raw)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Événement SSE illisible ignoré: {raw[:200]}")
+                        event_type = None
+                        continue
+                    yield event_type or data.get('type'), data
+                event_type = None
+            elif line.startswith(':'):
+                yield None, None
+            elif line.startswith('event:'):
+                event_type = line[len('event:'):].strip()
+            elif line.startswith('data:'):
+                data_lines.append(line[len('data:'):].lstrip())
+
+    def _publish_progress(self, progress_callback: Optional[Callable[[str], None]], message: str) -> None:
+        if progress_callback is None:
+            return
+        try:
+            progress_callback(message)
+        except Exception as e:
+            # La progression est informative: ne jamais interrompre l'analyse pour elle
+            logger.warning(f"Échec de publication de la progression '{message}': {e}")
+
+    def _post_hedged(self, url: str, payload: Dict[str, Any], timeout) -> Tuple[requests.Response, Dict[str, Any]]:
+        """
+        Comme _post, mais si OPENAI_HEDGE_REQUESTS est actif et qu'aucune réponse n'est
+        arrivée après la latence p95 observée, envoie un duplicata et garde la première
+        réponse réussie. Le duplicata perdant n'est pas interrompu (son coût est payé).
+        """
+        from .circuit_breaker import latency_tracker
+        # Sérialisé une fois: la requête initiale et son duplicata relisent le même corps
+        payload = request_body(payload)
+        hedge_after = latency_tracker.percentile(0.95) if _get_setting('OPENAI_HEDGE_REQUESTS', False) else None
+        if hedge_after is None:
+            return self._post(url, payload, timeout)
+
+        # Le duplicata partage l'échéance de la requête initiale
+        deadline = time.monotonic() + timeout
+        executor = get_hedge_executor()
+        primary = executor.submit(self._post, url, payload, timeout, deadline=deadline)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        logger.info(f"Pas de réponse après {hedge_after:.1f}s (p95), envoi d'une requête dupliquée")
+        hedge = executor.submit(self._post, url, payload, timeout, deadline=deadline)
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    breaker = self._get_circuit_breaker()
+                    if breaker is not None:
+                        try:
+                            breaker.record_hedge(hedge_won=future is hedge)
+                        except Exception as e:
+                            logger.warning(f"Comptage du hedging impossible: {e}")
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
+
+    def _post(self, url: str, payload: Union[Dict[str, Any], RequestBody], timeout,
+              stream: bool = False, deadline: Optional[float] = None) -> Tuple[requests.Response, Dict[str, Any]]:
+        """
+        Envoie la requête via la session partagée, avec nouvelles tentatives sur
+        les erreurs transitoires (429, 5xx, connexion impossible). Le corps est
+        transmis par blocs depuis les JPEG des pages (RequestBody), sans être
+        assemblé en mémoire.
+        Toutes les tentatives partagent l'échéance `deadline` (time.monotonic(), par
+        défaut maintenant + `timeout`): chacune est bornée par le temps restant et
+        aucune nouvelle tentative n'est faite si elle ne peut plus tenir avant l'échéance.
+
+        Returns:
+            La réponse HTTP réussie et les statistiques de tentatives
+
+        Raises:
+            requests.exceptions.RequestException: Si l'erreur est définitive, les tentatives
+                ou le délai total épuisés
+        """
+        session = get_http_session()
+        body = request_body(payload)
+        max_retries = self._max_retries()
+        if deadline is None:
+            deadline = time.monotonic() + (max(timeout) if isinstance(timeout, tuple) else timeout)
+        attempt = 0
+        backoff_total = 0.0
+        while True:
+            attempt_timeout = self._attempt_timeout(timeout, deadline)
+            if attempt_timeout is None:
+                raise requests.exceptions.Timeout(f"Délai total dépassé après {attempt} tentative(s)")
+            try:
+                response = session.post(
+                    url, headers=self._headers(), data=body.open(), timeout=attempt_timeout, stream=stream
+                )
+            except requests.exceptions.ConnectionError as conn_err:
+                if attempt >= max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                if not self._retry_fits(delay, deadline):
+                    logger.warning(f"Connexion à l'API OpenAI impossible ({conn_err}), délai total épuisé")
+                    raise
+                logger.warning(f"Connexion à l'API OpenAI impossible ({conn_err}), nouvelle tentative dans {delay:.2f}s")
+            else:
+                if response.ok:
+                    return response, {
+                        'retry_attempts': attempt, 'retry_backoff_seconds': round(backoff_total, 3),
+                        'request_bytes': len(body),
+                    }
+                try:
+                    error_body = response.json()
+                except ValueError:
+                    error_body = None
+                if attempt >= max_retries or not self._should_retry(response.status_code, error_body):
+                    response.raise_for_status()
+                delay = self._retry_delay(attempt, response.headers)
+                if not self._retry_fits(delay, deadline):
+                    logger.warning(f"API OpenAI: statut {response.status_code}, délai total épuisé")
+                    response.raise_for_status()
+                logger.warning(
+                    f"API OpenAI: statut {response.status_code}, tentative {attempt + 1}/{max_retries}, "
+                    f"nouvelle tentative dans {delay:.2f}s"
+                )
+            attempt += 1
+            backoff_total += delay
+            time.sleep(delay)
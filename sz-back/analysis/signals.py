@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from documents.models import PaySlip
+from .models import PayslipAnalysis, UserPayslipStats
+
+
+@receiver(post_save, sender=PayslipAnalysis)
+@receiver(post_delete, sender=PayslipAnalysis)
+def invalidate_analysis_result_cache(sender, instance, **kwargs):
+    """
+    Supprime la réponse mise en cache du résultat d'une analyse modifiée ou supprimée
+    """
+    from .services.result_cache import invalidate_cached_result
+    invalidate_cached_result(instance.id)
+
+
+@receiver(post_delete, sender=PayslipAnalysis)
+def remove_analysis_from_user_stats(sender, instance, **kwargs):
+    """
+    Retire la contribution d'une analyse supprimée des statistiques de son utilisateur
+    """
+    user_id = PaySlip.objects.filter(pk=instance.payslip_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        UserPayslipStats.apply_analysis_change(user_id, instance.stats_contribution(), None)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    """
+    Crée les statistiques (vides) d'un nouvel utilisateur, ensuite tenues à jour par incréments
+    """
+    if created and not raw:
+        UserPayslipStats.objects.get_or_create(user_id=instance.pk)
+
+
+@receiver(post_save, sender=PaySlip)
+def add_payslip_to_user_stats(sender, instance, created, **kwargs):
+    """
+    Comptabilise une nouvelle fiche de paie dans les statistiques de son utilisateur
+    """
+    if created:
+        UserPayslipStats.record_upload(instance.user_id, instance.upload_date)
+
+
+@receiver(post_delete, sender=PaySlip)
+def remove_payslip_from_user_stats(sender, instance, **kwargs):
+    """
+    Retire une fiche de paie supprimée des statistiques de son utilisateur
+    """
+    UserPayslipStats.record_payslip_deleted(instance.user_id)
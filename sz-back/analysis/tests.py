@@ -0,0 +1,1171 @@
+import json
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from documents.models import PaySlip
+from .models import AnalysisJob, RateLimitBucket
+from .services.batch_service import OpenAIBatchClient
+from .services.job_queue import claim_next_job, finish_job, run_job
+
+
+class FakeAnalysisService:
+    """Remplace AnalysisService pour éviter tout appel à OpenAI."""
+    def __init__(self, succeed=True):
+        self.succeed = succeed
+        self.analyzed = []
+
+    def analyze_payslip(self, payslip_id):
+        self.analyzed.append(payslip_id)
+        payslip = PaySlip.objects.get(id=payslip_id)
+        payslip.processing_status = 'completed' if self.succeed else 'error'
+        payslip.save(update_fields=['processing_status'])
+        return payslip if self.succeed else None
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AnalysisJobQueueTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='alice', email='alice@example.com', password='pwd', credits=5
+        )
+
+    def _upload(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        pdf = SimpleUploadedFile("fiche.pdf", b"%PDF-1.4 test", content_type="application/pdf")
+        return client.post('/api/payslips/upload/', {'uploaded_file': pdf}, format='multipart')
+
+    def test_upload_returns_202_with_queued_job(self):
+        response = self._upload()
+        self.assertEqual(response.status_code, 202)
+        job = AnalysisJob.objects.get(id=response.data['analysis_job_id'])
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(job.payslip.processing_status, 'queued')
+
+    def test_worker_claims_and_completes_job(self):
+        job_id = self._upload().data['analysis_job_id']
+        job = claim_next_job('test-worker')
+        self.assertEqual(job.id, job_id)
+        self.assertEqual(job.status, 'processing')
+        self.assertEqual(job.attempts, 1)
+        # Une tâche en cours n'est pas réclamée une seconde fois
+        self.assertIsNone(claim_next_job('other-worker'))
+
+        service = FakeAnalysisService()
+        run_job(job, service)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(service.analyzed, [job.payslip_id])
+
+    def test_group_limit_skips_saturated_group(self):
+        from .models import BulkAnalysisGroup
+        group = BulkAnalysisGroup.objects.create(user=self.user, total_files=3)
+        job_ids = [self._upload().data['analysis_job_id'] for _ in range(3)]
+        AnalysisJob.objects.filter(id__in=job_ids[:2]).update(group=group)
+        AnalysisJob.objects.filter(id=job_ids[0]).update(status='processing')
+
+        # Le groupe a déjà une analyse en cours: la tâche hors groupe passe devant
+        job = claim_next_job('test-worker', group_limit=1)
+        self.assertEqual(job.id, job_ids[2])
+        self.assertIsNone(claim_next_job('test-worker', group_limit=1))
+
+    def test_expired_lease_is_requeued_then_abandoned_with_refund(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from billing.models import CreditTransaction
+        from .services.job_queue import reap_expired_leases
+
+        job_id = self._upload().data['analysis_job_id']
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.credits, 4)
+
+        # Le worker meurt sans renouveler son bail: la tâche est remise en file
+        claim_next_job('dead-worker')
+        AnalysisJob.objects.filter(id=job_id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(reap_expired_leases(max_attempts=2), {'requeued': 1, 'abandoned': 0})
+        job = AnalysisJob.objects.get(id=job_id)
+        self.assertEqual((job.status, job.payslip.processing_status), ('queued', 'queued'))
+
+        # Seconde mort: tentatives épuisées, erreur et crédit remboursé
+        claim_next_job('dead-worker-2')
+        AnalysisJob.objects.filter(id=job_id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(reap_expired_leases(max_attempts=2), {'requeued': 0, 'abandoned': 1})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.payslip.processing_status), ('error', 'error'))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.credits, 5)
+        self.assertTrue(CreditTransaction.objects.filter(user=self.user, type='refund', amount=1).exists())
+        # Un worker zombie qui termine après coup n'écrase pas l'issue
+        finish_job(AnalysisJob.objects.get(id=job_id), True)
+        self.assertEqual(AnalysisJob.objects.get(id=job_id).status, 'error')
+
+    def test_scheduler_prefers_interactive_and_shares_between_users(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import BulkAnalysisGroup
+        from .services.scheduler import FairScheduler
+
+        bob = get_user_model().objects.create_user(username='bob', email='bob@example.com', password='pwd', credits=5)
+        carol = get_user_model().objects.create_user(username='carol', email='carol@example.com', password='pwd', credits=5)
+
+        def queue_job(user, group=None):
+            payslip = PaySlip.objects.create(user=user, uploaded_file='payslips/x.pdf', processing_status='queued')
+            return AnalysisJob.objects.create(payslip=payslip, group=group)
+
+        # Gros arriéré groupé d'alice et de bob, puis une analyse unitaire de carol
+        alice_group = BulkAnalysisGroup.objects.create(user=self.user, total_files=4)
+        bob_group = BulkAnalysisGroup.objects.create(user=bob, total_files=4)
+        alice_jobs = [queue_job(self.user, alice_group) for _ in range(4)]
+        bob_jobs = [queue_job(bob, bob_group) for _ in range(4)]
+        single = queue_job(carol)
+
+        scheduler = FairScheduler(aging_seconds=3600)
+        claimed = [claim_next_job('w', scheduler=scheduler) for _ in range(5)]
+        self.assertEqual(claimed[0].id, single.id)
+        # Les éléments groupés sont servis à tour de rôle entre alice et bob
+        owners = [job.payslip.user_id for job in claimed[1:]]
+        self.assertEqual(owners, [self.user.id, bob.id, self.user.id, bob.id])
+        # Pour un même utilisateur, la plus ancienne tâche passe en premier
+        self.assertEqual([job.id for job in claimed[1:] if job.payslip.user_id == self.user.id],
+                         [alice_jobs[0].id, alice_jobs[1].id])
+
+        # Vieillissement: un élément groupé ancien passe devant une analyse unitaire récente
+        AnalysisJob.objects.filter(id=bob_jobs[3].id).update(created_at=timezone.now() - timedelta(hours=2))
+        newer_single = queue_job(carol)
+        scheduler = FairScheduler(aging_seconds=3600)
+        picked = {claim_next_job('w', scheduler=scheduler).id for _ in range(2)}
+        self.assertEqual(picked, {bob_jobs[3].id, newer_single.id})
+
+    def test_scheduler_keeps_turn_when_claim_finds_no_row(self):
+        from .services.scheduler import FairScheduler
+
+        scheduler = FairScheduler()
+        # Tâches de l'utilisateur 1 toutes verrouillées ailleurs: rien n'est débité, il garde son tour
+        self.assertEqual(scheduler._round_robin([1, 2]), [1, 2])
+        self.assertEqual(scheduler._round_robin([1, 2]), [1, 2])
+        scheduler.charge(1)
+        self.assertEqual(scheduler._round_robin([1, 2]), [2, 1])
+
+
+@override_settings(OPENAI_BREAKER_ENABLED=False)
+class AsyncVisionClientTests(TestCase):
+    def test_concurrent_calls_share_pool_and_keep_contract(self):
+        import asyncio
+        import json
+        import httpx
+        from .services.async_vision_client import AsyncOpenAIVisionClient
+
+        state = {'in_flight': 0, 'peak': 0}
+
+        async def handler(request):
+            state['in_flight'] += 1
+            state['peak'] = max(state['peak'], state['in_flight'])
+            await asyncio.sleep(0.01)
+            state['in_flight'] -= 1
+            return httpx.Response(200, json={
+                'output': [{'type': 'message', 'content': [
+                    {'type': 'output_text', 'text': json.dumps({'note_globale': 8})}
+                ]}],
+                'usage': {'input_tokens': 1000, 'output_tokens': 100},
+            })
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+                client = AsyncOpenAIVisionClient('sk-test', http_client=http_client, max_in_flight=10)
+                return await asyncio.gather(*[
+                    client.call_vision_api('prompt', ['aW1n'], model='gpt-5-mini') for _ in range(25)
+                ])
+
+        results = asyncio.run(run())
+        self.assertEqual(len(results), 25)
+        self.assertEqual(results[0]['gpt_analysis'], {'note_globale': 8})
+        self.assertEqual(set(results[0]), {'gpt_analysis', 'raw', 'usage', 'estimated_cost'})
+        self.assertEqual(state['peak'], 10)
+
+
+class VisionClientRetryTests(TestCase):
+    def _response(self, status, body, headers=None):
+        import json
+        import requests
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode()
+        response.headers.update(headers or {})
+        return response
+
+    def test_rate_limited_call_is_retried_after_retry_after(self):
+        from unittest import mock
+        from .services import vision_api_client
+        from .services.vision_api_client import OpenAIVisionClient
+
+        ok_body = {
+            'choices': [{'message': {'content': '{"note_globale": 7}'}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': 10},
+        }
+        session = mock.Mock()
+        session.post.side_effect = [
+            self._response(429, {'error': {'code': 'rate_limit_exceeded'}}, {'retry-after': '2'}),
+            self._response(200, ok_body),
+        ]
+        with mock.patch.object(vision_api_client, 'get_http_session', return_value=session), \
+                mock.patch.object(vision_api_client.time, 'sleep') as sleep:
+            result = OpenAIVisionClient('sk-test').call_vision_api('prompt', ['aW1n'], model='gpt-4o')
+
+        self.assertEqual(session.post.call_count, 2)
+        self.assertGreaterEqual(sleep.call_args[0][0], 2)
+        self.assertEqual(result['usage']['retry_attempts'], 1)
+        self.assertEqual(result['gpt_analysis'], {'note_globale': 7})
+
+    def test_retries_share_one_overall_deadline(self):
+        import requests
+        from unittest import mock
+        from .services import vision_api_client
+        from .services.vision_api_client import OpenAIVisionClient
+
+        now = [0.0]
+        timeouts = []
+
+        def slow_failure(url, **kwargs):
+            # Chaque tentative attend jusqu'à 50 s avant un 503
+            timeouts.append(kwargs['timeout'])
+            now[0] += min(50.0, kwargs['timeout'])
+            return self._response(503, {'error': {'message': 'overloaded'}})
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        session = mock.Mock()
+        session.post.side_effect = slow_failure
+        with mock.patch.object(vision_api_client, 'get_http_session', return_value=session), \
+                mock.patch.object(vision_api_client.time, 'monotonic', side_effect=lambda: now[0]), \
+                mock.patch.object(vision_api_client.time, 'sleep', side_effect=sleep):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                OpenAIVisionClient('sk-test')._post('https://api.test/v1/responses', {}, 180)
+
+        self.assertLessEqual(now[0], 180)
+        self.assertEqual(timeouts[0], 180)
+        # Chaque tentative est bornée par le temps restant
+        self.assertTrue(all(later < earlier for earlier, later in zip(timeouts, timeouts[1:])))
+
+    def test_insufficient_quota_is_not_retried(self):
+        from .services.vision_api_client import OpenAIVisionClient
+        client = OpenAIVisionClient('sk-test')
+        self.assertFalse(client._should_retry(429, {'error': {'code': 'insufficient_quota'}}))
+        self.assertTrue(client._should_retry(503))
+        self.assertFalse(client._should_retry(400))
+
+    @override_settings(OPENAI_STREAM_RESPONSES=True)
+    def test_streamed_response_reports_sections_and_ttft(self):
+        import io
+        import json
+        import requests
+        from unittest import mock
+        from .services import vision_api_client
+        from .services.vision_api_client import OpenAIVisionClient
+
+        text = json.dumps({'informations_generales': {}, 'periode': {}, 'remuneration': {}, 'conges_et_absences': {}, 'note_globale': 6})
+        chunks = [text[i:i + 20] for i in range(0, len(text), 20)]
+        events = [('response.output_text.delta', {'delta': chunk}) for chunk in chunks]
+        events.append(('response.completed', {'response': {'usage': {'input_tokens': 50, 'output_tokens': 20}}}))
+        body = ''.join(f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events)
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(body.encode())
+        session = mock.Mock()
+        session.post.return_value = response
+
+        progress = []
+        with mock.patch.object(vision_api_client, 'get_http_session', return_value=session):
+            result = OpenAIVisionClient('sk-test').call_vision_api(
+                'prompt', ['aW1n'], model='gpt-5-mini', progress_callback=progress.append
+            )
+
+        self.assertTrue(session.post.call_args.kwargs['stream'])
+        self.assertEqual(result['gpt_analysis']['note_globale'], 6)
+        self.assertIn("Section rémunération extraite", progress)
+        self.assertTrue(result['usage']['streamed'])
+        self.assertIn('time_to_first_token_seconds', result['usage'])
+        self.assertEqual(result['usage']['output_tokens'], 20)
+
+    @override_settings(OPENAI_STREAM_IDLE_TIMEOUT=30)
+    def test_stream_of_keep_alives_only_is_aborted(self):
+        import io
+        import itertools
+        import requests
+        from unittest import mock
+        from .services import vision_api_client
+        from .services.vision_api_client import OpenAIVisionClient
+
+        body = 'event: response.created\ndata: {}\n\n' + ': keep-alive\n\n' * 100
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(body.encode())
+        client = OpenAIVisionClient('sk-test')
+        # Chaque lecture d'horloge avance de 5 s: seul le keep-alive arrive encore
+        clock = itertools.count(0, 5)
+        with mock.patch.object(client, '_post', return_value=(response, {})), \
+                mock.patch.object(vision_api_client.time, 'monotonic', side_effect=lambda: next(clock)):
+            with self.assertRaisesRegex(requests.exceptions.Timeout, 'keep-alive'):
+                client._stream_responses_api({}, 'gpt-5-mini', timeout=180)
+        self.assertLess(next(clock), 180)
+
+
+class RateLimiterTests(TestCase):
+    def test_buckets_throttle_requests_and_tokens(self):
+        from unittest import mock
+        from .services import rate_limiter
+        from .services.rate_limiter import OpenAIRateLimiter, estimate_image_tokens
+
+        # Page A4 à 150 dpi: ramenée à 768x1087, soit 2x3 tuiles
+        self.assertEqual(estimate_image_tokens(1240, 1754), 85 + 170 * 6)
+
+        limiter = OpenAIRateLimiter(requests_per_minute=60, tokens_per_minute=6000, max_wait=100)
+        with mock.patch.object(rate_limiter.time, 'sleep') as sleep:
+            self.assertEqual(limiter.acquire('gpt-5-mini', 5000), 0)
+            sleep.assert_not_called()
+            # Il manque 4000 tokens, soit 40 s de remplissage à 100 tokens/s
+            self.assertAlmostEqual(limiter.acquire('gpt-5-mini', 5000), 80, delta=1)
+            self.assertAlmostEqual(sleep.call_args[0][0], 40, delta=1)
+        # Envoyée sans budget au bout de l'attente maximale, la requête a quand même été débitée
+        bucket = RateLimitBucket.objects.get(key='gpt-5-mini')
+        self.assertLess(bucket.tokens_available, 0)
+        self.assertAlmostEqual(bucket.requests_available, 58, delta=1)
+
+
+class CircuitBreakerTests(TestCase):
+    def test_breaker_opens_fails_fast_then_probes(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import CircuitBreakerState
+        from .services.circuit_breaker import CircuitOpenError, VisionCircuitBreaker
+
+        breaker = VisionCircuitBreaker(failure_threshold=2, reset_timeout=60, latency_slo=10)
+        breaker.before_call()
+        breaker.record_failure()
+        breaker.before_call()
+        # Une réponse plus lente que le SLO compte comme un échec
+        breaker.record_success(latency=30)
+        self.assertEqual(breaker.snapshot()['state'], 'open')
+        self.assertFalse(breaker.allows_requests())
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        # Après le délai de réarmement, une seule requête de test passe
+        CircuitBreakerState.objects.update(opened_at=timezone.now() - timedelta(seconds=61))
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success(latency=1)
+        snapshot = breaker.snapshot()
+        self.assertEqual(snapshot['state'], 'closed')
+        self.assertEqual((snapshot['failures'], snapshot['slo_breaches'], snapshot['short_circuits']), (1, 1, 2))
+
+    def test_client_error_on_probe_releases_it(self):
+        from datetime import timedelta
+        import requests
+        from django.utils import timezone
+        from .models import CircuitBreakerState
+        from .services.circuit_breaker import VisionCircuitBreaker
+        from .services.vision_api_client import OpenAIVisionClient
+
+        breaker = VisionCircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        CircuitBreakerState.objects.update(opened_at=timezone.now() - timedelta(seconds=61))
+        breaker.before_call()
+        self.assertEqual(breaker.snapshot()['state'], 'half_open')
+
+        # La requête de test reçoit un 400: le service répond, le disjoncteur se referme
+        response = requests.Response()
+        response.status_code = 400
+        client = OpenAIVisionClient('sk-test')
+        client._circuit_breaker = breaker
+        client._record_call_outcome(0.0, requests.exceptions.HTTPError(response=response))
+        self.assertEqual(breaker.snapshot()['state'], 'closed')
+        breaker.before_call()
+
+    @override_settings(OPENAI_HEDGE_REQUESTS=True)
+    def test_slow_request_is_hedged(self):
+        import threading
+        from unittest import mock
+        from .services.circuit_breaker import LatencyTracker
+        from .services import circuit_breaker
+        from .services.vision_api_client import OpenAIVisionClient
+
+        tracker = LatencyTracker()
+        for _ in range(20):
+            tracker.add(0.05)
+        release_primary = threading.Event()
+        calls = []
+
+        def fake_post(url, payload, timeout, deadline=None):
+            calls.append(url)
+            if len(calls) == 1:
+                release_primary.wait(5)
+                return 'primary', {}
+            return 'hedge', {}
+
+        client = OpenAIVisionClient('sk-test')
+        with mock.patch.object(circuit_breaker, 'latency_tracker', tracker), \
+                mock.patch.object(client, '_post', side_effect=fake_post):
+            response, _ = client._post_hedged('https://api.test/v1/responses', {}, 30)
+        release_primary.set()
+
+        self.assertEqual(response, 'hedge')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(client._get_circuit_breaker().snapshot()['hedge_wins'], 1)
+
+
+class FakeStagedService:
+    """Service à trois étapes sans base de données ni appel OpenAI."""
+    def __init__(self, log):
+        self.log = log
+
+    def prepare_analysis(self, payslip_id):
+        self.log.append(('prepare', payslip_id))
+        return None if payslip_id == 3 else {'payslip_id': payslip_id}
+
+    def submit_analysis(self, prepared):
+        self.log.append(('submit', prepared['payslip_id']))
+        return {'gpt_analysis': {}}
+
+    def finalize_analysis(self, prepared, result):
+        self.log.append(('finalize', prepared['payslip_id']))
+        return prepared
+
+
+class AnalysisPipelineTests(TestCase):
+    def test_jobs_flow_through_all_stages(self):
+        from .services.pipeline import AnalysisPipeline
+
+        log, finished = [], []
+        pipeline = AnalysisPipeline(
+            prepare_workers=2, submit_workers=2, buffer_size=1,
+            service_factory=lambda: FakeStagedService(log),
+            on_finished=lambda job, ok, error: finished.append((job.payslip_id, ok)),
+        ).start()
+        for payslip_id in range(1, 6):
+            pipeline.submit(AnalysisJob(id=payslip_id, payslip_id=payslip_id))
+        pipeline.shutdown()
+
+        self.assertEqual(pipeline.in_flight, 0)
+        self.assertEqual(sorted(finished), [(1, True), (2, True), (3, False), (4, True), (5, True)])
+        # Une préparation échouée ne va pas jusqu'à l'appel API
+        self.assertNotIn(('submit', 3), log)
+        self.assertEqual((pipeline.completed, pipeline.failed), (4, 1))
+
+    def test_short_circuited_job_goes_back_to_the_queue(self):
+        from .services.circuit_breaker import CircuitOpenError
+        from .services.pipeline import AnalysisPipeline
+
+        class OpenBreakerService(FakeStagedService):
+            def submit_analysis(self, prepared):
+                raise CircuitOpenError("API Vision temporairement indisponible")
+
+        user = get_user_model().objects.create_user(username='lea', email='lea@example.com', password='pwd')
+        payslip = PaySlip.objects.create(user=user, uploaded_file='payslips/x.pdf', processing_status='queued')
+        AnalysisJob.objects.create(payslip=payslip, credits_charged=1)
+        job = claim_next_job('w')
+        PaySlip.objects.filter(id=payslip.id).update(processing_status='processing')
+
+        finished = []
+        pipeline = AnalysisPipeline(service_factory=lambda: OpenBreakerService([]),
+                                    on_finished=lambda job, ok, error: finished.append(ok))
+        pipeline.submit(job)
+        # Étape d'envoi exécutée dans le thread du test (données de test non validées)
+        item = pipeline._submit({'job': job, 'service': OpenBreakerService([]), 'prepared': {'payslip_id': payslip.id}})
+
+        self.assertIsNone(item)
+        self.assertEqual(finished, [])
+        self.assertEqual((pipeline.in_flight, pipeline.requeued, pipeline.failed), (0, 1, 0))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.worker_id, job.lease_expires_at), ('queued', 0, '', None))
+        self.assertEqual(job.credits_charged, 1)
+        payslip.refresh_from_db()
+        self.assertEqual(payslip.processing_status, 'queued')
+        # La tâche est de nouveau réclamable une fois l'API rétablie
+        self.assertEqual(claim_next_job('w2').id, job.id)
+
+
+class FakeBatchClient(OpenAIBatchClient):
+    """Simule les endpoints /files et /batches: chaque requête reçoit une réponse valide."""
+    def upload_jsonl(self, content, filename='analyses.jsonl'):
+        self.uploaded = content.decode('utf-8').splitlines()
+        return 'file-in'
+
+    def create_batch(self, input_file_id, endpoint):
+        return {'id': 'batch-1', 'status': 'in_progress'}
+
+    def retrieve_batch(self, batch_id):
+        return {'id': batch_id, 'status': 'completed', 'output_file_id': 'file-out'}
+
+    def download_file(self, file_id):
+        text = json.dumps({'periode': {'mois': 1}})
+        body = {
+            'output': [{'type': 'message', 'content': [{'type': 'output_text', 'text': text}]}],
+            'usage': {'input_tokens': 1000, 'output_tokens': 500},
+        }
+        return '\n'.join(
+            json.dumps({'custom_id': json.loads(line)['custom_id'], 'response': {'status_code': 200, 'body': body}})
+            for line in self.uploaded
+        )
+
+
+class FakeBatchService:
+    def __init__(self, finalized):
+        self.finalized = finalized
+
+    def prepare_analysis(self, payslip_id):
+        payslip = PaySlip.objects.get(id=payslip_id)
+        return {'payslip': payslip, 'vision_input': {'prompt': 'analyse', 'images': ['aW1n']}}
+
+    def finalize_analysis(self, prepared, result):
+        self.finalized[prepared['payslip'].id] = result
+        return prepared['payslip']
+
+    def _update_payslip_status(self, payslip, status):
+        pass
+
+    def _update_payslip_progress(self, payslip, message):
+        pass
+
+    def _handle_analysis_exception(self, error, payslip):
+        self.finalized[payslip.id] = {'error': str(error)}
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), OPENAI_VISION_MODEL='gpt-5-mini')
+class BatchAnalysisTests(TestCase):
+    def test_batch_jobs_are_submitted_then_finalized_at_half_price(self):
+        from .services.batch_service import BatchAnalysisService
+        from .services.job_queue import enqueue_analysis
+
+        user = get_user_model().objects.create_user(username='bob', email='bob@example.com', password='pwd')
+        payslips = [
+            PaySlip.objects.create(
+                user=user, uploaded_file=SimpleUploadedFile(f"f{i}.pdf", b"%PDF-1.4", content_type="application/pdf")
+            )
+            for i in range(2)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs = [enqueue_analysis(payslip, mode='batch') for payslip in payslips]
+        # Les tâches en lot ne sont pas réclamées par les workers temps réel
+        self.assertIsNone(claim_next_job('live-worker'))
+
+        finalized = {}
+        client = FakeBatchClient('test-key')
+        service = BatchAnalysisService(client=client, service_factory=lambda: FakeBatchService(finalized))
+        batch = service.submit_pending('batch-worker')
+        self.assertEqual(batch.request_count, 2)
+        self.assertEqual(service.poll_batches(), 1)
+
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.batch_id), ('completed', batch.id))
+        result = finalized[payslips[0].id]
+        self.assertEqual(result['estimated_cost'], client._calculate_cost('gpt-5-mini', 1000, 500) / 2)
+        self.assertTrue(result['usage']['batch'])
+
+    def test_failed_download_and_malformed_lines_do_not_stop_polling(self):
+        from .services.batch_service import BatchAnalysisService
+        from .services.job_queue import enqueue_analysis
+
+        class FlakyBatchClient(FakeBatchClient):
+            downloads = 0
+
+            def download_file(self, file_id):
+                self.downloads += 1
+                if self.downloads == 1:
+                    raise ConnectionError("Connexion interrompue")
+                # Première réponse tronquée, la seconde valide
+                lines = super().download_file(file_id).splitlines()
+                return '\n'.join([lines[0][:20]] + lines[1:])
+
+        user = get_user_model().objects.create_user(username='nina', email='nina@example.com', password='pwd')
+        payslips = [
+            PaySlip.objects.create(
+                user=user, uploaded_file=SimpleUploadedFile(f"f{i}.pdf", b"%PDF-1.4", content_type="application/pdf")
+            )
+            for i in range(2)
+        ]
+        jobs = [enqueue_analysis(payslip, mode='batch') for payslip in payslips]
+        finalized = {}
+        service = BatchAnalysisService(client=FlakyBatchClient('test-key'),
+                                       service_factory=lambda: FakeBatchService(finalized))
+        batch = service.submit_pending('batch-worker')
+
+        # Téléchargement en échec: le lot reste ouvert et sera repris
+        self.assertEqual(service.poll_batches(), 0)
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'in_progress')
+        self.assertEqual(service.poll_batches(), 1)
+        self.assertIn('error', finalized[payslips[0].id])
+        self.assertNotIn('error', finalized[payslips[1].id])
+        self.assertEqual([AnalysisJob.objects.get(id=job.id).status for job in jobs], ['error', 'completed'])
+
+    @override_settings(ANALYSIS_JOB_MAX_ATTEMPTS=2)
+    def test_failed_submission_releases_jobs_then_refunds_them(self):
+        from .services.batch_service import BatchAnalysisService
+        from .services.job_queue import enqueue_analysis
+
+        class UnavailableBatchClient(FakeBatchClient):
+            def upload_jsonl(self, content, filename='analyses.jsonl'):
+                raise ConnectionError("API indisponible")
+
+        user = get_user_model().objects.create_user(username='oscar', email='oscar@example.com', password='pwd')
+        payslip = PaySlip.objects.create(
+            user=user, uploaded_file=SimpleUploadedFile("f.pdf", b"%PDF-1.4", content_type="application/pdf")
+        )
+        job = enqueue_analysis(payslip, mode='batch', credits_charged=1)
+        credits = get_user_model().objects.get(id=user.id).credits
+        finalized = {}
+        service = BatchAnalysisService(client=UnavailableBatchClient('test-key'),
+                                       service_factory=lambda: FakeBatchService(finalized))
+
+        self.assertIsNone(service.submit_pending('batch-worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.worker_id, job.lease_expires_at), ('queued', 1, '', None))
+        self.assertIn('API indisponible', job.last_error)
+
+        # Limite de tentatives atteinte: la tâche est abandonnée et le crédit rendu
+        self.assertIsNone(service.submit_pending('batch-worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.credits_charged), ('error', 2, 0))
+        self.assertEqual(get_user_model().objects.get(id=user.id).credits, credits + 1)
+        self.assertIn('error', finalized[payslip.id])
+        self.assertIsNone(service.submit_pending('batch-worker'))
+
+
+class FakeVisionService:
+    """Remplace GPTVisionService: compte les appels API simulés."""
+    def __init__(self, result=None):
+        self.calls = 0
+        self.recorded = 0
+        self.result = result
+
+    def prepare_pdf(self, pdf_path, max_pages=None, additional_data=None, content_hash=None, user_id=None):
+        return {'prompt': 'analyse', 'images': ['aW1n']}
+
+    def record_page_history(self, prepared, user_id):
+        self.recorded += 1
+
+    def submit_prepared(self, prepared, progress_callback=None):
+        self.calls += 1
+        if self.result is not None:
+            return self.result
+        return {'gpt_analysis': {'informations_generales': {'nom_salarie': 'Alice'}}, 'estimated_cost': 0.02}
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), OPENAI_VISION_MODEL='gpt-5-mini')
+class AnalysisReuseTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='carol', email='carol@example.com', password='pwd')
+
+    def _payslip(self, content=b"%PDF-1.4 identique", **fields):
+        pdf = SimpleUploadedFile("fiche.pdf", content, content_type="application/pdf")
+        return PaySlip.objects.create(user=self.user, uploaded_file=pdf, **fields)
+
+    def test_identical_pdf_reuses_completed_analysis(self):
+        from .models import AnalysisReuseStats
+        from .services.analysis_service import AnalysisService
+
+        vision = FakeVisionService()
+        service = AnalysisService(gpt_vision_service=vision)
+        first = self._payslip(convention_collective='syntec')
+        second = self._payslip(convention_collective='syntec')
+        self.assertEqual(first.content_sha256, second.content_sha256)
+
+        self.assertIsNotNone(service.analyze_payslip(first.id))
+        self.assertIsNotNone(service.analyze_payslip(second.id))
+
+        self.assertEqual(vision.calls, 1)
+        second.refresh_from_db()
+        self.assertEqual((second.processing_status, second.employee_name), ('completed', 'Alice'))
+        details = second.analysis.analysis_details
+        self.assertEqual(details['reused_from']['payslip_id'], first.id)
+        self.assertEqual(details['estimated_cost'], 0.0)
+        stats = AnalysisReuseStats.objects.get(key='default')
+        self.assertEqual((stats.lookups, stats.hits), (2, 1))
+        self.assertAlmostEqual(stats.cost_saved, 0.02)
+
+    def test_different_context_is_analyzed_again(self):
+        from .services.analysis_service import AnalysisService
+
+        vision = FakeVisionService()
+        service = AnalysisService(gpt_vision_service=vision)
+        first = self._payslip(convention_collective='syntec')
+        second = self._payslip(convention_collective='hcr')
+
+        service.analyze_payslip(first.id)
+        service.analyze_payslip(second.id)
+
+        self.assertEqual(vision.calls, 2)
+
+    def test_identical_pdf_of_another_user_is_not_reused(self):
+        from .services.analysis_service import AnalysisService
+
+        vision = FakeVisionService()
+        service = AnalysisService(gpt_vision_service=vision)
+        first = self._payslip(convention_collective='syntec')
+        other_user = get_user_model().objects.create_user(username='dave', email='dave@example.com', password='pwd')
+        second = self._payslip(convention_collective='syntec')
+        second.user = other_user
+        second.save(update_fields=['user'])
+
+        service.analyze_payslip(first.id)
+        service.analyze_payslip(second.id)
+
+        self.assertEqual(vision.calls, 2)
+        second.refresh_from_db()
+        self.assertNotIn('reused_from', second.analysis.analysis_details)
+
+
+class RasterCacheTests(TestCase):
+    def test_pages_are_cached_evicted_lru_and_purged(self):
+        import time
+        from .services.raster_cache import RasterCache
+
+        # Budget compté avec les manifests (environ 50 octets chacun)
+        cache = RasterCache(tempfile.mkdtemp(), max_bytes=350)
+        first, second, third = 'a' * 64, 'b' * 64, 'c' * 64
+        cache.put(first, 150, None, [b'x' * 50, b'y' * 50])
+        cache.put(second, 150, 1, [b'z' * 50])
+
+        self.assertEqual(cache.get(first, 150), [b'x' * 50, b'y' * 50])
+        self.assertEqual(cache.get(first, 150, max_pages=1), [b'x' * 50])
+        self.assertIsNone(cache.get(first, 200))
+        # Rendu limité à une page: insuffisant pour le document entier
+        self.assertIsNone(cache.get(second, 150))
+
+        time.sleep(0.01)
+        cache.get(first, 150)
+        cache.put(third, 150, None, [b'w' * 100])
+        # Le rendu le moins récemment utilisé est évincé
+        self.assertIsNone(cache.get(second, 150, max_pages=1))
+        self.assertIsNotNone(cache.get(first, 150))
+
+        cache.purge(first)
+        self.assertIsNone(cache.get(first, 150))
+
+
+class ImageResizerTests(TestCase):
+    def test_pages_are_fitted_to_the_cheapest_legible_tile_grid(self):
+        from .services.image_resizer import plan_page_size
+        from .services.rate_limiter import image_tiles
+
+        # A4 à 150 DPI: 6 tuiles facturées, 4 après redimensionnement sur le bord des tuiles
+        self.assertEqual(image_tiles(1240, 1754), 6)
+        size = plan_page_size(1240, 1754, max_tiles=6, min_short_side=700)
+        self.assertEqual(size, (723, 1024))
+        self.assertEqual(image_tiles(*size), 4)
+        # Jamais agrandie, et budget nul = taille d'origine
+        self.assertEqual(plan_page_size(620, 877, max_tiles=6, min_short_side=700), (620, 877))
+        self.assertEqual(plan_page_size(1240, 1754, max_tiles=0, min_short_side=700), (1240, 1754))
+        # Budget trop serré: la plus grande image du budget
+        self.assertEqual(plan_page_size(1240, 1754, max_tiles=2, min_short_side=700), (512, 724))
+
+
+class PagePreprocessingTests(TestCase):
+    def test_margins_are_cropped_and_contrast_stretched(self):
+        import numpy as np
+        from PIL import Image, ImageDraw
+        from .services.page_preprocessing import preprocess_page
+
+        # Scan terne: fond gris clair, texte gris moyen au centre d'une page A4
+        page = Image.new('RGB', (1240, 1754), (230, 230, 230))
+        draw = ImageDraw.Draw(page)
+        for y in range(400, 1000, 20):
+            draw.rectangle((300, y, 900, y + 8), fill=(120, 120, 120))
+
+        processed = preprocess_page(page)
+        self.assertEqual(processed.mode, 'L')
+        self.assertEqual(processed.size, (601 + 32, 589 + 32))
+        pixels = np.asarray(processed)
+        self.assertEqual(int(pixels.max()), 255)
+        self.assertLess(int(pixels.min()), 40)
+
+    def test_skewed_scan_is_straightened(self):
+        import numpy as np
+        from PIL import Image, ImageDraw
+        from .services.page_preprocessing import deskew, estimate_skew
+
+        page = Image.new('L', (1240, 1754), 255)
+        draw = ImageDraw.Draw(page)
+        for y in range(300, 1400, 30):
+            draw.rectangle((200, y, 1000, y + 6), fill=0)
+        skewed = np.asarray(page.rotate(1.5, resample=Image.BICUBIC, fillcolor=255))
+
+        self.assertAlmostEqual(abs(estimate_skew(skewed)), 1.5, delta=0.3)
+        self.assertLess(abs(estimate_skew(deskew(skewed))), 0.3)
+
+
+class PageSelectionTests(TestCase):
+    def test_blank_pages_have_no_ink(self):
+        from PIL import Image, ImageDraw
+        from .services.page_filter import page_signature
+
+        blank = Image.new('RGB', (1240, 1754), (255, 255, 255))
+        ImageDraw.Draw(blank).text((600, 1700), "2/2", fill=(0, 0, 0))
+        text = blank.copy()
+        draw = ImageDraw.Draw(text)
+        for y in range(200, 600, 20):
+            draw.rectangle((100, y, 1100, y + 4), fill=(0, 0, 0))
+
+        self.assertLess(page_signature(blank)['ink_ratio'], 0.001)
+        self.assertGreater(page_signature(text)['ink_ratio'], 0.001)
+        self.assertNotEqual(page_signature(blank)['page_hash'], page_signature(text)['page_hash'])
+
+    @staticmethod
+    def _render(lines):
+        """Page rendue d'un même gabarit de fiche de paie, avec les libellés et montants donnés."""
+        from PIL import Image, ImageDraw, ImageFont
+
+        page = Image.new('RGB', (1240, 1754), (255, 255, 255))
+        draw = ImageDraw.Draw(page)
+        font = ImageFont.load_default(size=28)
+        draw.rectangle((80, 80, 1160, 160), outline=(0, 0, 0), width=3)
+        for row, (label, amount) in enumerate(lines):
+            y = 220 + row * 60
+            draw.text((100, y), label, fill=(0, 0, 0), font=font)
+            draw.text((900, y), amount, fill=(0, 0, 0), font=font)
+            draw.line((80, y + 45, 1160, y + 45), fill=(0, 0, 0), width=1)
+        return page
+
+    def _month(self, period, gross, net):
+        return self._render([('Periode', period), ('Salaire de base', gross), ('Cotisations', '412,18'),
+                             ('Net a payer', net)])
+
+    @override_settings(VISION_SKIP_BOILERPLATE_PAGES=True)
+    def test_pages_differing_only_in_amounts_are_kept(self):
+        from .services.page_filter import PageSelector, page_signature
+
+        user = get_user_model().objects.create_user(username='hugo', email='hugo@example.com', password='pwd')
+        march = page_signature(self._month('03/2024', '2 150,00', '1 684,52'))
+        april = page_signature(self._month('04/2024', '2 150,00', '1 691,07'))
+        self.assertNotEqual(march['page_hash'], april['page_hash'])
+        # Deux mois dans un même PDF: les deux pages sont envoyées
+        self.assertEqual(PageSelector(user.id, 'd' * 64).select([march, april]), ([0, 1], []))
+
+        # Même gabarit en page 2 chaque mois, montants différents: jamais considérée comme connue
+        cover = page_signature(self._render([('Bulletin de paie', 'ACME')]))
+        for month, net in enumerate(('1 684,52', '1 691,07', '1 702,33')):
+            detail = page_signature(self._month(f'0{month + 3}/2024', '2 150,00', net))
+            PageSelector(user.id, str(month) * 64).record([cover, detail])
+        may = page_signature(self._month('06/2024', '2 150,00', '1 710,90'))
+        self.assertEqual(PageSelector(user.id, 'e' * 64).select([cover, may]), ([0, 1], []))
+
+    @override_settings(VISION_SKIP_BOILERPLATE_PAGES=True)
+    def test_identical_notice_pages_are_skipped_after_enough_documents(self):
+        from PIL import Image
+        from .models import PageFingerprint
+        from .services.page_filter import PageSelector, page_signature
+
+        user = get_user_model().objects.create_user(username='iris', email='iris@example.com', password='pwd')
+        cover = page_signature(self._month('03/2024', '2 150,00', '1 684,52'))
+        notice = page_signature(self._render([('Mentions legales', ''), ('Conservez ce bulletin', 'sans limite')]))
+        blank = page_signature(Image.new('RGB', (1240, 1754), (255, 255, 255)))
+
+        # Documents alternés (A, B, A): chaque document n'est compté qu'une fois
+        for sha in ('a' * 64, 'b' * 64, 'a' * 64):
+            PageSelector(user.id, sha).record([cover, notice])
+        self.assertEqual(PageFingerprint.objects.get(user=user, page_hash=notice['page_hash']).documents_seen, 2)
+        self.assertEqual(PageSelector(user.id, 'd' * 64).select([cover, notice])[0], [0, 1])
+
+        PageSelector(user.id, 'c' * 64).record([cover, notice])
+        kept, skipped = PageSelector(user.id, 'd' * 64).select([cover, notice, blank])
+        self.assertEqual(kept, [0])
+        self.assertEqual([(s['page'], s['reason']) for s in skipped], [(2, 'boilerplate'), (3, 'blank')])
+        # La première page n'est jamais considérée comme connue, et une page est toujours envoyée
+        self.assertEqual(PageSelector(user.id, 'd' * 64).select([notice])[0], [0])
+        self.assertEqual(PageSelector(user.id, 'd' * 64).select([blank, blank])[0], [0])
+        # Désactivé par défaut
+        with self.settings(VISION_SKIP_BOILERPLATE_PAGES=False):
+            self.assertEqual(PageSelector(user.id, 'd' * 64).select([cover, notice])[0], [0, 1])
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_history_is_recorded_only_after_a_successful_analysis(self):
+        from .services.analysis_service import AnalysisService
+
+        user = get_user_model().objects.create_user(username='jade', email='jade@example.com', password='pwd')
+        failing = FakeVisionService(result={'error': 'Timeout'})
+        working = FakeVisionService()
+        for vision, content in ((failing, b"%PDF-1.4 a"), (working, b"%PDF-1.4 b")):
+            pdf = SimpleUploadedFile("fiche.pdf", content, content_type="application/pdf")
+            payslip = PaySlip.objects.create(user=user, uploaded_file=pdf)
+            AnalysisService(gpt_vision_service=vision).analyze_payslip(payslip.id)
+        self.assertEqual((failing.recorded, working.recorded), (0, 1))
+
+
+class ParallelPageEncodingTests(TestCase):
+    def test_pages_are_processed_on_the_pool_in_order(self):
+        import threading
+        from .services.page_encoder import map_pages
+
+        threads = set()
+
+        def work(page):
+            threads.add(threading.current_thread().name)
+            return page * 2
+
+        self.assertEqual(map_pages(work, list(range(10)), workers=3), [n * 2 for n in range(10)])
+        self.assertTrue(all(name.startswith('page-encoder') for name in threads))
+        # Un seul worker: traitement dans le thread appelant
+        threads.clear()
+        self.assertEqual(map_pages(work, [1, 2], workers=1), [2, 4])
+        self.assertEqual(threads, {threading.current_thread().name})
+
+
+class RequestBodyTests(TestCase):
+    def test_body_is_streamed_from_raw_pages_and_matches_json(self):
+        import base64
+        import os
+        from .services.request_body import RequestBody
+        from .services.vision_api_client import OpenAIVisionClient
+
+        client = OpenAIVisionClient('sk-test')
+        jpeg = os.urandom(100_001)
+        body = RequestBody(client._build_responses_payload('prompt é', [jpeg, 'aW1n'], 'gpt-5-mini', 1024))
+
+        sent = json.loads(body.to_bytes())
+        self.assertEqual(sent['input'][0]['content'][0]['text'], 'prompt é')
+        self.assertEqual(sent['input'][1]['content'][0]['image_url'],
+                         'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode())
+        self.assertEqual(sent['input'][2]['content'][0]['image_url'], 'data:image/jpeg;base64,aW1n')
+        self.assertEqual(len(body), len(body.to_bytes()))
+        # Chaque tentative relit le corps depuis le début, par petits blocs
+        for _ in range(2):
+            reader, chunks = body.open(), []
+            while True:
+                chunk = reader.read(8192)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            self.assertEqual(b''.join(chunks), body.to_bytes())
+
+
+class PromptBuilderTests(TestCase):
+    SMIC_CSV = "Année,Mois,SMIC_horaire_brut\n2025,Mars,11.87\n2024,Mars,11.65\n"
+
+    def test_month_snippet_does_not_leak_into_next_prompt(self):
+        from .services.prompt_builder import PromptBuilder
+
+        builder = PromptBuilder(self.SMIC_CSV)
+        dated, metrics = builder.build({'date_paiement': '15/03/2024'})
+        undated, _ = builder.build({})
+
+        self.assertIn('2024,Mars,11.65', dated)
+        self.assertNotIn('2025,Mars,11.87', dated)
+        self.assertIn('2025,Mars,11.87', undated)
+        self.assertEqual(metrics['prompt_chars'], len(dated))
+        self.assertGreaterEqual(metrics['assembly_ms'], 0)
+
+
+class ReferenceDataRegistryTests(TestCase):
+    def test_conventions_map_to_hyphenated_files_and_reload_on_mtime(self):
+        import os
+        import time
+        from .services.reference_data import ReferenceDataRegistry
+
+        data_dir = tempfile.mkdtemp()
+        path = os.path.join(data_dir, 'aide-et-soins-a-domicile.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('version 1')
+        with open(os.path.join(data_dir, 'hospitalisation-non-lucratif.txt'), 'w', encoding='utf-8') as f:
+            f.write('fehap')
+        registry = ReferenceDataRegistry(data_dir, check_interval=0)
+
+        self.assertTrue(registry.get_convention_text('AIDE_ET_SOINS_A_DOMICILE').endswith('version 1'))
+        # Code mal orthographié dans CONVENTION_CHOICES ('LUCATIF')
+        self.assertEqual(registry.convention_filename('HOSPITALISATION_NON_LUCATIF'), 'hospitalisation-non-lucratif.txt')
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('version 2')
+        later = time.time() + 10
+        os.utime(path, (later, later))
+        self.assertTrue(registry.get_convention_text('AIDE_ET_SOINS_A_DOMICILE').endswith('version 2'))
+        self.assertEqual(registry.get_text('absent.txt'), '')
+
+
+class SmicTableTests(TestCase):
+    def test_missing_months_carry_forward_and_overrides_apply(self):
+        import datetime
+        from .services.smic_table import SmicTable
+
+        table = SmicTable(
+            "Année,Mois,SMIC_horaire_brut\n2024,Avril,11\n2024,Janvier,10\n",
+            monthly_overrides={(2024, 1): 1500.0},
+        )
+
+        self.assertEqual(table.lookup(datetime.date(2024, 1, 15)), {'hourly': 10.0, 'monthly': 1500.0})
+        # Mois absent du tableau: dernière valeur connue
+        self.assertEqual(table.lookup(datetime.date(2024, 3, 1)), {'hourly': 10.0, 'monthly': 1500.0})
+        self.assertEqual(table.lookup(datetime.date(2025, 6, 1)), {'hourly': 11.0, 'monthly': None})
+        self.assertIsNone(table.lookup(datetime.date(2023, 12, 1)))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AnalysisResultConditionalGetTests(TestCase):
+    def test_if_none_match_returns_304_until_analysis_is_saved(self):
+        from .models import PayslipAnalysis
+
+        user = get_user_model().objects.create_user(username='dora', email='dora@example.com', password='pwd')
+        payslip = PaySlip.objects.create(
+            user=user, uploaded_file=SimpleUploadedFile("f.pdf", b"%PDF-1.4", content_type="application/pdf")
+        )
+        analysis = PayslipAnalysis.objects.create(
+            payslip=payslip, analysis_status='success', analysis_details={'gpt_analysis': {'note_globale': 7}}
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        url = f'/api/analysis/payslip/{payslip.id}/results/'
+
+        first = client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(json.loads(first.content)['details']['gpt_analysis']['note_globale'], 7)
+        etag = first['ETag']
+
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        analysis.analysis_details = {'gpt_analysis': {'note_globale': 9}}
+        analysis.save()
+        updated = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(updated.status_code, 200)
+        self.assertNotEqual(updated['ETag'], etag)
+        self.assertEqual(json.loads(updated.content)['details']['gpt_analysis']['note_globale'], 9)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class UserPayslipStatsTests(TestCase):
+    def test_stats_follow_analysis_changes_and_deletions(self):
+        from .models import PayslipAnalysis, UserPayslipStats
+
+        user = get_user_model().objects.create_user(username='emma', email='emma@example.com', password='pwd')
+        payslip = PaySlip.objects.create(
+            user=user, uploaded_file=SimpleUploadedFile("f.pdf", b"%PDF-1.4", content_type="application/pdf")
+        )
+        analysis = PayslipAnalysis.objects.create(
+            payslip=payslip, analysis_status='success',
+            analysis_details={'gpt_analysis': {
+                'note_globale': 8, 'note_conformite_legale': '6,5', 'anomalies_potentielles_observees': [{}, {}],
+            }},
+        )
+        stats = UserPayslipStats.objects.get(user=user)
+        self.assertEqual((stats.payslip_count, stats.avg_score, stats.avg_conformity, stats.anomaly_total), (1, 8.0, 6.5, 2))
+
+        analysis.analysis_details = {'gpt_analysis': {'note_globale': 6, 'anomalies_potentielles_observees': [{}]}}
+        analysis.save()
+        stats.refresh_from_db()
+        self.assertEqual((stats.score_count, stats.avg_score, stats.conformity_count, stats.anomaly_total), (1, 6.0, 0, 1))
+        self.assertEqual(
+            {f: getattr(stats, f) for f in ('payslip_count', 'score_sum', 'anomaly_total')},
+            {f: getattr(UserPayslipStats.rebuild(user.id), f) for f in ('payslip_count', 'score_sum', 'anomaly_total')},
+        )
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/payslips/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['avgScore'], 6.0)
+        self.assertEqual(response.json()['totalErrors'], 1)
+
+        payslip.delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.payslip_count, stats.score_count, stats.anomaly_total), (0, 0, 0))
+        self.assertIsNone(stats.last_upload_date)
+
+    def test_user_without_stats_row_is_rebuilt_on_first_read(self):
+        from .models import PayslipAnalysis, UserPayslipStats
+
+        user = get_user_model().objects.create_user(username='gael', email='gael@example.com', password='pwd')
+        upload = lambda: PaySlip.objects.create(
+            user=user, uploaded_file=SimpleUploadedFile("f.pdf", b"%PDF-1.4", content_type="application/pdf")
+        )
+        first = upload()
+        # Utilisateur antérieur aux statistiques: pas de ligne au déploiement
+        UserPayslipStats.objects.filter(user=user).delete()
+        PayslipAnalysis.objects.create(
+            payslip=first, analysis_status='success', analysis_details={'gpt_analysis': {'note_globale': 7}},
+        )
+        upload()
+        self.assertFalse(UserPayslipStats.objects.filter(user=user).exists())
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/payslips/stats/')
+        self.assertEqual((response.json()['totalAnalyses'], response.json()['avgScore']), (2, 7.0))
+        upload()
+        self.assertEqual(UserPayslipStats.objects.get(user=user).payslip_count, 3)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class AnalysisSummaryColumnsTests(TestCase):
+    def test_summary_columns_feed_the_payslip_list(self):
+        from .models import PayslipAnalysis
+
+        user = get_user_model().objects.create_user(username='fred', email='fred@example.com', password='pwd')
+        payslip = PaySlip.objects.create(
+            user=user, uploaded_file=SimpleUploadedFile("f.pdf", b"%PDF-1.4", content_type="application/pdf")
+        )
+        analysis = PayslipAnalysis.objects.create(
+            payslip=payslip, analysis_status='success',
+            analysis_details={'gpt_analysis': {
+                'note_globale': '7,5', 'note_conformite_legale': 9,
+                'anomalies_potentielles_observees': [{'level': 'ok'}, {'gravite': 'haute'}, {}],
+            }},
+        )
+        self.assertEqual(
+            (analysis.global_score, analysis.conformity_score, analysis.anomaly_count, analysis.observation_count),
+            (7.5, 9.0, 2, 3),
+        )
+
+        client = APIClient()
+        client.force_authenticate(user)
+        row = client.get('/api/payslips/').json()['results'][0]
+        self.assertEqual((row['analysis_score'], row['conformity_score'], row['anomalies_count']), (7.5, 9.0, 2))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BulkAnalysisProgressTests(TestCase):
+    def test_items_are_counted_once_and_group_completes_once(self):
+        import datetime
+        from decimal import Decimal
+        from .models import BulkAnalysisGroup, BulkAnalysisItem, PayslipAnalysis
+
+        user = get_user_model().objects.create_user(username='gina', email='gina@example.com', password='pwd')
+        group = BulkAnalysisGroup.objects.create(user=user, total_files=2)
+        payslips = []
+        for month in (1, 2):
+            payslip = PaySlip.objects.create(
+                user=user, period_date=datetime.date(2024, month, 1),
+                uploaded_file=SimpleUploadedFile("f.pdf", b"%PDF-1.4", content_type="application/pdf")
+            )
+            BulkAnalysisItem.objects.create(group=group, payslip=payslip, order=month)
+            payslips.append(payslip)
+
+        PayslipAnalysis.objects.create(payslip=payslips[0], analysis_status='error', analysis_details={'error': 'x'})
+        self.assertFalse(group.record_item_result(payslips[0]))
+        self.assertFalse(group.record_item_result(payslips[0]))
+        self.assertEqual((group.processed_files, group.status), (1, 'processing'))
+
+        details = {'gpt_analysis': {
+            'evaluation_financiere_salarie': {'montant_potentiel_du_salarie': '12,50'},
+            'anomalies_potentielles_observees': [{'type': 'prime_manquante', 'description': 'Prime de panier'}],
+        }}
+        PayslipAnalysis.objects.create(payslip=payslips[1], analysis_status='success', analysis_details=details)
+        self.assertTrue(group.record_item_result(payslips[1]))
+        self.assertFalse(group.record_item_result(payslips[1]))
+
+        # Nouvelle tentative réussie de la fiche en erreur: ses résultats s'ajoutent sans la recompter
+        analysis = payslips[0].analysis
+        analysis.analysis_status, analysis.analysis_details = 'success', details
+        analysis.save()
+        self.assertFalse(group.record_item_result(payslips[0]))
+
+        group.refresh_from_db()
+        self.assertEqual((group.processed_files, group.status), (2, 'completed'))
+        self.assertEqual(group.total_amount_due, Decimal('25.00'))
+        self.assertEqual(group.missing_benefits, {'Prime de panier': 2})
+        self.assertEqual(sorted(group.summary), ['2024-01', '2024-02'])
+        self.assertEqual(group.summary['2024-02'], {'payslips': 1, 'amount_due': 12.5, 'anomalies': 1})
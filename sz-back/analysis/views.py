@@ -2,11 +2,12 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from documents.models import PaySlip
-from .models import PayslipAnalysis ,BulkAnalysisGroup, BulkAnalysisItem
+from .models import PayslipAnalysis ,BulkAnalysisGroup, BulkAnalysisItem, AnalysisJob
 from django.conf import settings
 import logging
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 import json
 import uuid
 from documents.serializers import PaySlipSerializer
@@ -15,9 +16,16 @@ from documents.serializers import PaySlipSerializer
 from .services.analysis_service import AnalysisService
 from .services.gpt_vision_service import GPTVisionService
 from .serializers import PayslipAnalysisSerializer # Assuming you might want to serialize the result
+from .services.result_cache import (
+    analysis_result_etag, etag_matches, get_cached_result, json_response, not_modified, set_cached_result,
+)
+from rest_framework.renderers import JSONRenderer
 
 logger = logging.getLogger('salariz.analysis') # Use the correct logger name for this app
 
+# Les résultats changent pendant l'analyse: le client revalide à chaque requête (304 si inchangé)
+RESULT_CACHE_CONTROL = 'private, no-cache'
+
 class PayslipAnalysisView(APIView):
     """
     Vue pour déclencher l'analyse d'une fiche de paie avec GPT Vision.
@@ -121,28 +129,40 @@ class FullAnalysisResultView(APIView):
     def get(self, request, payslip_id):
         """
         Récupère les détails complets de l'analyse pour une fiche de paie donnée.
+        Répond 304 (sans charger le JSON d'analyse) si l'ETag fourni dans If-None-Match est à jour.
         """
         logger.info(f"Requête reçue pour récupérer l'analyse complète de la fiche {payslip_id} par l'utilisateur {request.user.id}")
         try:
-            # Vérifier que la fiche appartient à l'utilisateur
-            payslip = PaySlip.objects.get(id=payslip_id, user=request.user)
-            logger.debug(f"Fiche de paie {payslip_id} trouvée pour l'utilisateur {request.user.id}.")
-
-            # Récupérer l'analyse associée
-            try:
-                # CORRECTION: Utiliser le related_name 'analysis' défini dans le OneToOneField
-                # du modèle PayslipAnalysis pour accéder à l'objet lié directement.
-                analysis = payslip.analysis
-                logger.debug(f"Analyse ID {analysis.id} trouvée pour la fiche {payslip_id}.")
-            except PayslipAnalysis.DoesNotExist:
-                 logger.warning(f"Aucune analyse trouvée pour la fiche de paie {payslip_id}.")
-                 return Response({
+            # Vérifier que la fiche appartient à l'utilisateur; seules de petites colonnes sont lues ici
+            row = (
+                PaySlip.objects
+                .filter(id=payslip_id, user=request.user)
+                .values('original_filename', 'uploaded_file', 'file_deleted',
+                        'analysis__id', 'analysis__version', 'analysis__analysis_status')
+                .first()
+            )
+            if row is None:
+                raise PaySlip.DoesNotExist
+            if row['analysis__id'] is None:
+                logger.warning(f"Aucune analyse trouvée pour la fiche de paie {payslip_id}.")
+                return Response({
                     "error": "Aucune analyse disponible pour cette fiche de paie."
-                 }, status=status.HTTP_404_NOT_FOUND)
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            filename = row['original_filename'] or (row['uploaded_file'].split('/')[-1] if row['uploaded_file'] else None)
+            etag = analysis_result_etag(
+                row['analysis__id'], row['analysis__version'], row['analysis__analysis_status'],
+                filename, row['file_deleted']
+            )
+            if etag_matches(request, etag):
+                return not_modified(etag, RESULT_CACHE_CONTROL)
+            body = get_cached_result(row['analysis__id'], etag)
+            if body is not None:
+                return json_response(body, etag, RESULT_CACHE_CONTROL)
 
-            # Sérialiser l'analyse complète (optionnel, si vous voulez une structure spécifique)
-            # serializer = PayslipAnalysisSerializer(analysis)
-            # return Response(serializer.data, status=status.HTTP_200_OK)
+            payslip = PaySlip.objects.select_related('analysis').get(id=payslip_id, user=request.user)
+            analysis = payslip.analysis
+            logger.debug(f"Analyse ID {analysis.id} trouvée pour la fiche {payslip_id}.")
 
             # DEBUG: Log des données retournées à l'API
             logger.info(f"=== DEBUG RETOUR API ===")
@@ -155,19 +175,24 @@ class FullAnalysisResultView(APIView):
                 logger.info(f"Note conformité dans DB: {gpt_data.get('note_conformite_legale', 'ABSENTE')}")
                 logger.info(f"Note globale dans DB: {gpt_data.get('note_globale', 'ABSENTE')}")
             logger.info(f"=== FIN DEBUG API ===")
-            
-            # Ou retourner directement les détails stockés dans le modèle PayslipAnalysis
-            return Response({
+
+            filename = payslip.original_filename or (payslip.uploaded_file.name.split('/')[-1] if payslip.uploaded_file else None)
+            file_deleted = getattr(payslip, 'file_deleted', False)
+            # ETag recalculé sur les objets chargés (l'analyse a pu changer depuis la première lecture)
+            etag = analysis_result_etag(analysis.id, analysis.version, analysis.analysis_status, filename, file_deleted)
+            body = JSONRenderer().render({
                 "payslip_id": payslip.id,
                 "analysis_id": analysis.id,
                 "status": analysis.analysis_status,
                 "date": analysis.analysis_date,
-                "filename": (payslip.original_filename or (payslip.uploaded_file.name.split('/')[-1] if payslip.uploaded_file else None)),
-                "file_deleted": getattr(payslip, 'file_deleted', False),
+                "filename": filename,
+                "file_deleted": file_deleted,
                 "details": analysis.analysis_details # Contient tout ce qui a été sauvegardé par AnalysisService
-            }, status=status.HTTP_200_OK)
+            })
+            set_cached_result(analysis.id, etag, body)
+            return json_response(body, etag, RESULT_CACHE_CONTROL)
 
-        except PaySlip.DoesNotExist:
+        except (PaySlip.DoesNotExist, PayslipAnalysis.DoesNotExist):
             logger.warning(f"Tentative de récupération d'analyse pour la fiche {payslip_id} échouée: Fiche non trouvée ou non appartenant à l'utilisateur {request.user.id}.")
             return Response({
                 "error": "Fiche de paie introuvable ou vous n'avez pas les droits."
@@ -205,42 +230,57 @@ class BulkAnalysisUploadView(APIView):
             total_files=len(files)
         )
         
-        # Enregistrer chaque fichier et créer les fiches de paie
+        # Enregistrer chaque fichier et créer les fiches de paie.
+        # La transaction garantit que les workers ne voient les tâches qu'une fois les items du groupe créés.
         payslips = []
-        for index, file in enumerate(files):
-            # Déterminer la période si fournie
-            period_str = periods.get(str(index))
+        with transaction.atomic():
+            for index, file in enumerate(files):
+                # Déterminer la période si fournie
+                period_str = periods.get(str(index))
             
-            # Créer le PaySlip
-            serializer = PaySlipSerializer(data={
-                'uploaded_file': file,
-                'convention_collective': convention,
-                'period': period_str
-            })
+                # Créer le PaySlip
+                serializer = PaySlipSerializer(data={
+                    'uploaded_file': file,
+                    'convention_collective': convention,
+                    'period': period_str
+                })
             
-            if serializer.is_valid():
-                payslip = serializer.save(user=request.user)
-                payslips.append(payslip)
+                if serializer.is_valid():
+                    payslip = serializer.save(user=request.user)
+                    payslips.append(payslip)
                 
-                # Lier au groupe d'analyse
-                BulkAnalysisItem.objects.create(
-                    group=analysis_group,
-                    payslip=payslip,
-                    order=index
-                )
-            else:
-                # En cas d'erreur, on nettoie et on renvoie l'erreur
-                analysis_group.delete()
-                for p in payslips:
-                    p.delete()
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                    # Lier au groupe d'analyse
+                    BulkAnalysisItem.objects.create(
+                        group=analysis_group,
+                        payslip=payslip,
+                        order=index
+                    )
+                    # Rattacher la tâche au groupe pour que les workers en bornent le parallélisme;
+                    # les groupes peuvent passer par l'API Batch (différé, moitié prix)
+                    AnalysisJob.objects.filter(payslip=payslip, status='queued').update(
+                        group=analysis_group,
+                        mode='batch' if getattr(settings, 'ANALYSIS_BULK_USE_BATCH', False) else 'live',
+                    )
+                else:
+                    # En cas d'erreur, on nettoie et on renvoie l'erreur
+                    analysis_group.delete()
+                    for p in payslips:
+                        p.delete()
+                    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # Renvoyer l'ID du groupe pour suivi
+        # Les analyses sont traitées par les workers; renvoyer l'ID du groupe et des tâches pour suivi
+        job_ids = list(
+            AnalysisJob.objects
+            .filter(payslip__in=payslips, status='queued')
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
         return Response({
             "message": f"{len(files)} fichiers uploadés et planifiés pour analyse",
             "bulk_analysis_id": analysis_group.id,
-            "payslip_ids": [p.id for p in payslips]
-        }, status=status.HTTP_201_CREATED)
+            "payslip_ids": [p.id for p in payslips],
+            "analysis_job_ids": job_ids
+        }, status=status.HTTP_202_ACCEPTED if job_ids else status.HTTP_201_CREATED)
 
 
 class BulkAnalysisResultView(APIView):
@@ -288,4 +328,35 @@ class BulkAnalysisResultView(APIView):
                 "summary": analysis_group.summary
             })
         
-        return Response(response_data)
\ No newline at end of file
+        return Response(response_data)
+
+class VisionMonitoringView(APIView):
+    """
+    Supervision de l'API Vision (réservée aux administrateurs): état du disjoncteur,
+    compteurs de hedging, budgets du limiteur de débit et taille de la file d'analyse.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        from django.db.models import Count
+        from .models import RateLimitBucket
+        from .services.circuit_breaker import VisionCircuitBreaker
+
+        queue_counts = dict(
+            AnalysisJob.objects.values_list('status').annotate(total=Count('id')).order_by()
+        )
+        rate_limits = [
+            {
+                'model': bucket.key,
+                'requests_available': round(bucket.requests_available, 2),
+                'tokens_available': round(bucket.tokens_available),
+                'refilled_at': bucket.refilled_at,
+            }
+            for bucket in RateLimitBucket.objects.order_by('key')
+        ]
+        return Response({
+            'circuit_breaker': VisionCircuitBreaker().snapshot(),
+            'hedging_enabled': getattr(settings, 'OPENAI_HEDGE_REQUESTS', False),
+            'rate_limits': rate_limits,
+            'queue': queue_counts,
+        })
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-16 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0015_add_original_filename_deleted_flag'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payslip',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('payment_required', 'Paiement requis'), ('queued', "En file d'attente"), ('processing', 'En cours de traitement'), ('completed', 'Traitement terminé'), ('error', 'Erreur de traitement')], default='pending', max_length=20, verbose_name='Statut de traitement'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-16 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0016_alter_payslip_processing_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payslip',
+            name='processing_progress',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='Progression du traitement'),
+        ),
+    ]
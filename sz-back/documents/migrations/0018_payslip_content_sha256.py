@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-16 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0017_payslip_processing_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payslip',
+            name='analysis_fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name="Empreinte du contexte d'analyse"),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='content_sha256',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64, verbose_name='Empreinte SHA-256 du fichier'),
+        ),
+    ]
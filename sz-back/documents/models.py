@@ -1,7 +1,26 @@
+import hashlib
+
 from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
+
+def file_sha256(field_file) -> str:
+    """SHA-256 du contenu d'un fichier (lu par blocs, position de lecture restaurée)."""
+    digest = hashlib.sha256()
+    was_closed = field_file.closed
+    field_file.open('rb')
+    try:
+        field_file.seek(0)
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+        field_file.seek(0)
+    finally:
+        if was_closed:
+            field_file.close()
+    return digest.hexdigest()
+
+
 class PaySlip(models.Model):
     """
     Modèle pour stocker les fiches de paie uploadées par les utilisateurs.
@@ -9,6 +28,7 @@ class PaySlip(models.Model):
     STATUS_CHOICES = [
         ('pending', _('En attente')),
         ('payment_required', _('Paiement requis')),
+        ('queued', _('En file d\'attente')),
         ('processing', _('En cours de traitement')),
         ('completed', _('Traitement terminé')),
         ('error', _('Erreur de traitement')),
@@ -34,6 +54,21 @@ class PaySlip(models.Model):
         verbose_name=_('Nom de fichier d\'origine')
     )
     file_deleted = models.BooleanField(default=False, verbose_name=_('Fichier supprimé après analyse'))
+    # Empreinte du fichier: permet de réutiliser l'analyse d'un PDF identique déjà traité
+    content_sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        db_index=True,
+        verbose_name=_('Empreinte SHA-256 du fichier')
+    )
+    # Empreinte du contexte de la dernière analyse réussie (convention, salaire, modèle, barème...)
+    analysis_fingerprint = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        verbose_name=_('Empreinte du contexte d\'analyse')
+    )
     
     upload_date = models.DateTimeField(
         auto_now_add=True,
@@ -46,6 +81,14 @@ class PaySlip(models.Model):
         default='pending',
         verbose_name=_('Statut de traitement')
     )
+
+    # Étape d'analyse en cours (publiée pendant le streaming de la réponse GPT)
+    processing_progress = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        verbose_name=_('Progression du traitement')
+    )
     
     analysis_type = models.CharField(
         max_length=20,
@@ -140,6 +183,15 @@ class PaySlip(models.Model):
         verbose_name_plural = _('Fiches de paie')
         ordering = ['-upload_date']
 
+    def save(self, *args, **kwargs):
+        # Calcul de l'empreinte à la création, tant que le contenu du fichier est disponible
+        if self.uploaded_file and not self.content_sha256 and kwargs.get('update_fields') is None:
+            try:
+                self.content_sha256 = file_sha256(self.uploaded_file)
+            except (OSError, ValueError):
+                pass
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Fiche de paie de {self.user.username} ({self.upload_date.strftime('%d/%m/%Y')})"
     
@@ -45,6 +45,7 @@ class PaySlipSerializer(serializers.ModelSerializer):
             'file_deleted',
             'upload_date',
             'processing_status',
+            'processing_progress',
             'contractual_salary',
             'additional_details',
             'convention_collective',
@@ -60,6 +61,7 @@ class PaySlipSerializer(serializers.ModelSerializer):
         read_only_fields = (
             'upload_date', 
             'processing_status', 
+            'processing_progress',
             'user',
             'original_filename',
             'file_deleted',
@@ -130,6 +132,7 @@ class PaySlipDashboardSerializer(serializers.ModelSerializer):
             'filename',
             'upload_date',
             'processing_status',
+            'processing_progress',
             'period',
             'net_salary',
             'employee_name',
@@ -138,45 +141,25 @@ class PaySlipDashboardSerializer(serializers.ModelSerializer):
             'anomalies_count',
         )
     
+    # Colonnes de résumé de PayslipAnalysis: pas de lecture du JSON d'analyse par ligne
     def get_analysis_score(self, obj):
         """Récupère le score global de l'analyse."""
-        try:
-            if hasattr(obj, 'analysis'):
-                analysis_details = obj.analysis.analysis_details
-                gpt_data = analysis_details.get('gpt_analysis', {})
-                return gpt_data.get('note_globale', 0)
-        except:
-            pass
+        analysis = getattr(obj, 'analysis', None)
+        if analysis is not None and analysis.global_score is not None:
+            return analysis.global_score
         return 0
-    
+
     def get_conformity_score(self, obj):
         """Récupère le score de conformité de l'analyse."""
-        try:
-            if hasattr(obj, 'analysis'):
-                analysis_details = obj.analysis.analysis_details
-                gpt_data = analysis_details.get('gpt_analysis', {})
-                return gpt_data.get('note_conformite_legale', 0)
-        except:
-            pass
+        analysis = getattr(obj, 'analysis', None)
+        if analysis is not None and analysis.conformity_score is not None:
+            return analysis.conformity_score
         return 0
-    
+
     def get_anomalies_count(self, obj):
-        """Compte les anomalies comme affichées côté front (toutes sauf 'ok/positive_check')."""
-        try:
-            if hasattr(obj, 'analysis'):
-                analysis_details = obj.analysis.analysis_details
-                gpt_data = analysis_details.get('gpt_analysis', {}) or {}
-                anomalies = gpt_data.get('anomalies_potentielles_observees', []) or []
-                def is_countable(a):
-                    level = (a or {}).get('level') or (a or {}).get('gravite')
-                    if not level:
-                        return True
-                    l = str(level).lower()
-                    return l not in {'positive_check', 'ok'}
-                return len([a for a in anomalies if is_countable(a)])
-        except Exception:
-            pass
-        return 0
+        """Nombre d'anomalies comme affichées côté front (toutes sauf 'ok/positive_check')."""
+        analysis = getattr(obj, 'analysis', None)
+        return analysis.anomaly_count if analysis is not None else 0
 
     def get_filename(self, obj):
         try:
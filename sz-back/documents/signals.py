@@ -1,4 +1,4 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from .models import PaySlip
 from django.contrib.auth import get_user_model
@@ -6,7 +6,7 @@ from django.contrib.auth import get_user_model
 @receiver(post_save, sender=PaySlip)
 def trigger_payslip_analysis(sender, instance, created, **kwargs):
     """
-    Déclenche l'analyse d'une fiche de paie après sa création
+    Place en file d'analyse une fiche de paie après sa création
     """
     if created and instance.processing_status == 'pending':
         import logging
@@ -16,15 +16,24 @@ def trigger_payslip_analysis(sender, instance, created, **kwargs):
             user = User.objects.get(pk=instance.user_id)
             # Consommer 1 crédit si possible, sinon marquer paiement requis
             if hasattr(user, 'try_consume_credits') and user.try_consume_credits(1):
-                from analysis.services.analysis_service import AnalysisService
-                from analysis.services.gpt_vision_service import GPTVisionService
-                gpt_service = GPTVisionService()
-                analysis_service = AnalysisService(gpt_service)
-                analysis_service.analyze_payslip(instance.id)
+                # L'analyse est confiée aux workers (manage.py run_analysis_worker)
+                # pour ne pas bloquer la requête d'upload pendant l'appel OpenAI.
+                from analysis.services.job_queue import enqueue_analysis
+                enqueue_analysis(instance, credits_charged=1)
             else:
                 instance.processing_status = 'payment_required'
                 instance.save(update_fields=['processing_status'])
                 logger.info(f"Crédits insuffisants pour l'utilisateur {user.id}. Fiche {instance.id} en 'payment_required'.")
         except Exception as e:
             logger = logging.getLogger('salariz.documents')
-            logger.error(f"Erreur lors du déclenchement conditionnel de l'analyse {instance.id}: {str(e)}")
\ No newline at end of file
+            logger.error(f"Erreur lors du déclenchement conditionnel de l'analyse {instance.id}: {str(e)}")
+
+
+@receiver(post_delete, sender=PaySlip)
+def purge_payslip_raster_cache(sender, instance, **kwargs):
+    """
+    Supprime les pages rasterisées en cache d'une fiche de paie supprimée (confidentialité)
+    """
+    if instance.content_sha256:
+        from analysis.services.raster_cache import purge_raster_cache
+        purge_raster_cache(instance.content_sha256)
@@ -2,9 +2,11 @@ from rest_framework import generics, status, permissions
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from .models import PaySlip
-from analysis.models import PayslipAnalysis
+from analysis.models import PayslipAnalysis, AnalysisJob, UserPayslipStats
 from .serializers import PaySlipSerializer, PaySlipDashboardSerializer
 from analysis.models import CONVENTION_CHOICES
+from analysis.services.result_cache import content_etag, etag_matches, json_response, not_modified
+from rest_framework.renderers import JSONRenderer
 from django.http import FileResponse, Http404
 from wsgiref.util import FileWrapper
 import mimetypes
@@ -16,6 +18,8 @@ from rest_framework.pagination import LimitOffsetPagination
 from .models import PaySlip
 logger = logging.getLogger('salariz.documents')
 
+CONVENTION_LIST_CACHE_CONTROL = 'private, max-age=86400'
+
 class PaySlipFileView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
@@ -74,9 +78,18 @@ class UploadRateThrottle(UserRateThrottle):
 
 class ConventionCollectiveListView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    # Liste statique: rendue une seule fois par processus, avec un ETag dérivé du contenu
+    _body = None
+    _etag = None
+
     def get(self, request):
-        choices = CONVENTION_CHOICES
-        return Response([{'value': v, 'label': l} for v, l in choices])
+        cls = type(self)
+        if cls._body is None:
+            cls._body = JSONRenderer().render([{'value': v, 'label': str(l)} for v, l in CONVENTION_CHOICES])
+            cls._etag = content_etag(cls._body)
+        if etag_matches(request, cls._etag):
+            return not_modified(cls._etag, CONVENTION_LIST_CACHE_CONTROL)
+        return json_response(cls._body, cls._etag, CONVENTION_LIST_CACHE_CONTROL)
     
 class PaySlipUploadView(generics.CreateAPIView):
     serializer_class = PaySlipSerializer
@@ -98,7 +111,13 @@ class PaySlipUploadView(generics.CreateAPIView):
             # En cas d'imprévu, on laisse l'upload continuer pour ne pas bloquer
             pass
 
-        return super().create(request, *args, **kwargs)
+        response = super().create(request, *args, **kwargs)
+        # L'analyse est asynchrone: on répond immédiatement avec l'identifiant de la tâche
+        job_id = getattr(self, 'analysis_job_id', None)
+        if job_id is not None:
+            response.data['analysis_job_id'] = job_id
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
 
     def perform_create(self, serializer):
         # DEBUG: Log des données reçues dans l'upload
@@ -124,9 +143,17 @@ class PaySlipUploadView(generics.CreateAPIView):
                     instance.save(update_fields=['original_filename'])
             except Exception:
                 pass
+        self.analysis_job_id = (
+            AnalysisJob.objects
+            .filter(payslip=instance, status='queued')
+            .order_by('-id')
+            .values_list('id', flat=True)
+            .first()
+        )
         logger.info(
             f"Fiche de paie créée: user={self.request.user.id}, "
-            f"payslip_id={instance.id}, filename={instance.uploaded_file.name}"
+            f"payslip_id={instance.id}, filename={instance.uploaded_file.name}, "
+            f"analysis_job_id={self.analysis_job_id}"
         )
 class PaySlipListView(generics.ListAPIView):
     serializer_class = PaySlipDashboardSerializer
@@ -143,7 +170,7 @@ class PaySlipListView(generics.ListAPIView):
             .only(
                 'id', 'uploaded_file', 'upload_date', 'processing_status',
                 'period', 'net_salary', 'employee_name', 'user__username',
-                'analysis__analysis_details'
+                'analysis__global_score', 'analysis__conformity_score', 'analysis__anomaly_count'
             )
             .order_by('-upload_date')
         )
@@ -174,51 +201,15 @@ class PaySlipDeleteView(generics.DestroyAPIView):
 class PaySlipStatsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def get(self, request):
-        user = request.user
-        qs_payslips = PaySlip.objects.filter(user=user)
-        total_analyses = qs_payslips.count()
-        last_upload_date = qs_payslips.order_by('-upload_date').values_list('upload_date', flat=True).first()
-
-        analyses = (
-            PayslipAnalysis.objects
-            .filter(payslip__user=user)
-            .values_list('analysis_details', 'analysis_status')
-        )
-
-        total_errors = 0
-        score_values = []
-        conformity_values = []
-
-        for analysis_details, analysis_status in analyses:
-            try:
-                details = analysis_details or {}
-                gpt = details.get('gpt_analysis', {}) or {}
-                anomalies = gpt.get('anomalies_potentielles_observees', []) or []
-                total_errors += len(anomalies)
-
-                score = gpt.get('note_globale')
-                if score is not None:
-                    try:
-                        score_values.append(float(str(score).replace(',', '.')))
-                    except Exception:
-                        pass
-
-                conf = gpt.get('note_conformite_legale')
-                if conf is not None:
-                    try:
-                        conformity_values.append(float(str(conf).replace(',', '.')))
-                    except Exception:
-                        pass
-            except Exception:
-                continue
-
-        avg_score = round(sum(score_values) / len(score_values), 1) if score_values else 0.0
-        avg_conf = round(sum(conformity_values) / len(conformity_values), 1) if conformity_values else 0.0
+        # Une seule ligne tenue à jour à chaque analyse; recalculée une fois si elle n'existe pas encore
+        stats = UserPayslipStats.objects.filter(user=request.user).first()
+        if stats is None:
+            stats = UserPayslipStats.rebuild(request.user.id)
 
         return Response({
-            'totalAnalyses': total_analyses,
-            'avgScore': avg_score,
-            'avgConformityScore': avg_conf,
-            'totalErrors': total_errors,
-            'lastAnalysis': last_upload_date.isoformat() if last_upload_date else None,
+            'totalAnalyses': stats.payslip_count,
+            'avgScore': stats.avg_score,
+            'avgConformityScore': stats.avg_conformity,
+            'totalErrors': stats.anomaly_total,
+            'lastAnalysis': stats.last_upload_date.isoformat() if stats.last_upload_date else None,
         })
\ No newline at end of file
@@ -244,6 +244,71 @@ try:
     OPENAI_TEMPERATURE = float(os.environ.get('OPENAI_TEMPERATURE', '1.0'))
 except ValueError:
     OPENAI_TEMPERATURE = 1.0
+# OpenAI HTTP client: pooled keep-alive session and retries with jittered exponential backoff,
+# all attempts of a call sharing its overall timeout (no retry once it cannot fit)
+try:
+    OPENAI_HTTP_POOL_SIZE = int(os.environ.get('OPENAI_HTTP_POOL_SIZE', '16'))
+except ValueError:
+    OPENAI_HTTP_POOL_SIZE = 16
+try:
+    OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', '4'))
+except ValueError:
+    OPENAI_MAX_RETRIES = 4
+try:
+    OPENAI_RETRY_BASE_DELAY = float(os.environ.get('OPENAI_RETRY_BASE_DELAY', '1.0'))
+except ValueError:
+    OPENAI_RETRY_BASE_DELAY = 1.0
+try:
+    OPENAI_RETRY_MAX_DELAY = float(os.environ.get('OPENAI_RETRY_MAX_DELAY', '30'))
+except ValueError:
+    OPENAI_RETRY_MAX_DELAY = 30.0
+# Cluster-wide OpenAI rate limiter (token buckets in the database); 0 disables a limit.
+# Set slightly below the account limits of the configured model.
+try:
+    OPENAI_RATE_LIMIT_RPM = int(os.environ.get('OPENAI_RATE_LIMIT_RPM', '0'))
+except ValueError:
+    OPENAI_RATE_LIMIT_RPM = 0
+try:
+    OPENAI_RATE_LIMIT_TPM = int(os.environ.get('OPENAI_RATE_LIMIT_TPM', '0'))
+except ValueError:
+    OPENAI_RATE_LIMIT_TPM = 0
+try:
+    OPENAI_RATE_LIMIT_MAX_WAIT = float(os.environ.get('OPENAI_RATE_LIMIT_MAX_WAIT', '120'))
+except ValueError:
+    OPENAI_RATE_LIMIT_MAX_WAIT = 120.0
+# Circuit breaker around the vision API (state shared in the database) and request hedging
+OPENAI_BREAKER_ENABLED = _env_bool('OPENAI_BREAKER_ENABLED', True)
+try:
+    OPENAI_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('OPENAI_BREAKER_FAILURE_THRESHOLD', '5'))
+except ValueError:
+    OPENAI_BREAKER_FAILURE_THRESHOLD = 5
+try:
+    OPENAI_BREAKER_RESET_TIMEOUT = float(os.environ.get('OPENAI_BREAKER_RESET_TIMEOUT', '60'))
+except ValueError:
+    OPENAI_BREAKER_RESET_TIMEOUT = 60.0
+# Latency SLO: a slower successful call counts as a failure for the breaker (0 disables it)
+try:
+    OPENAI_LATENCY_SLO_SECONDS = float(os.environ.get('OPENAI_LATENCY_SLO_SECONDS', '120'))
+except ValueError:
+    OPENAI_LATENCY_SLO_SECONDS = 120.0
+# Send a duplicate request when no response arrived within the observed p95 latency
+OPENAI_HEDGE_REQUESTS = _env_bool('OPENAI_HEDGE_REQUESTS', False)
+# Streaming of the Responses API (server-sent events): progress published on the payslip,
+# and the stream is aborted when no event arrives for OPENAI_STREAM_IDLE_TIMEOUT seconds
+OPENAI_STREAM_RESPONSES = _env_bool('OPENAI_STREAM_RESPONSES', False)
+try:
+    OPENAI_STREAM_IDLE_TIMEOUT = float(os.environ.get('OPENAI_STREAM_IDLE_TIMEOUT', '30'))
+except ValueError:
+    OPENAI_STREAM_IDLE_TIMEOUT = 30.0
+# Async vision client (AsyncOpenAIVisionClient): shared connection pool and in-flight cap per event loop
+try:
+    OPENAI_ASYNC_MAX_CONNECTIONS = int(os.environ.get('OPENAI_ASYNC_MAX_CONNECTIONS', '50'))
+except ValueError:
+    OPENAI_ASYNC_MAX_CONNECTIONS = 50
+try:
+    OPENAI_ASYNC_MAX_IN_FLIGHT = int(os.environ.get('OPENAI_ASYNC_MAX_IN_FLIGHT', '32'))
+except ValueError:
+    OPENAI_ASYNC_MAX_IN_FLIGHT = 32
 # Stripe settings
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY', '')
@@ -256,6 +321,122 @@ try:
 except ValueError:
     CONVENTION_TEXT_MAX_CHARS = 3000
 
+# Analysis job queue (manage.py run_analysis_worker)
+try:
+    ANALYSIS_WORKER_POLL_INTERVAL = float(os.environ.get('ANALYSIS_WORKER_POLL_INTERVAL', '5'))
+except ValueError:
+    ANALYSIS_WORKER_POLL_INTERVAL = 5.0
+# Analyses simultanées par processus worker, et par groupe d'analyse (toutes machines confondues)
+try:
+    ANALYSIS_WORKER_CONCURRENCY = int(os.environ.get('ANALYSIS_WORKER_CONCURRENCY', '12'))
+except ValueError:
+    ANALYSIS_WORKER_CONCURRENCY = 12
+try:
+    ANALYSIS_GROUP_CONCURRENCY = int(os.environ.get('ANALYSIS_GROUP_CONCURRENCY', '12'))
+except ValueError:
+    ANALYSIS_GROUP_CONCURRENCY = 12
+# Ordonnancement: au-delà de ce délai d'attente, un élément d'analyse groupée a la même priorité qu'une analyse unitaire
+try:
+    ANALYSIS_SCHEDULER_AGING_SECONDS = float(os.environ.get('ANALYSIS_SCHEDULER_AGING_SECONDS', '300'))
+except ValueError:
+    ANALYSIS_SCHEDULER_AGING_SECONDS = 300.0
+# Bail des tâches: renouvelé par le worker, une tâche dont le bail expire est remise en file
+# (au plus ANALYSIS_JOB_MAX_ATTEMPTS tentatives, puis erreur et remboursement du crédit)
+try:
+    ANALYSIS_JOB_LEASE_SECONDS = int(os.environ.get('ANALYSIS_JOB_LEASE_SECONDS', '300'))
+except ValueError:
+    ANALYSIS_JOB_LEASE_SECONDS = 300
+try:
+    ANALYSIS_JOB_MAX_ATTEMPTS = int(os.environ.get('ANALYSIS_JOB_MAX_ATTEMPTS', '3'))
+except ValueError:
+    ANALYSIS_JOB_MAX_ATTEMPTS = 3
+try:
+    ANALYSIS_REAPER_INTERVAL = float(os.environ.get('ANALYSIS_REAPER_INTERVAL', '60'))
+except ValueError:
+    ANALYSIS_REAPER_INTERVAL = 60.0
+# OpenAI Batch API (manage.py run_analysis_batches): bulk groups can be analysed offline at half price
+ANALYSIS_BULK_USE_BATCH = _env_bool('ANALYSIS_BULK_USE_BATCH', False)
+OPENAI_BATCH_API_BASE = os.environ.get('OPENAI_BATCH_API_BASE', 'https://api.openai.com/v1')
+try:
+    ANALYSIS_BATCH_MAX_JOBS = int(os.environ.get('ANALYSIS_BATCH_MAX_JOBS', '100'))
+except ValueError:
+    ANALYSIS_BATCH_MAX_JOBS = 100
+try:
+    ANALYSIS_BATCH_MAX_BYTES = int(os.environ.get('ANALYSIS_BATCH_MAX_BYTES', str(150 * 1024 * 1024)))
+except ValueError:
+    ANALYSIS_BATCH_MAX_BYTES = 150 * 1024 * 1024
+try:
+    ANALYSIS_BATCH_POLL_INTERVAL = float(os.environ.get('ANALYSIS_BATCH_POLL_INTERVAL', '60'))
+except ValueError:
+    ANALYSIS_BATCH_POLL_INTERVAL = 60.0
+# Pipeline du worker: threads de préparation (rasterisation/encodage) et documents préparés en attente d'envoi
+try:
+    ANALYSIS_PIPELINE_PREPARE_WORKERS = int(os.environ.get('ANALYSIS_PIPELINE_PREPARE_WORKERS', '2'))
+except ValueError:
+    ANALYSIS_PIPELINE_PREPARE_WORKERS = 2
+try:
+    ANALYSIS_PIPELINE_BUFFER = int(os.environ.get('ANALYSIS_PIPELINE_BUFFER', '2'))
+except ValueError:
+    ANALYSIS_PIPELINE_BUFFER = 2
+
+# Données de référence (data/): délai minimal entre deux contrôles des dates de modification
+try:
+    REFERENCE_DATA_CHECK_INTERVAL = float(os.environ.get('REFERENCE_DATA_CHECK_INTERVAL', '5'))
+except ValueError:
+    REFERENCE_DATA_CHECK_INTERVAL = 5.0
+
+# Durée de conservation (secondes) des réponses rendues de /api/analysis/payslip/<id>/results/ (0 désactive le cache)
+try:
+    ANALYSIS_RESULT_CACHE_TIMEOUT = int(os.environ.get('ANALYSIS_RESULT_CACHE_TIMEOUT', '300'))
+except ValueError:
+    ANALYSIS_RESULT_CACHE_TIMEOUT = 300
+
+# Cache disque des pages rasterisées (clé: SHA-256 du PDF, DPI, page), éviction LRU; 0 désactive le cache
+RASTER_CACHE_DIR = os.environ.get('RASTER_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'raster'))
+try:
+    RASTER_CACHE_MAX_BYTES = int(os.environ.get('RASTER_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+except ValueError:
+    RASTER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Pages envoyées à l'API Vision: budget de tuiles de 512 px par page (0 = pas de redimensionnement)
+# et côté court minimal pour garder les petits chiffres lisibles
+try:
+    VISION_IMAGE_MAX_TILES = int(os.environ.get('VISION_IMAGE_MAX_TILES', '6'))
+except ValueError:
+    VISION_IMAGE_MAX_TILES = 6
+try:
+    VISION_IMAGE_MIN_SHORT_SIDE = int(os.environ.get('VISION_IMAGE_MIN_SHORT_SIDE', '700'))
+except ValueError:
+    VISION_IMAGE_MIN_SHORT_SIDE = 700
+# Prétraitement des pages (niveaux de gris, contraste, marges rognées) et redressement des scans.
+# Désactivé par défaut tant que `benchmark_page_images --extract` n'a pas montré, sur des fiches
+# réelles, que les champs extraits restent identiques
+VISION_PAGE_PREPROCESSING = _env_bool('VISION_PAGE_PREPROCESSING', False)
+VISION_PAGE_DESKEW = _env_bool('VISION_PAGE_DESKEW', False)
+# Pages non envoyées à l'API: pages blanches (taux d'encre minimal) et, sur option, hors première
+# page, pages déjà envoyées à l'identique par l'utilisateur dans au moins N documents des derniers
+# jours (désactivé tant que l'effet sur l'extraction n'a pas été validé)
+VISION_SKIP_BLANK_PAGES = _env_bool('VISION_SKIP_BLANK_PAGES', True)
+try:
+    VISION_BLANK_PAGE_INK_RATIO = float(os.environ.get('VISION_BLANK_PAGE_INK_RATIO', '0.001'))
+except ValueError:
+    VISION_BLANK_PAGE_INK_RATIO = 0.001
+VISION_SKIP_BOILERPLATE_PAGES = _env_bool('VISION_SKIP_BOILERPLATE_PAGES', False)
+try:
+    VISION_BOILERPLATE_MIN_DOCUMENTS = int(os.environ.get('VISION_BOILERPLATE_MIN_DOCUMENTS', '3'))
+except ValueError:
+    VISION_BOILERPLATE_MIN_DOCUMENTS = 3
+try:
+    VISION_PAGE_FINGERPRINT_DAYS = int(os.environ.get('VISION_PAGE_FINGERPRINT_DAYS', '400'))
+except ValueError:
+    VISION_PAGE_FINGERPRINT_DAYS = 400
+# Parallélisme du traitement d'un document: processus Poppler par plage de pages et threads
+# d'encodage des pages (1 = séquentiel)
+try:
+    PDF_PAGE_WORKERS = int(os.environ.get('PDF_PAGE_WORKERS', str(min(4, os.cpu_count() or 1))))
+except ValueError:
+    PDF_PAGE_WORKERS = min(4, os.cpu_count() or 1)
+
 # Logging configuration
 LOGGING = {
     'version': 1,